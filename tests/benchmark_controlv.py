@@ -0,0 +1,90 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains ControlV micro-benchmarks for tpRigToolkit-tools-controlrig
+Usage: python -m tests.benchmark_controlv
+"""
+
+from __future__ import print_function, division, absolute_import
+
+import timeit
+
+from tpRigToolkit.tools.controlrig.core.controldata import ControlV
+
+NUMBER = 200000
+
+
+class ListControlV(list):
+    """
+    Previous list based ControlV implementation, used as benchmark reference
+    """
+
+    def ControlVWrapper(self):
+        def wrapper(*args, **kwargs):
+            f = self(*[a if isinstance(a, ListControlV) else ListControlV([a, a, a]) for a in args], **kwargs)
+            return f
+        return wrapper
+
+    @ControlVWrapper
+    def __mul__(self, other):
+        return ListControlV([self[i] * other[i] for i in range(3)])
+
+    @ControlVWrapper
+    def __sub__(self, other):
+        return ListControlV([self[i] - other[i] for i in range(3)])
+
+    @ControlVWrapper
+    def __add__(self, other):
+        return ListControlV([self[i] + other[i] for i in range(3)])
+
+    def __rmul__(self, other):
+        return self * other
+
+    def __rsub__(self, other):
+        return self - other
+
+    def __radd__(self, other):
+        return self + other
+
+    def reorder(self, order):
+        return ListControlV([self[i] for i in order])
+
+
+OPERATIONS = [
+    ('create', 'V([0.5, -1.25, 3.0])'),
+    ('vector * vector', 'a * b'),
+    ('vector * scalar', 'a * 0.5'),
+    ('scalar * vector', '0.5 * a'),
+    ('vector - vector', 'a - b'),
+    ('vector + vector', 'a + b'),
+    ('reorder', 'a.reorder([2, 0, 1])'),
+    ('catmull rom point', 'a + (b * 0.25) + (c * 0.25 * 0.25) + (d * 0.25 * 0.25 * 0.25)'),
+]
+
+
+def run(number=NUMBER):
+    """
+    Runs all the benchmarks and returns the time spent by each operation with both implementations
+    :param number: int, number of times each operation is executed
+    :return: list(tuple(str, float, float))
+    """
+
+    results = list()
+    for name, statement in OPERATIONS:
+        timings = list()
+        for vector_class in (ListControlV, ControlV):
+            namespace = {
+                'V': vector_class, 'a': vector_class([0.5, -1.25, 3.0]), 'b': vector_class([-2.0, 0.0, 0.1]),
+                'c': vector_class([1e-3, 7.3, -0.7]), 'd': vector_class([0.0, 1.0, 2.5])}
+            timings.append(min(timeit.repeat(statement, globals=namespace, number=number, repeat=3)))
+        results.append((name, timings[0], timings[1]))
+
+    return results
+
+
+if __name__ == '__main__':
+    print('{:<20}{:>14}{:>14}{:>10}'.format('operation', 'list (us)', 'slots (us)', 'speedup'))
+    for operation_name, list_time, slots_time in run():
+        print('{:<20}{:>14.3f}{:>14.3f}{:>9.1f}x'.format(
+            operation_name, list_time / NUMBER * 1e6, slots_time / NUMBER * 1e6, list_time / slots_time))
@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains shapes tessellation benchmarks for tpRigToolkit-tools-controlrig
+Usage: python -m tests.benchmark_tessellation [controls_library_path]
+"""
+
+from __future__ import print_function, division, absolute_import
+
+import os
+import sys
+
+from tpRigToolkit.tools.controlrig.core import library, spline
+
+SCALES = [10, 30, 100, 300, 1000]
+CONTROLS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tpRigToolkit', 'tools', 'controlrig', 'data',
+    'controls_data.json')
+
+
+def get_segments_count(shape, subdivisions):
+    """
+    Returns the number of line segments used to draw the given shape
+    :param shape: ControlShape
+    :param subdivisions: int
+    :return: int
+    """
+
+    if shape.degree == 1:
+        return len(shape.buffer) // 3 - (0 if shape.periodic else 1)
+
+    return len(spline.evaluate(shape.buffer, shape.degree, shape.periodic, subdivisions=subdivisions)) // 3 - 1
+
+
+def run(controls_path=CONTROLS_PATH, scales=None):
+    """
+    Returns the number of segments used to draw all the controls of the given library, both with fixed and with
+    adaptive subdivisions, at each one of the given viewer scales
+    :param controls_path: str
+    :param scales: list(float)
+    :return: list(tuple(float, int, int))
+    """
+
+    controls_library = library.ControlsLibrary(controls_path, use_sidecar=False)
+    controls_library.load()
+    shapes = [shape for control in controls_library.controls for shape in control.shapes]
+    curvature_bounds = [spline.get_curvature_bound(shape.buffer, shape.degree, shape.periodic) for shape in shapes]
+    fixed_count = sum(get_segments_count(shape, spline.SUBDIVISIONS) for shape in shapes)
+
+    results = list()
+    for scale in scales or SCALES:
+        adaptive_count = sum(
+            get_segments_count(shape, spline.get_adaptive_subdivisions(bound, scale))
+            for shape, bound in zip(shapes, curvature_bounds))
+        results.append((scale, fixed_count, adaptive_count))
+
+    return results
+
+
+if __name__ == '__main__':
+    print('{:>8}{:>12}{:>12}'.format('scale', 'fixed', 'adaptive'))
+    for viewer_scale, fixed_segments, adaptive_segments in run(*sys.argv[1:2]):
+        print('{:>8}{:>12}{:>12}'.format(viewer_scale, fixed_segments, adaptive_segments))
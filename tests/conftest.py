@@ -0,0 +1,23 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains shared fixtures of tpRigToolkit-tools-controlrig tests
+"""
+
+import os
+
+import pytest
+
+CONTROLS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'tpRigToolkit', 'tools', 'controlrig', 'data', 'controls_data.json')
+
+
+@pytest.fixture
+def controls_path(tmpdir):
+    controls_path = str(tmpdir.join('controls_data.json'))
+    with open(CONTROLS_PATH, 'rb') as source_file, open(controls_path, 'wb') as target_file:
+        target_file.write(source_file.read())
+
+    return controls_path
@@ -0,0 +1,132 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains control data tests for tpRigToolkit-tools-controlrig
+"""
+
+import itertools
+
+import pytest
+
+from tpRigToolkit.tools.controlrig.core import controldata
+from tpRigToolkit.tools.controlrig.core.controldata import ControlV, ControlShape
+
+CVS = [[0.5, -1.25, 3.0], [-2.0, 0.0, 0.1], [1e-3, 7.3, -0.7], [0.0, -0.0, 2.5]]
+
+
+def _transform_points(cvs, offset, scale, axis, mirror):
+    order = [controldata.axis_eq[x] for x in axis]
+    transform_offset = -1 * ControlV(offset).reorder(order)
+    transform_factor = ControlV(scale).reorder(order)
+    transform_mirror = ControlV.mirror_vector()[mirror]
+
+    points = list()
+    for point in cvs:
+        point = ControlV(point) * transform_factor
+        point -= transform_offset
+        point *= transform_mirror
+        points.append(point.reorder(order))
+
+    return points
+
+
+@pytest.mark.parametrize('axis, mirror', list(itertools.product(
+    ['XYZ', 'YXZ', 'ZYX', 'XZY', 'YZX', 'ZXY'], [None, 'None', 'XY', 'YZ', 'ZX'])))
+def test_shape_transform(axis, mirror):
+    offset = [0.3, -1.7, 2.2]
+    scale = [1.5, 0.25, -3.0]
+    shape = ControlShape(CVS)
+    shape.transform(offset, scale, axis, mirror)
+
+    expected = _transform_points(CVS, offset, scale, axis, mirror)
+    assert [list(pt) for pt in shape.transformed_cvs] == [list(pt) for pt in expected]
+    assert list(shape.transformed_buffer) == [value for pt in expected for value in pt]
+    assert shape()['cvs'] == CVS
+
+
+def test_control_vector():
+    a = ControlV([0.5, -1.25, 3.0])
+    b = ControlV([-2.0, 0.0, 0.1])
+
+    assert a * b == (0.5 * -2.0, -1.25 * 0.0, 3.0 * 0.1)
+    assert a * 2 == 2 * a == (1.0, -2.5, 6.0)
+    assert a + 1 == 1 + a == (1.5, -0.25, 4.0)
+    assert a - b == (2.5, -1.25, 2.9)
+    assert 1 - a == a - 1
+    assert isinstance(2 * a - b, ControlV)
+    assert a.reorder([2, 0, 1]) == (3.0, 0.5, -1.25)
+    assert not hasattr(a, '__dict__')
+
+    c = a
+    c *= -1
+    assert c == (-0.5, 1.25, -3.0) and a == (0.5, -1.25, 3.0)
+    assert ControlV.mirror_vector()['XY'] == (1, 1, -1)
+
+    assert ControlV([1, 2, 3]) == [1, 2, 3] and [1, 2, 3] == ControlV([1, 2, 3])
+    assert ControlV([1, 2, 3]) != [1, 2, 4] and not ControlV([1, 2, 3]) != [1, 2, 3]
+    assert ControlV([1, 2, 3]) != 'abc'
+    assert hash(ControlV([1, 2, 3])) == hash((1, 2, 3))
+
+
+def test_control_transform():
+    control = controldata.ControlData('bulb', [
+        {'cvs': CVS, 'degree': 1, 'periodic': 1}, {'cvs': CVS[:2], 'degree': 1, 'periodic': 0}])
+    offset, scale = [0.3, -1.7, 2.2], [1.5, 0.25, -3.0]
+
+    transformed_buffer = control.transform(offset, scale, 'ZYX', 'YZ')
+    assert len(transformed_buffer) == 3 * (len(CVS) + 2)
+    assert [shape.transformed_buffer.start for shape in control.shapes] == [0, 3 * len(CVS)]
+    for shape in control.shapes:
+        assert shape.transformed_buffer.buffer is transformed_buffer
+        expected = ControlShape(shape.cvs)
+        expected.transform(offset, scale, 'ZYX', 'YZ')
+        assert list(shape.transformed_buffer) == list(expected.transformed_buffer)
+        assert [list(pt) for pt in shape.transformed_cvs] == [list(pt) for pt in expected.transformed_cvs]
+        shape.apply_transform()
+        assert list(shape.transformed_buffer) == list(expected.transformed_buffer)
+
+
+def test_buffer_view():
+    values = [float(value) for value in range(12)]
+    buffer_view = controldata.BufferView(controldata.get_buffer(CVS + [values[:3]]), 3, 9)
+    view_values = [value for cv in CVS[1:3] for value in cv]
+
+    assert len(buffer_view) == 6 and list(buffer_view) == view_values
+    assert buffer_view[-1] == view_values[-1] and buffer_view[1] == view_values[1]
+    for item in (slice(None), slice(1, None, 3), slice(2, 100), slice(-2, None), slice(4, 1), slice(None, None, -2)):
+        assert list(buffer_view[item]) == view_values[item]
+    assert buffer_view.tobytes() == controldata.get_buffer(CVS[1:3]).tobytes()
+    with pytest.raises(IndexError):
+        buffer_view[6]
+
+
+@pytest.mark.parametrize('axis, mirror', [('XYZ', None), ('ZYX', 'YZ'), ('YZX', 'XY')])
+def test_control_bounds(axis, mirror):
+    control = controldata.ControlData('bulb', [
+        {'cvs': CVS, 'degree': 1, 'periodic': 1}, {'cvs': [[4.0, 1.0, -2.0]], 'degree': 1, 'periodic': 0}])
+    points = CVS + [[4.0, 1.0, -2.0]]
+
+    bounds = control.bounds
+    assert bounds.minimum == (-2.0, -1.25, -2.0)
+    assert bounds.maximum == (4.0, 7.3, 3.0)
+    assert bounds.centroid == pytest.approx([sum(values) / len(points) for values in zip(*points)])
+    assert all(sum((a - b) ** 2 for a, b in zip(pt, bounds.center)) <= bounds.radius ** 2 + 1e-9 for pt in points)
+    assert bounds.get_normalization_factor(2.0) == pytest.approx(2.0 / bounds.radius)
+
+    offset, scale = [0.3, -1.7, 2.2], [1.5, 0.25, -3.0]
+    transformed_buffer = control.transform(offset, scale, axis, mirror)
+    expected = controldata.get_bounds(transformed_buffer)
+    transformed_bounds = control.transformed_bounds
+    assert transformed_bounds.minimum == pytest.approx(expected.minimum)
+    assert transformed_bounds.maximum == pytest.approx(expected.maximum)
+    assert transformed_bounds.centroid == pytest.approx(expected.centroid)
+    assert transformed_bounds.center == pytest.approx(expected.center)
+    assert transformed_bounds.radius >= expected.radius - 1e-9
+
+
+def test_lazy_control_bounds():
+    control = controldata.LazyControlData('circle', lambda: [{'cvs': CVS, 'degree': 3, 'periodic': 1}])
+    assert not control.loaded
+    assert control.bounds.maximum == (0.5, 7.3, 3.0)
+    assert control.loaded
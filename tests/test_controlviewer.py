@@ -0,0 +1,66 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains control viewer widget tests for tpRigToolkit-tools-controlrig
+"""
+
+import os
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+QtWidgets = pytest.importorskip('Qt.QtWidgets')
+
+from tpRigToolkit.tools.controlrig.core import library, controldata, projection  # noqa: E402
+from tpRigToolkit.tools.controlrig.widgets import controlviewer  # noqa: E402
+
+
+@pytest.fixture
+def application():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication(list())
+
+
+def test_viewers_transforms(controls_path, application):
+    control = library.load_library(controls_path, use_sidecar=False).get_control('cube')
+    source_buffers = [shape.transformed_buffer for shape in control.shapes]
+    transforms = [([0.3, 0.0, 1.0], [2.0, 2.0, 2.0], 'ZYX', 'YZ'), ([0.0, -1.0, 0.0], [0.5, 0.5, 0.5], 'XYZ', None)]
+
+    viewers = list()
+    for transform in transforms:
+        viewer = controlviewer.ControlViewer()
+        viewer.resize(200, 200)
+        viewer.load(control.shapes, bounds=control.bounds)
+        viewer.set_transform(*transform)
+        viewers.append(viewer)
+    for viewer in viewers:
+        viewer.update_coords()
+
+    # Each viewer draws the control with its own transform, and the shared control is never transformed
+    assert [shape.transformed_buffer for shape in control.shapes] == source_buffers
+    for viewer, transform in zip(viewers, transforms):
+        assert viewer.transform_affine == controldata.get_transform_affine(*transform)
+        for shape, display_shape in zip(control.shapes, viewer.shapes):
+            expected_shape = controldata.ControlShape(shape.cvs)
+            expected_shape.transform(*transform)
+            assert list(display_shape.transformed_buffer) == list(expected_shape.transformed_buffer)
+        assert all(len(polyline) for polyline in viewer._baked_lines)
+
+
+def test_viewer_polylines_reused(controls_path, application):
+    control = library.load_library(controls_path, use_sidecar=False).get_control('cube')
+    viewer = controlviewer.ControlViewer()
+    viewer.resize(200, 200)
+    viewer.load(control.shapes, bounds=control.bounds)
+    viewer.update_coords()
+    polylines = list(viewer._baked_lines)
+
+    viewer.set_transform([0.0, 1.0, 0.0], [3.0, 3.0, 3.0], 'XYZ', None)
+    viewer.update_coords()
+    if controlviewer.get_points_buffer(polylines[0]) is not None:
+        assert all(polyline is other for polyline, other in zip(viewer._baked_lines, polylines))
+    for display_shape, polyline in zip(viewer.shapes, viewer._baked_lines):
+        projected_buffer = projection.project_buffer(
+            viewer._get_display_buffer(display_shape), viewer._get_projection())
+        assert [coordinate for i in range(len(polyline)) for coordinate in (
+            polyline.at(i).x(), polyline.at(i).y())] == list(projected_buffer)
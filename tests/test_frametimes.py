@@ -0,0 +1,32 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains frame times statistics tests for tpRigToolkit-tools-controlrig
+"""
+
+import pytest
+
+from tpRigToolkit.tools.controlrig.core import frametimes
+
+
+def test_frame_times():
+    frame_times = frametimes.FrameTimes(max_samples=4)
+    assert frame_times.get_stats() == {'frames': 0, 'window': 0, 'mean': 0.0, 'p95': 0.0, 'max': 0.0}
+
+    for duration in [0.1, 0.002, 0.004, 0.006, 0.008]:
+        frame_times.add(duration)
+    assert frame_times.count == 5
+    assert frame_times.samples == [0.002, 0.004, 0.006, 0.008]
+    assert frame_times.get_percentile(0) == 0.002
+    assert frame_times.get_percentile(50) == 0.006
+    assert frame_times.get_percentile(100) == 0.008
+
+    stats = frame_times.get_stats()
+    assert list(stats.keys()) == ['frames', 'window', 'mean', 'p95', 'max']
+    assert (stats['frames'], stats['window']) == (5, 4)
+    assert stats['mean'] == pytest.approx(5.0)
+    assert stats['max'] == pytest.approx(8.0)
+
+    frame_times.reset()
+    assert len(frame_times) == 0 and frame_times.count == 0
@@ -0,0 +1,378 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains controls library tests for tpRigToolkit-tools-controlrig
+"""
+
+import os
+import io
+import json
+import random
+import hashlib
+import threading
+import tracemalloc
+from collections import OrderedDict
+
+import pytest
+
+from tpRigToolkit.tools.controlrig.core import library, sidecar, streamreader, canonicalize
+
+from .conftest import CONTROLS_PATH
+
+
+def test_load_library():
+    controls_library = library.load_library(CONTROLS_PATH, use_sidecar=False)
+    assert len(controls_library) == 96
+    assert 'handle_square' in controls_library
+    assert controls_library.get_control('handle_square').shapes
+    assert list(controls_library.timings.keys()) == ['parse', 'build', 'total']
+
+
+@pytest.mark.parametrize('flat', [False, True])
+def test_stream_reader(flat):
+    with open(CONTROLS_PATH, 'rb') as fh:
+        library_contents = fh.read()
+    if flat:
+        library_contents = json.dumps(library.parse_library_contents(library_contents)).encode('utf-8')
+
+    stream_reader = streamreader.LibraryStreamReader(io.BytesIO(library_contents), chunk_size=64)
+    controls = list(stream_reader)
+    assert controls == list(library.parse_library_contents(library_contents).items())
+    assert stream_reader.content_hash == hashlib.sha1(library_contents).hexdigest()
+
+
+def test_load_missing_library(tmpdir):
+    controls_library = library.load_library(str(tmpdir.join('missing.json')))
+    assert not controls_library.controls
+
+
+def test_library_cache(controls_path):
+    cache = library.LibraryCache(max_size=1)
+    controls_library = cache.get(controls_path)
+    assert cache.get(controls_path) is controls_library
+    assert cache.get(controls_path).get_control('circle') is controls_library.get_control('circle')
+
+    os.utime(controls_path, (0, 0))
+    assert cache.get(controls_path) is controls_library
+
+    other_controls_path = controls_path.replace('controls_data', 'other_controls_data')
+    with open(controls_path, 'rb') as source_file, open(other_controls_path, 'wb') as target_file:
+        target_file.write(source_file.read())
+    cache.get(other_controls_path)
+    assert len(cache) == 1
+    assert controls_path not in cache
+
+
+def test_library_sidecar(controls_path):
+    json_library = library.load_library(controls_path)
+    assert json_library.source_path == controls_path
+    assert sidecar.is_sidecar_valid(controls_path)
+
+    sidecar_library = library.load_library(controls_path)
+    assert sidecar_library.source_path == sidecar.get_sidecar_path(controls_path)
+    assert sidecar_library.control_names == json_library.control_names
+    for control in json_library:
+        assert control() == sidecar_library.get_control(control.name)()
+
+    os.utime(controls_path, (os.path.getmtime(controls_path) + 10, os.path.getmtime(controls_path) + 10))
+    assert not sidecar.is_sidecar_valid(controls_path)
+
+
+def test_lazy_library_peak_memory(tmpdir):
+    controls_path = str(tmpdir.join('large_controls_data.json'))
+    rnd = random.Random(0)
+    with open(controls_path, 'w') as fh:
+        json.dump({'controls': dict(('control_{}'.format(i), [{
+            'cvs': [[rnd.uniform(-1, 1) for _ in range(3)] for _ in range(500)], 'degree': 3, 'periodic': 1}])
+            for i in range(200))}, fh)
+
+    tracemalloc.start()
+    try:
+        controls_library = library.load_library(controls_path, lazy=True)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    assert len(controls_library) == 200
+    assert sidecar.is_sidecar_valid(controls_path)
+    assert peak_memory < os.path.getsize(controls_path) / 4
+    assert len(controls_library.get_control('control_7').shapes[0].cvs) == 500
+
+
+def test_sidecar_writers_temp_files(controls_path):
+    writers = [sidecar.SidecarWriter(controls_path) for _ in range(2)]
+    assert all(writer.open() for writer in writers)
+    assert writers[0].temp_path != writers[1].temp_path
+    temp_path = writers[1].temp_path
+
+    writers[0].abort()
+    assert os.path.isfile(temp_path)
+    assert writers[1].close() == sidecar.get_sidecar_path(controls_path)
+    assert not os.path.isfile(temp_path)
+    assert sidecar.is_sidecar_valid(controls_path)
+
+
+def test_sidecar_file_mode(controls_path):
+    os.chmod(controls_path, 0o644)
+    controls_data = library.parse_library_contents(open(controls_path, 'rb').read())
+    sidecar_path = sidecar.write_sidecar(controls_path, controls_data)
+    assert os.stat(sidecar_path).st_mode & 0o777 == 0o644
+    assert sidecar.write_sidecar(controls_path, controls_data) == sidecar_path
+    assert sorted(os.listdir(os.path.dirname(controls_path))) == ['controls_data.bin', 'controls_data.json']
+
+
+def test_lazy_library_sidecar_failure(controls_path, monkeypatch):
+    monkeypatch.setattr(sidecar.SidecarWriter, 'close', lambda writer, source_hash=None: writer.abort())
+    eager_library = library.load_library(controls_path, use_sidecar=False)
+    lazy_library = library.load_library(controls_path, lazy=True)
+    assert not sidecar.is_sidecar_valid(controls_path)
+    assert not lazy_library.load_error
+    for control in lazy_library:
+        assert control() == eager_library.get_control(control.name)()
+
+
+def test_lazy_library_sidecar_rewritten(controls_path):
+    eager_library = library.load_library(controls_path, use_sidecar=False)
+    library.load_library(controls_path)
+    lazy_library = library.load_library(controls_path, lazy=True)
+    assert lazy_library.source_path == sidecar.get_sidecar_path(controls_path)
+
+    # Sidecar rewritten by another process with its records stored in a different order
+    controls_data = library.parse_library_contents(open(controls_path, 'rb').read())
+    sidecar.write_sidecar(controls_path, OrderedDict(reversed(list(controls_data.items()))), source_hash='0' * 40)
+    with pytest.raises(sidecar.SidecarGenerationError):
+        sidecar.read_control(sidecar.get_sidecar_path(controls_path), 0, 0, generation='1' * 40)
+    for control_name in ('bulb_3D', 'handle_square'):
+        assert lazy_library.get_control(control_name)() == eager_library.get_control(control_name)()
+
+
+def test_library_cache_load_error(controls_path):
+    with open(controls_path, 'rb') as fh:
+        contents = fh.read()
+    with open(controls_path, 'wb') as fh:
+        fh.write(contents[:len(contents) // 2])
+
+    cache = library.LibraryCache()
+    controls_library = cache.get(controls_path, lazy=True)
+    assert controls_library.load_error
+    assert controls_path not in cache
+
+
+@pytest.mark.parametrize('use_sidecar', [True, False])
+def test_lazy_library(controls_path, use_sidecar):
+    eager_library = library.load_library(controls_path, use_sidecar=False)
+    for _ in range(2):
+        lazy_library = library.load_library(controls_path, use_sidecar=use_sidecar, lazy=True)
+        assert not any(control.loaded for control in lazy_library)
+        lazy_control = lazy_library.get_control('bulb_3D')
+        assert lazy_control() == eager_library.get_control('bulb_3D')()
+        assert lazy_control.loaded
+        assert not lazy_library.get_control('handle_square').loaded
+
+
+def test_shapes_deduplication(controls_path):
+    shapes = library.get_shapes_data(library.load_library(controls_path).get_control('cube'))
+    library.ControlsLibrary(controls_path).add_control('cube_copy', shapes)
+
+    report = library.get_dedup_report(controls_path)
+    assert report['unique_shapes'] == report['shapes'] - len(shapes)
+    assert report['saved_bytes'] == sum(len(sidecar.encode_shape(shape)) for shape in shapes)
+    assert list(report['duplicated_shapes'].values())[0] == ['cube', 'cube_copy']
+
+    for lazy in (False, True):
+        controls_library = library.load_library(controls_path, lazy=lazy)
+        cube_shapes = controls_library.get_control('cube').shapes
+        cube_copy_shapes = controls_library.get_control('cube_copy').shapes
+        assert all(shape.cvs is shape_copy.cvs for shape, shape_copy in zip(cube_shapes, cube_copy_shapes))
+        assert all(shape.buffer is shape_copy.buffer for shape, shape_copy in zip(cube_shapes, cube_copy_shapes))
+
+    with open(sidecar.get_sidecar_path(controls_path), 'rb') as fh:
+        assert sidecar.read_header(fh.read())['shapes_count'] == report['unique_shapes']
+
+
+def test_library_mutations(controls_path):
+    controls_library = library.get_library(controls_path, lazy=True)
+    circle_data = library.get_shapes_data(controls_library.get_control('circle'))
+
+    changes = controls_library.add_control('new_circle', circle_data)
+    assert [control.name for control in changes['added']] == ['new_circle']
+    changes = controls_library.rename_control('new_circle', 'renamed_circle')
+    assert changes['renamed'] == [('new_circle', 'renamed_circle')]
+    changes = controls_library.replace_shapes('renamed_circle', library.get_shapes_data(
+        controls_library.get_control('handle_square')))
+    assert changes['modified'][0].name == 'renamed_circle'
+    changes = controls_library.remove_control('handle_square')
+    assert changes['removed'] == ['handle_square']
+    assert not controls_library.remove_control('handle_square')
+
+    assert library.get_library(controls_path, lazy=True) is controls_library
+    reloaded_library = library.load_library(controls_path, use_sidecar=False)
+    assert reloaded_library.control_names == controls_library.control_names
+    for control in reloaded_library:
+        assert control() == controls_library.get_control(control.name)()
+
+
+def test_library_mutations_atomic_write(controls_path, monkeypatch):
+    os.chmod(controls_path, 0o644)
+    controls_library = library.get_library(controls_path, lazy=True)
+    controls_library.remove_control('circle')
+    assert os.stat(controls_path).st_mode & 0o777 == 0o644
+    assert sorted(os.listdir(os.path.dirname(controls_path))) == ['controls_data.bin', 'controls_data.json']
+
+    # A failed write leaves the library file untouched
+    def _replace(source_path, target_path):
+        raise OSError('Impossible to replace "{}"'.format(target_path))
+
+    library_contents = open(controls_path, 'rb').read()
+    monkeypatch.setattr(os, 'replace', _replace)
+    assert not controls_library.remove_control('handle_square')
+    assert open(controls_path, 'rb').read() == library_contents
+    assert sorted(os.listdir(os.path.dirname(controls_path))) == ['controls_data.bin', 'controls_data.json']
+
+
+def test_layered_library(controls_path):
+    user_controls_path = controls_path.replace('controls_data', 'user_controls_data')
+    user_library = library.ControlsLibrary(user_controls_path)
+    user_library.add_control('circle', library.get_shapes_data(library.get_library(controls_path).get_control('cube')))
+
+    layered_library = library.LayeredLibrary([controls_path, user_controls_path])
+    layered_library.load()
+    assert len(layered_library) == 96
+    assert layered_library.get_control_layer('circle') == 1
+    assert layered_library.get_control_path('handle_square') == controls_path
+
+    changes = layered_library.add_control('user_circle', library.get_shapes_data(layered_library.get_control('cube')))
+    assert [control.name for control in changes['added']] == ['user_circle']
+    assert layered_library.get_control_layer('user_circle') == 1
+
+    changes = layered_library.remove_control('circle')
+    assert [control.name for control in changes['modified']] == ['circle']
+    assert layered_library.get_control_layer('circle') == 0
+
+    changes = layered_library.rename_control('user_circle', 'renamed_circle')
+    assert changes['renamed'] == [('user_circle', 'renamed_circle')]
+
+    library.ControlsLibrary(user_controls_path, use_sidecar=False).add_control(
+        'handle_square', library.get_shapes_data(layered_library.get_control('cube')))
+    changes = layered_library.reload_layer(1)
+    assert [control.name for control in changes['modified']] == ['handle_square']
+    assert layered_library.get_control_layer('handle_square') == 1
+
+
+def test_layered_library_missing_layer(controls_path):
+    user_controls_path = controls_path.replace('controls_data', 'user_controls_data')
+    for load in ('load', 'iter_load'):
+        layered_library = library.LayeredLibrary([controls_path, user_controls_path])
+        list(getattr(layered_library, load)() or list())
+        assert len(layered_library) == 96
+        assert layered_library.layers[1].controls_path == user_controls_path
+    assert layered_library.controls_path == user_controls_path
+
+    changes = layered_library.add_control('user_circle', library.get_shapes_data(layered_library.get_control('cube')))
+    assert [control.name for control in changes['added']] == ['user_circle']
+    assert os.path.isfile(user_controls_path)
+    assert layered_library.get_control_path('user_circle') == user_controls_path
+    assert library.load_library(user_controls_path).control_names == ['user_circle']
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_layered_library_hot_reload(controls_path, lazy):
+    layered_library = library.LayeredLibrary([controls_path], lazy=lazy)
+    layered_library.load()
+    circle = layered_library.get_control('circle')
+
+    with open(controls_path, 'rb') as fh:
+        library_document = json.loads(fh.read().decode('utf-8'))
+    library_document['controls']['new_cube'] = library_document['controls']['cube']
+    library_document['controls']['handle_square'] = library_document['controls']['cube']
+    library_document['controls'].pop('arrow')
+    with open(controls_path, 'w') as fh:
+        json.dump(library_document, fh)
+
+    changes = layered_library.reload_layer(0)
+    assert [control.name for control in changes['added']] == ['new_cube']
+    assert changes['removed'] == ['arrow']
+    assert [control.name for control in changes['modified']] == ['handle_square']
+    assert layered_library.get_control('circle') is circle
+    assert circle() == library.load_library(controls_path, use_sidecar=False).get_control('circle')()
+
+
+def test_layered_library_iter_load(controls_path):
+    user_controls_path = controls_path.replace('controls_data', 'user_controls_data')
+    library.ControlsLibrary(user_controls_path).add_control(
+        'circle', library.get_shapes_data(library.get_library(controls_path).get_control('cube')))
+    library.get_library_cache().invalidate()
+
+    layered_library = library.LayeredLibrary([controls_path, user_controls_path])
+    batches = list(layered_library.iter_load(batch_size=10))
+    assert all(0 < len(batch) <= 10 for batch in batches)
+    assert [control.name for control in batches[0]] == ['circle']
+    assert len(set(control.name for batch in batches for control in batch)) == 96
+    assert layered_library.get_control_layer('circle') == 1
+
+    # An interrupted load never caches a partially loaded library
+    library.get_library_cache().invalidate()
+    next(library.LayeredLibrary([controls_path]).iter_load(batch_size=10))
+    assert controls_path not in library.get_library_cache()
+
+
+def test_layered_library_concurrent_reads(controls_path):
+    library.get_library_cache().invalidate()
+    layered_library = library.LayeredLibrary([controls_path], lazy=True)
+    errors = list()
+
+    def _load():
+        try:
+            for _ in layered_library.iter_load(batch_size=1):
+                pass
+        except Exception as exc:
+            errors.append(exc)
+
+    load_thread = threading.Thread(target=_load)
+    load_thread.start()
+    while load_thread.is_alive():
+        for control_name in layered_library.control_names:
+            assert control_name in layered_library
+            assert layered_library.get_control_path(control_name) == controls_path
+        assert len(layered_library.controls) <= 96
+    load_thread.join()
+
+    assert not errors
+    assert len(layered_library) == 96
+
+
+def test_canonicalize_shapes():
+    shapes = [{'cvs': [[-3.9443045261050587e-32, 0.7999999999999999, 2.0], [2.0, -1.7763568394002503e-16, 4.0]],
+               'degree': 1, 'periodic': False}]
+    canonical_shapes, changes = canonicalize.canonicalize_shapes(shapes)
+    assert canonical_shapes[0]['cvs'] == [[0.0, 0.8, 2.0], [2.0, 0.0, 4.0]]
+    assert canonical_shapes[0]['degree'] == 1 and shapes[0]['cvs'][0][1] == 0.7999999999999999
+    assert changes['snapped'] == 2 and changes['max_error'] < 1e-6
+
+    canonical_shapes, changes = canonicalize.canonicalize_shapes(shapes, recenter=True, normalize=True)
+    assert changes['offset'] == pytest.approx([1.0, 0.4, 3.0])
+    assert canonical_shapes[0]['cvs'][0] == [-0.680414, 0.272166, -0.680414]
+    assert all(sum(value * value for value in cv) <= 1.0 + 1e-6 for cv in canonical_shapes[0]['cvs'])
+
+
+def test_canonicalize_library(controls_path):
+    output_path = controls_path.replace('.json', '_canonical.json')
+    os.chmod(controls_path, 0o644)
+    report = canonicalize.canonicalize_library(controls_path, output_path=output_path, precision=4)
+    assert report['output_bytes'] < report['source_bytes']
+    assert os.stat(output_path).st_mode & 0o777 == 0o644
+    assert len(report['controls']) == 96
+    assert 'handle_square' in canonicalize.format_canonicalize_report(report)
+
+    with open(output_path, 'rb') as fh:
+        library_document = json.loads(fh.read().decode('utf-8'))
+    assert library_document['categories'] == []
+    source_library = library.load_library(controls_path, use_sidecar=False)
+    canonical_library = library.load_library(output_path, use_sidecar=False)
+    assert canonical_library.control_names == source_library.control_names
+    for control in source_library.controls:
+        for shape, canonical_shape in zip(control.shapes, canonical_library.get_control(control.name).shapes):
+            assert list(canonical_shape.buffer) == pytest.approx(list(shape.buffer), abs=1e-4)
+
+    assert canonicalize.main([controls_path, '-q', '--recenter']) == 0
@@ -0,0 +1,57 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains background controls libraries loading tests for tpRigToolkit-tools-controlrig
+"""
+
+import pytest
+
+QtCore = pytest.importorskip('Qt.QtCore')
+
+from tpRigToolkit.tools.controlrig.core import library, loader, sidecar, similarity  # noqa: E402
+
+
+@pytest.fixture
+def application():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication(list())
+
+
+@pytest.mark.parametrize('lazy', [True, False])
+def test_load_twice(controls_path, application, lazy):
+    library.get_library_cache().invalidate()
+    library_loader = loader.LibraryLoader(batch_size=8)
+    loaded_libraries = list()
+    library_loader.loadFinished.connect(loaded_libraries.append)
+
+    library_loader.load(library.LayeredLibrary([controls_path], lazy=lazy))
+    library_loader.load(library.LayeredLibrary([controls_path], lazy=lazy))
+    library_loader.wait()
+
+    assert len(loaded_libraries) == 1
+    assert len(loaded_libraries[0]) == 96
+    assert all(control.shapes for control in loaded_libraries[0])
+    assert sidecar.is_sidecar_valid(controls_path)
+    assert not library_loader.is_loading
+
+
+def test_index_builder(controls_path, application):
+    controls_library = library.load_library(controls_path, lazy=True)
+    index_builder = loader.IndexBuilder(similarity.build_index)
+    indices = list()
+    index_builder.indexBuilt.connect(indices.append)
+
+    # Only the last build is notified, and cancelled builds are never notified
+    index_builder.build(controls_library.controls[:10])
+    index_builder.build(controls_library.controls)
+    assert index_builder.is_building
+    index_builder.wait()
+    assert len(indices) == 1 and len(indices[0]) == len(controls_library)
+    assert indices[0].query_control('circle', count=1)
+    assert not index_builder.is_building
+
+    index_builder.build(controls_library.controls)
+    index_builder.cancel()
+    assert not index_builder.is_building
+    index_builder.wait()
+    assert len(indices) == 1
@@ -0,0 +1,79 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains controls viewer projection tests for tpRigToolkit-tools-controlrig
+"""
+
+import math
+import itertools
+
+import pytest
+
+from tpRigToolkit.tools.controlrig.core import controldata, projection
+
+POINTS = [[0.0, 0.0, 0.0], [1.0, 2.0, 3.0], [-0.5, 0.25, 4.0], [100.0, 0.0, -100.0], [0.3, -7.0, 0.01]]
+
+
+def _convert_3D_to_2D(x, y, z, rotation, height_rotate, scale, width, height):
+    """
+    Per point camera conversion the projection replaces
+    """
+
+    _x = x * math.cos(math.radians(rotation))
+    _x -= z * math.cos(math.radians(-rotation + 90))
+    _x *= scale
+    _y = (x * math.sin(math.radians(rotation)) - y + z * math.sin(math.radians(-rotation + 90))) * scale
+    _y *= math.cos(math.radians(height_rotate))
+    _y += y * scale * (math.tan(math.radians(90 - height_rotate)) + math.sin(math.radians(height_rotate)))
+    _y *= -1
+
+    return _x + width * 0.5, _y + height * 0.5
+
+
+@pytest.mark.parametrize('rotation, height_rotate, scale', list(itertools.product(
+    [235, 0, -47.5, 720], [60, 90, 120], [30, 10, 412.7])))
+def test_projection(rotation, height_rotate, scale):
+    camera = (rotation, height_rotate, scale, 320, 240)
+    camera_projection = projection.get_projection(*camera)
+
+    projected_buffer = projection.project_buffer(controldata.get_buffer(POINTS), camera_projection)
+    assert len(projected_buffer) == 2 * len(POINTS)
+    for i, point in enumerate(POINTS):
+        expected = _convert_3D_to_2D(*(list(point) + list(camera)))
+        assert projected_buffer[2 * i:2 * i + 2].tolist() == pytest.approx(expected, rel=1e-9, abs=1e-9)
+        assert projection.project_point(point, camera_projection) == pytest.approx(expected, rel=1e-9, abs=1e-9)
+
+    assert len(projection.project_buffer(controldata.get_buffer([]), camera_projection)) == 0
+
+
+def test_frame_scale():
+    bounds = controldata.get_bounds(controldata.get_buffer([[-1.0, 0.0, -1.0], [1.0, 0.0, 1.0]]))
+    scale = projection.get_frame_scale(bounds, 200, 100)
+    camera_projection = projection.get_projection(projection.ROTATION, projection.HEIGHT_ROTATE, scale, 200, 100)
+    projected_buffer = projection.project_buffer(
+        controldata.get_buffer([[-1.0, 0.0, -1.0], [1.0, 0.0, -1.0], [1.0, 0.0, 1.0], [-1.0, 0.0, 1.0]]),
+        camera_projection)
+    assert all(0 <= value <= 200 for value in projected_buffer[0::2])
+    assert all(0 <= value <= 100 for value in projected_buffer[1::2])
+    assert projection.get_frame_scale(controldata.get_bounds(controldata.get_buffer([[0, 0, 0]])), 200, 100) is None
+
+
+def test_grid_segments():
+    segments = projection.get_grid_segments(0.5)
+    assert list(segments.keys()) == ['x_axis', 'grid', 'y_axis', 'z_axis', 'reference']
+    assert len(segments['reference']) == len(projection.REFERENCE_POINTS) - 1
+    assert segments['reference'][0] == ((0.0, 0.0, 0.25), (-0.125, 0.0, 0.2175))
+    assert len(projection.get_segments_buffer(segments['grid'])) == 6 * len(segments['grid'])
+
+
+def test_display_buffer():
+    shape = controldata.ControlShape(POINTS[:4], degree=1, periodic=True)
+    transform = controldata.get_transform_affine([0, 0, 0], [2, 2, 2], 'XYZ', None)
+    buffer = projection.get_display_buffer(shape, 30, transform=transform)
+    assert list(buffer) == [2 * value for value in controldata.get_buffer(POINTS[:4] + POINTS[:1])]
+
+    curve = controldata.ControlShape(POINTS[:4], degree=3, periodic=False)
+    buffers = [projection.get_display_buffer(curve, scale, transform=transform) for scale in [0.01, 1000]]
+    assert len(buffers[0]) < len(buffers[1])
+    assert list(buffers[1][:3]) == [2 * value for value in POINTS[0]]
@@ -0,0 +1,41 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains offscreen controls renderer tests for tpRigToolkit-tools-controlrig
+"""
+
+import os
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+pytest.importorskip('Qt.QtGui')
+
+from tpRigToolkit.tools.controlrig.core import library, renderer  # noqa: E402
+
+
+def test_render_control(controls_path):
+    control = library.load_library(controls_path).get_control('circle')
+    control_renderer = renderer.ControlRenderer(width=64, height=48, background_colors=None)
+    image = control_renderer.render(control)
+    assert (image.width(), image.height()) == (64, 48)
+    assert image.pixel(32, 24) == 0
+    assert any(image.pixel(x, y) for x in range(64) for y in range(48))
+
+
+def test_render_controls(controls_path):
+    controls_library = library.load_library(controls_path, lazy=True)
+    controls = [controls_library.get_control(control_name) for control_name in ('circle', 'cube', 'handle_square')]
+    control_renderer = renderer.ControlRenderer(width=32, height=32)
+    images = control_renderer.render_controls(controls, max_workers=2)
+    assert list(images.keys()) == ['circle', 'cube', 'handle_square']
+    for control in controls:
+        assert images[control.name] == control_renderer.render(control)
+    assert control_renderer.render_controls(list()) == dict()
+
+
+def test_render_library(controls_path, tmpdir):
+    image_paths = renderer.render_library([controls_path], str(tmpdir.join('images')), width=32, height=32)
+    assert len(image_paths) == 96
+    assert all(image_path and os.path.isfile(image_path) for image_path in image_paths.values())
@@ -0,0 +1,111 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains controls similarity index tests for tpRigToolkit-tools-controlrig
+"""
+
+import math
+import random
+from array import array
+
+import pytest
+
+from tpRigToolkit.tools.controlrig.core import library, controldata, similarity
+
+
+SQUARE = [[-1, 0, -1], [1, 0, -1], [1, 0, 1], [-1, 0, 1]]
+TRIANGLE = [[0, 0, -1], [1, 0, 1], [-1, 0, 1]]
+
+
+def _get_control(name, cvs, degree=1, periodic=True):
+    return controldata.ControlData(name, [{'cvs': cvs, 'degree': degree, 'periodic': int(periodic)}])
+
+
+def _get_transformed_cvs(cvs, angle, scale, offset):
+    cos, sin = math.cos(angle), math.sin(angle)
+    return [[(x * cos - z * sin) * scale + offset[0], y * scale + offset[1], (x * sin + z * cos) * scale + offset[2]]
+            for x, y, z in cvs]
+
+
+def test_resample():
+    points = similarity.resample([[(0.0, 0.0, 0.0), (1.0, 0.0, 0.0)], [(0.0, 1.0, 0.0), (0.0, 1.0, 3.0)]], count=4)
+    assert points == [(0.5, 0.0, 0.0), (0.0, 1.0, 0.5), (0.0, 1.0, 1.5), (0.0, 1.0, 2.5)]
+
+
+def test_signature_invariance():
+    signature = similarity.get_signature(_get_control('square', SQUARE).shapes)
+    assert len(signature) == 2 * similarity.DISTRIBUTION_SIZE
+
+    # Rotated, scaled, moved and with different start point and CVs count
+    cvs = _get_transformed_cvs(SQUARE[2:] + [[-1, 0, 0]] + SQUARE[:2], 0.7, 3.5, [2.0, -1.0, 4.0])
+    other_signature = similarity.get_signature(_get_control('square_transformed', cvs).shapes)
+    assert similarity.get_distance(signature, other_signature) < similarity.DUPLICATE_DISTANCE
+
+    triangle_signature = similarity.get_signature(_get_control('triangle', TRIANGLE).shapes)
+    assert similarity.get_distance(signature, triangle_signature) > 0.2
+
+    assert similarity.get_signature(_get_control('point', [[1, 2, 3]] * 4).shapes) is None
+
+
+def test_similarity_index():
+    controls = [_get_control('square', SQUARE), _get_control('triangle', TRIANGLE),
+                _get_control('square_big', _get_transformed_cvs(SQUARE, 1.2, 10.0, [0.0, 5.0, 0.0])),
+                _get_control('circle', [[math.cos(i * math.pi / 4), 0, math.sin(i * math.pi / 4)] for i in range(8)],
+                             degree=3)]
+    similarity_index = similarity.build_index(controls)
+    assert len(similarity_index) == 4
+
+    distances = similarity_index.get_distances(similarity_index.get_signature('square'))
+    expected = [similarity.get_distance(similarity_index.get_signature('square'), similarity_index.get_signature(
+        name)) for name in similarity_index.names]
+    assert distances == pytest.approx(expected, abs=1e-6)
+    assert similarity_index.get_distances(similarity_index.get_signature('square'), start=2) == distances[2:]
+
+    results = similarity_index.query_control('square', count=2)
+    assert [name for name, _ in results] == ['square_big', 'circle']
+    assert similarity_index.query_control('square', max_distance=similarity.DUPLICATE_DISTANCE) == [results[0]]
+    assert similarity_index.query_control('missing') == list()
+
+    assert similarity_index.find_duplicates() == [['square', 'square_big']]
+
+    similarity_index.update_controls(library.controls_changes(
+        removed=['square_big'], renamed=[('square', 'box')], added=[_get_control('triangle_2', TRIANGLE[::-1])]))
+    assert sorted(similarity_index.names) == ['box', 'circle', 'triangle', 'triangle_2']
+    assert similarity_index.find_duplicates() == [['triangle', 'triangle_2']]
+
+
+def test_duplicates_report(controls_path):
+    report = similarity.get_duplicates_report([controls_path])
+    assert report['controls'] == report['indexed_controls'] == 96
+    groups = [duplicate['controls'] for duplicate in report['duplicates']]
+    assert sorted(['cube', 'cube_base']) in [sorted(group) for group in groups]
+    assert all(duplicate['max_distance'] <= report['max_distance'] for duplicate in report['duplicates'])
+    assert 'cube_base' in similarity.format_duplicates_report(report)
+
+    # Clearly different controls, even the closest ones of the library, are not grouped
+    assert sorted(['circle', 'circle_x']) in [sorted(group) for group in groups]
+    assert not any('wave_circle2' in group or 'sphere' in group for group in groups)
+
+
+def test_find_duplicates():
+    random.seed(7)
+    similarity_index = similarity.SimilarityIndex()
+    for i in range(60):
+        similarity_index.add_signature('control_{}'.format(i), array('d', [
+            random.choice([0.0, 1.0]) + random.gauss(0.0, 0.05) for _ in range(4)]))
+
+    # Groups found comparing the signatures pair by pair
+    names = similarity_index.names
+    expected_groups = list()
+    for name in names:
+        group = set([name])
+        for other in names:
+            if similarity.get_distance(similarity_index.get_signature(name), similarity_index.get_signature(
+                    other)) <= 0.15:
+                group.update(next((expected for expected in expected_groups if other in expected), [other]))
+        expected_groups = [expected for expected in expected_groups if not expected & group] + [group]
+
+    groups = similarity_index.find_duplicates(0.15)
+    assert sorted(map(sorted, groups)) == sorted(sorted(group) for group in expected_groups if len(group) > 1)
+    assert all(group == [name for name in names if name in group] for group in groups)
@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains control shapes simplification tests for tpRigToolkit-tools-controlrig
+"""
+
+import math
+
+from tpRigToolkit.tools.controlrig.core import library, simplify, spline, controldata
+
+from .conftest import CONTROLS_PATH
+
+
+def test_simplify_polyline():
+    cvs = [[i * 0.1, 0.0, 0.0] for i in range(11)] + [[1.0, 0.0005, 1.0]]
+    shape, deviation = simplify.simplify_shape({'cvs': cvs, 'degree': 1, 'periodic': False}, tolerance=0.001)
+    assert shape['cvs'] == [cvs[0], cvs[10], cvs[11]]
+    assert deviation < 1e-12
+    assert len(cvs) == 12
+
+
+def test_simplify_closed_polyline():
+    square = [[0, 0, 0], [0.5, 0, 0], [1, 0, 0], [1, 0, 1], [1, 0, 2], [0, 0, 2], [0, 0, 1]]
+    shape, deviation = simplify.simplify_shape({'cvs': square, 'degree': 1, 'periodic': True})
+    assert shape['cvs'] == [[0, 0, 0], [1, 0, 0], [1, 0, 2], [0, 0, 2]]
+    assert deviation == 0.0
+
+
+def test_simplify_closed_polyline_closing_cv():
+    square = [[0, 0, 0], [0.5, 0, 0], [1, 0, 0], [1, 0, 2], [0, 0, 2], [0, 0, 1], [0, 0, 0]]
+    shape, deviation = simplify.simplify_shape({'cvs': square, 'degree': 1, 'periodic': True})
+    assert shape['cvs'] == [[0, 0, 0], [1, 0, 0], [1, 0, 2], [0, 0, 2], [0, 0, 0]]
+    assert deviation == 0.0
+
+    cross = library.load_library(CONTROLS_PATH, use_sidecar=False).get_control('cross').shapes[0]()
+    shape, deviation = simplify.simplify_shape(cross)
+    assert [list(cv) for cv in shape['cvs']] == [list(cv) for cv in cross['cvs']]
+    assert deviation == 0.0
+
+
+def test_simplify_curve():
+    cvs = [[math.cos(i * math.pi / 32), 0.0, math.sin(i * math.pi / 32)] for i in range(64)]
+    shape_data = {'cvs': cvs, 'degree': 3, 'periodic': True}
+    shape, deviation = simplify.simplify_shape(shape_data, tolerance=0.01)
+    assert len(shape['cvs']) < len(cvs)
+    assert deviation <= 0.01
+
+    curve_points = controldata.get_points(spline.evaluate(controldata.get_buffer(shape['cvs']), 3, True))
+    assert all(abs(math.sqrt(x * x + z * z) - 1.0) < 0.02 for x, _, z in curve_points)
+
+    shape, deviation = simplify.simplify_shape(shape_data, tolerance=0.0)
+    assert shape['cvs'] == cvs and deviation == 0.0
+
+
+def test_simplify_library(controls_path):
+    report = simplify.simplify_library(controls_path, tolerance=0.01)
+    assert report['output_bytes'] < report['source_bytes']
+    assert all(changes['simplified_cvs'] <= changes['cvs'] for changes in report['controls'].values())
+    assert sum(changes['simplified_cvs'] for changes in report['controls'].values()) < sum(
+        changes['cvs'] for changes in report['controls'].values())
+    assert max(changes['max_deviation'] for changes in report['controls'].values()) <= 0.01
+    assert 'max deviation' in simplify.format_simplify_report(report)
+    assert len(library.load_library(controls_path, use_sidecar=False)) == 96
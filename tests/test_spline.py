@@ -0,0 +1,154 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains spline evaluation tests for tpRigToolkit-tools-controlrig
+"""
+
+from __future__ import division
+
+import math
+from array import array
+
+import pytest
+
+from tpRigToolkit.tools.controlrig.core import spline
+
+CVS = [[0.0, 0.0, 0.0], [1.0, 2.0, 0.0], [3.0, 2.0, 1.0], [4.0, 0.0, -1.0], [6.0, 1.0, 0.0], [7.0, 3.0, 2.0]]
+
+
+def _buffer(cvs):
+    return array('d', [value for cv in cvs for value in cv])
+
+
+def _points(buffer):
+    return list(zip(buffer[0::3], buffer[1::3], buffer[2::3]))
+
+
+@pytest.mark.parametrize('degree', [1, 2, 3, 4])
+@pytest.mark.parametrize('subdivisions', [1, 4, 8])
+def test_basis_matrix(degree, subdivisions):
+    basis_matrix = spline.get_basis_matrix(degree, subdivisions)
+    assert len(basis_matrix) == subdivisions
+    for weights in basis_matrix:
+        assert len(weights) == degree + 1
+        assert sum(weights) == pytest.approx(1.0)
+        assert min(weights) >= 0.0
+
+
+def test_uniform_cubic_basis():
+    basis_matrix = spline.get_basis_matrix(3, 2)
+    assert basis_matrix[0] == pytest.approx((1 / 6, 4 / 6, 1 / 6, 0.0))
+    assert basis_matrix[1] == pytest.approx((1 / 48, 23 / 48, 23 / 48, 1 / 48))
+
+
+@pytest.mark.parametrize('degree', [1, 2, 3])
+def test_open_curve(degree):
+    points = _points(spline.evaluate(_buffer(CVS), degree, False, subdivisions=4))
+
+    assert len(points) == 4 * (len(CVS) - degree) + 1
+    assert points[0] == pytest.approx(CVS[0])
+    assert points[-1] == pytest.approx(CVS[-1])
+    if degree == 1:
+        assert points[::4] == pytest.approx([tuple(cv) for cv in CVS])
+
+
+def test_open_quadratic_curve():
+    points = _points(spline.evaluate(_buffer(CVS[:3]), 2, False, subdivisions=2))
+    assert points[1] == pytest.approx([0.25 * a + 0.5 * b + 0.25 * c for a, b, c in zip(*CVS[:3])])
+
+
+@pytest.mark.parametrize('degree', [1, 2, 3])
+def test_periodic_curve(degree):
+    buffer = _buffer(CVS)
+    points = _points(spline.evaluate(buffer, degree, True, subdivisions=4))
+
+    assert len(points) == 4 * len(CVS) + 1
+    assert points[0] == pytest.approx(points[-1])
+    if degree == 3:
+        assert points[0] == pytest.approx([(a + 4 * b + c) / 6 for a, b, c in zip(*CVS[:3])])
+
+    # Overlapping CVs stored at the end of the curve are ignored
+    overlapped_buffer = buffer + buffer[:3 * degree]
+    assert list(spline.evaluate(overlapped_buffer, degree, True, subdivisions=4)) == list(
+        spline.evaluate(buffer, degree, True, subdivisions=4))
+
+
+def test_not_enough_cvs():
+    buffer = _buffer(CVS[:2])
+    assert list(spline.evaluate(buffer, 3, False)) == list(buffer)
+
+
+def test_tessellation_cache():
+    from tpRigToolkit.tools.controlrig.core.controldata import ControlShape
+
+    cache = spline.TessellationCache(max_size=2)
+    shape = ControlShape(CVS, degree=3, periodic=True)
+    shape_copy = ControlShape([list(cv) for cv in CVS], degree=3, periodic=True)
+    buffer = array('d', shape.buffer)
+
+    tessellation = cache.get(shape)
+    assert list(tessellation) == list(spline.evaluate(buffer, 3, True))
+    assert list(shape.buffer) == list(buffer) and shape.cvs == CVS
+    assert cache.get(shape_copy) is tessellation
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.get(shape, subdivisions=2)
+    cache.get(ControlShape(CVS, degree=2, periodic=False))
+    assert len(cache) == 2
+    assert cache.get(shape) is not tessellation
+    assert cache.misses == 4
+
+
+def test_evaluation_matrices_cache():
+    matrix = spline.get_evaluation_matrix(3, 4, True, len(CVS))
+    assert spline.get_evaluation_matrix(3, 4, True, len(CVS)) is matrix
+
+    for cvs_count in range(4, 4 + 2 * spline.MATRICES_CACHE_SIZE):
+        spline.get_evaluation_matrix(3, 2, False, cvs_count)
+    assert len(spline._matrices_cache) == spline.MATRICES_CACHE_SIZE
+    assert spline.get_evaluation_matrix(3, 4, True, len(CVS)) is not matrix
+
+
+def test_adaptive_subdivisions():
+    buffer = _buffer(CVS)
+    assert spline.get_curvature_bound(buffer, 1, False) == 0.0
+    assert spline.get_curvature_bound(_buffer([[0, 0, 0], [1, 1, 1], [2, 2, 2]]), 3, False) == 0.0
+
+    curvature_bound = spline.get_curvature_bound(buffer, 3, True)
+    assert curvature_bound > 0.0 and spline.get_curvature_bound(buffer, 3, False) > 0.0
+    assert spline.get_adaptive_subdivisions(0.0, 1000) == 1
+
+    subdivisions = [spline.get_adaptive_subdivisions(curvature_bound, scale) for scale in (1, 10, 100, 1000, 1e6)]
+    assert subdivisions == sorted(subdivisions)
+    assert subdivisions[-1] == spline.MAX_SUBDIVISIONS
+    for scale, count in zip((1, 10, 100), subdivisions):
+        assert curvature_bound * scale / (8.0 * count * count) <= spline.TOLERANCE
+        assert count & (count - 1) == 0
+
+
+def _get_segment_distance(point, start, end):
+    segment = [b - a for a, b in zip(start, end)]
+    offset = [b - a for a, b in zip(start, point)]
+    squared_length = sum(value * value for value in segment)
+    t = max(0.0, min(1.0, sum(a * b for a, b in zip(segment, offset)) / squared_length)) if squared_length else 0.0
+    return math.sqrt(sum((a - t * b) ** 2 for a, b in zip(offset, segment)))
+
+
+@pytest.mark.parametrize('degree', [2, 3, 4])
+@pytest.mark.parametrize('cvs', [
+    CVS, [[0, 0, 0], [3, 0, 0], [3, 0.2, 0], [3, 0.4, 0], [3, 0.6, 0], [0, 0.6, 0.1], [0, 3, 0]]])
+def test_clamped_ends_chord_error(degree, cvs):
+    buffer = _buffer(cvs)
+    curvature_bound = spline.get_curvature_bound(buffer, degree, False)
+    for scale in (1, 4, 16):
+        subdivisions = spline.get_adaptive_subdivisions(curvature_bound, scale)
+        if subdivisions >= spline.MAX_SUBDIVISIONS:
+            continue
+        points = _points(spline.evaluate(buffer, degree, False, subdivisions=subdivisions))
+        dense_points = _points(spline.evaluate(buffer, degree, False, subdivisions=16 * subdivisions))
+        end_segments = list(range(subdivisions)) + list(range(len(points) - 1 - subdivisions, len(points) - 1))
+        for i in end_segments:
+            chord_error = max(_get_segment_distance(
+                dense_points[16 * i + j], points[i], points[i + 1]) for j in range(17))
+            assert chord_error * scale <= spline.TOLERANCE
@@ -0,0 +1,149 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains controls libraries canonicalization for tpRigToolkit.tools.controlrig. CVs coordinates are
+cleaned (near zero noise is snapped to zero and values are rounded to a fixed precision) and, optionally, controls
+are recentered and normalized to unit size. Libraries are streamed, so they are never fully loaded in memory
+Usage: python -m tpRigToolkit.tools.controlrig.core.canonicalize [-h] [-o OUTPUT] [-p PRECISION] [-s SNAP]
+    [--recenter] [--normalize] [-q] controls_path
+"""
+
+from __future__ import print_function, division, absolute_import
+
+import sys
+import math
+import argparse
+from array import array
+from collections import OrderedDict
+
+from tpRigToolkit.tools.controlrig.core import controldata, library
+
+PRECISION = 6
+SNAP_TOLERANCE = 1e-9
+
+
+def canonicalize_shapes(
+        shapes, precision=PRECISION, snap_tolerance=SNAP_TOLERANCE, recenter=False, normalize=False):
+    """
+    Returns the canonical version of the given control shapes. All the CVs of the control are processed at once
+    :param shapes: list(dict) or dict, shapes of a control as stored in controls library files
+    :param precision: int or None, number of decimals coordinates are rounded to. If None, values are not rounded
+    :param snap_tolerance: float, coordinates whose absolute value is lower than this value are snapped to zero
+    :param recenter: bool, whether or not the center of the bounding box of the control is moved to the origin
+    :param normalize: bool, whether or not the control is scaled so it fits in a sphere of radius one
+    :return: tuple(list(OrderedDict), OrderedDict), canonical shapes and changes applied to the control
+    """
+
+    if isinstance(shapes, dict):
+        shapes = list(shapes.values())
+
+    buffer = controldata.get_buffer([cv for shape in shapes for cv in shape['cvs']])
+    bounds = controldata.get_bounds(buffer)
+    offset = [0.0, 0.0, 0.0]
+    scale = 1.0
+    if bounds and recenter:
+        offset = list(bounds.center)
+    if bounds and normalize:
+        extent = bounds.radius
+        if not recenter:
+            extent += math.sqrt(sum(value * value for value in bounds.center))
+        if extent > 0:
+            scale = 1.0 / extent
+
+    transformed_buffer = array('d', buffer)
+    if recenter or normalize:
+        for axis in range(3):
+            transformed_buffer[axis::3] = array(
+                'd', [(value - offset[axis]) * scale for value in buffer[axis::3]])
+
+    # Snapped and rounded values that are negative zeros are stored as zeros
+    canonical_values = [
+        0.0 if -snap_tolerance < value < snap_tolerance else (
+            round(value, precision) if precision is not None else value) or 0.0 for value in transformed_buffer]
+    snapped_count = sum(1 for value in transformed_buffer if value and -snap_tolerance < value < snap_tolerance)
+    max_error = max([abs(a - b) for a, b in zip(transformed_buffer, canonical_values)] or [0.0]) / scale
+
+    canonical_shapes = list()
+    start = 0
+    for shape in shapes:
+        end = start + 3 * len(shape['cvs'])
+        canonical_shape = OrderedDict(shape)
+        canonical_shape['cvs'] = [canonical_values[i:i + 3] for i in range(start, end, 3)]
+        canonical_shapes.append(canonical_shape)
+        start = end
+
+    changes = OrderedDict([
+        ('cvs', len(buffer) // 3),
+        ('snapped', snapped_count),
+        ('max_error', max_error),
+        ('offset', offset),
+        ('scale', scale)
+    ])
+
+    return canonical_shapes, changes
+
+
+def canonicalize_library(controls_path, output_path=None, **kwargs):
+    """
+    Canonicalizes all the controls of the given library and writes them to the given path
+    :param controls_path: str, path of the library to canonicalize
+    :param output_path: str or None, path where canonical library is written. If not given, library is overwritten
+    :param kwargs: dict, canonicalization options (see canonicalize_shapes function)
+    :return: OrderedDict or None, report with the changes applied to each control
+    """
+
+    return library.rewrite_library(
+        controls_path, lambda control_name, shapes: canonicalize_shapes(shapes, **kwargs), output_path=output_path)
+
+
+def format_canonicalize_report(report):
+    """
+    Returns a human readable version of the given canonicalization report
+    :param report: dict, report returned by canonicalize_library function
+    :return: str
+    """
+
+    lines = list()
+    for control_name, changes in report['controls'].items():
+        lines.append('{}: cvs: {}, snapped: {}, max error: {:.3g}, offset: ({}), scale: {:.6g}'.format(
+            control_name, changes['cvs'], changes['snapped'], changes['max_error'],
+            ', '.join('{:.6g}'.format(value) for value in changes['offset']), changes['scale']))
+    lines.append('Controls library: {} -> {}'.format(report['controls_path'], report['output_path']))
+    lines.append('Controls: {}, bytes: {} -> {}'.format(
+        len(report['controls']), report['source_bytes'], report['output_bytes']))
+
+    return '\n'.join(lines)
+
+
+def main(args=None):
+    """
+    Canonicalizes the controls library given in the command line arguments
+    :param args: list(str) or None, command line arguments. If not given, system arguments are used
+    :return: int, exit code
+    """
+
+    parser = argparse.ArgumentParser(description='Canonicalizes the CVs of all the controls of a controls library')
+    parser.add_argument('controls_path', help='Path of the controls library file')
+    parser.add_argument('-o', '--output', help='Path where canonical library is written (overwrites by default)')
+    parser.add_argument('-p', '--precision', type=int, default=PRECISION, help='Number of decimals of coordinates')
+    parser.add_argument('-s', '--snap', type=float, default=SNAP_TOLERANCE, help='Near zero values tolerance')
+    parser.add_argument('--recenter', action='store_true', help='Moves the center of each control to the origin')
+    parser.add_argument('--normalize', action='store_true', help='Scales each control to unit size')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Does not print the changes of each control')
+    parsed_args = parser.parse_args(args)
+
+    report = canonicalize_library(
+        parsed_args.controls_path, output_path=parsed_args.output, precision=parsed_args.precision,
+        snap_tolerance=parsed_args.snap, recenter=parsed_args.recenter, normalize=parsed_args.normalize)
+    if not report:
+        return 1
+
+    report_lines = format_canonicalize_report(report).split('\n')
+    print('\n'.join(report_lines[-2:] if parsed_args.quiet else report_lines))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,10 +6,15 @@ Module that contains data definition for CV based controls
 
 from __future__ import print_function, division, absolute_import, unicode_literals
 
-from copy import copy
+import math
+import hashlib
+import threading
+from array import array
+from numbers import Number
 
 axis_eq = {'X': 0, 'Y': 1, 'Z': 2}
 rot_orders = ['XYZ', 'YXZ', 'ZYX']
+mirror_planes = {None: (1, 1, 1), 'None': (1, 1, 1), 'XY': (1, 1, -1), 'YZ': (-1, 1, 1), 'ZX': (1, -1, 1)}
 
 
 class ControlPool(set):
@@ -55,56 +60,49 @@ class ControlPool(set):
     # endregion
 
 
-class ControlV(list):
+class ControlV(tuple):
     """
-    Base class used to represent curve CVs
+    Base class used to represent curve CVs. CVs are immutable three components vectors: arithmetic operators return
+    new vectors and scalars are broadcast to the three components
     """
 
-    def ControlVWrapper(self):
-        def wrapper(*args, **kwargs):
-            f = self(*[a if isinstance(a, ControlV) else ControlV([a, a, a]) for a in args], **kwargs)
-            return f
-        return wrapper
+    __slots__ = ()
 
-    @ControlVWrapper
     def __mul__(self, other):
-        return ControlV([self[i] * other[i] for i in range(3)])
+        if isinstance(other, Number):
+            return ControlV((self[0] * other, self[1] * other, self[2] * other))
+        return ControlV((self[0] * other[0], self[1] * other[1], self[2] * other[2]))
 
-    @ControlVWrapper
     def __sub__(self, other):
-        return ControlV([self[i] - other[i] for i in range(3)])
+        if isinstance(other, Number):
+            return ControlV((self[0] - other, self[1] - other, self[2] - other))
+        return ControlV((self[0] - other[0], self[1] - other[1], self[2] - other[2]))
 
-    @ControlVWrapper
     def __add__(self, other):
-        return ControlV([self[i] + other[i] for i in range(3)])
+        if isinstance(other, Number):
+            return ControlV((self[0] + other, self[1] + other, self[2] + other))
+        return ControlV((self[0] + other[0], self[1] + other[1], self[2] + other[2]))
 
-    def __imul__(self, other):
-        return self * other
+    # Reversed operators keep the operands order, so "scalar - vector" is computed as "vector - scalar"
+    __rmul__ = __imul__ = __mul__
+    __rsub__ = __isub__ = __sub__
+    __radd__ = __iadd__ = __add__
 
-    def __rmul__(self, other):
-        return self * other
+    # CVs used to be lists, so vectors still compare equal to lists (and tuples) with the same components
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple)):
+            return tuple.__eq__(self, tuple(other))
+        return NotImplemented
 
-    def __isub__(self, other):
-        return self - other
+    def __ne__(self, other):
+        is_equal = self.__eq__(other)
+        return is_equal if is_equal is NotImplemented else not is_equal
 
-    def __rsub__(self, other):
-        return self - other
-
-    def __iadd__(self, other):
-        return self + other
-
-    def __radd__(self, other):
-        return self + other
+    __hash__ = tuple.__hash__
 
     @staticmethod
     def mirror_vector():
-        return {
-            None: ControlV([1, 1, 1]),
-            'None': ControlV([1, 1, 1]),
-            'XY': ControlV([1, 1, -1]),
-            'YZ': ControlV([-1, 1, 1]),
-            'ZX': ControlV([1, -1, 1])
-        }
+        return dict((plane, ControlV(vector)) for plane, vector in mirror_planes.items())
 
     def reorder(self, order):
         """
@@ -117,36 +115,68 @@ class ControlV(list):
 
 class ControlShape(object):
     """
-    Base class that handles control shapes as a sequences of points in space
+    Base class that handles control shapes as a sequences of points in space. Points are stored in flat buffers of
+    doubles (x, y, z of each point one after another). Buffers are never modified in place, so identical shapes can
+    share them
     """
 
-    def __init__(self, cvs=None, degree=1, periodic=False):
+    def __init__(self, cvs=None, degree=1, periodic=False, buffer=None):
         super(ControlShape, self).__init__()
 
-        self.__cvs__ = [ControlV(pt) for pt in copy(cvs)]       # Original coordinates
-        self._cvs = cvs                                         # Common coordinates, if the shape is smoothed
-        self._transformed_cvs = cvs                             # Last coordinates, the ones with the transforms
+        # Original coordinates. Immutable CVs and buffers are shared between identical shapes, so they are not copied
+        self.__cvs__ = cvs if isinstance(cvs, tuple) else [list(pt) for pt in cvs or list()]
+        self._buffer = get_buffer(cvs) if buffer is None else buffer    # Common coordinates, if the shape is smoothed
+        self._transformed_buffer = self._buffer                         # Last coordinates, the ones with the transforms
+        self._cvs = cvs
+        self._transformed_cvs = cvs
         self._degree = degree
         self._periodic = periodic
         self._smooth = False
+        self._content_hash = None
 
-        self._transform_offset = ControlV([0, 0, 0])
-        self._transform_factor = ControlV([-1, -1, -1])
-        self._transform_axis = range(3)
-        self._transform_mirror = ControlV.mirror_vector()[None]
+        self._transform = get_transform_affine([0, 0, 0], [-1, -1, -1], 'XYZ', None, offset_sign=1)
 
     def get_cvs(self):
+        if self._cvs is None:
+            self._cvs = get_points(self._buffer)
         return self._cvs
 
     def set_cvs(self, cvs):
+        self._buffer = get_buffer(cvs)
         self._cvs = cvs
+        self._content_hash = None
 
     def get_transformed_cvs(self):
+        if self._transformed_cvs is None:
+            self._transformed_cvs = get_points(self._transformed_buffer)
         return self._transformed_cvs
 
     def set_transformed_cvs(self, cvs):
+        self._transformed_buffer = get_buffer(cvs)
         self._transformed_cvs = cvs
 
+    def get_buffer(self):
+        return self._buffer
+
+    def set_buffer(self, buffer):
+        self._buffer = buffer
+        self._cvs = None
+        self._content_hash = None
+
+    def get_content_hash(self):
+        if self._content_hash is None:
+            self._content_hash = get_buffer_hash(self._buffer)
+        return self._content_hash
+
+    def get_transformed_buffer(self):
+        return self._transformed_buffer
+
+    def get_transform_affine(self):
+        return self._transform
+
+    def get_transform_scale(self):
+        return max(abs(factor) for _, factor, _, _ in self._transform)
+
     def get_degree(self):
         return self._degree
 
@@ -161,6 +191,11 @@ class ControlShape(object):
 
     cvs = property(get_cvs, set_cvs)
     transformed_cvs = property(get_transformed_cvs, set_transformed_cvs)
+    buffer = property(get_buffer, set_buffer)
+    content_hash = property(get_content_hash)
+    transform_affine = property(get_transform_affine)
+    transform_scale = property(get_transform_scale)
+    transformed_buffer = property(get_transformed_buffer)
     degree = property(get_degree)
     periodic = property(get_periodic)
     smooth = property(get_smooth, set_smooth)
@@ -187,14 +222,8 @@ class ControlShape(object):
         Apply the transforms to the current shape
         """
 
-        points = copy(self._cvs)
-        for i, point in enumerate(points):
-            point = ControlV(point) * self._transform_factor
-            point -= self._transform_offset
-            point *= self._transform_mirror
-            points[i] = point.reorder(self._transform_axis)
-
-        self._transformed_cvs = points
+        self._transformed_buffer = transform_buffer(self._buffer, self._transform)
+        self._transformed_cvs = None
 
     def transform(self, offset, scale, axis, mirror):
         """
@@ -205,13 +234,22 @@ class ControlShape(object):
         :param mirror:
         """
 
-        order = [axis_eq[x] for x in axis]
-        self._transform_offset = -1 * ControlV(offset).reorder(order)
-        self._transform_factor = ControlV(scale).reorder(order)
-        self._transform_axis = order
-        self._transform_mirror = ControlV.mirror_vector()[mirror]
+        self.set_transform(get_transform_affine(offset, scale, axis, mirror))
 
-        self.apply_transform()
+    def set_transform(self, transform, transformed_buffer=None):
+        """
+        Stores the given affine transform
+        :param transform: tuple(tuple(int, float, float, int)), affine transform returned by get_transform_affine
+        :param transformed_buffer: array or None, shape coordinates already transformed. If not given, the transform
+            is applied to the shape
+        """
+
+        self._transform = transform
+        if transformed_buffer is None:
+            self.apply_transform()
+        else:
+            self._transformed_buffer = transformed_buffer
+            self._transformed_cvs = None
 
 
 class ControlData(object):
@@ -223,36 +261,11 @@ class ControlData(object):
         super(ControlData, self).__init__()
 
         self._name = name
-        self._shapes = list()
+        self._shapes = self._build_shapes(control_data)
         self._parent = parent
         self._data = control_data
-
-        if isinstance(control_data, (list, tuple)):
-            for ctrl in control_data:
-                if 'periodic' not in ctrl:
-                    if 'form' in ctrl:
-                        ctrl['periodic'] = 1 if ctrl['form'] == 3 else 0
-                    else:
-                        ctrl['periodic'] = 1
-
-                self._shapes.append(ControlShape(
-                    cvs=ctrl['cvs'],
-                    degree=ctrl['degree'],
-                    periodic=ctrl['periodic']
-                ))
-        else:
-            for shape_name, shape_data in control_data.items():
-                if 'periodic' not in shape_data:
-                    if 'form' in shape_data:
-                        shape_data['periodic'] = 1 if shape_data['form'] == 3 else 0
-                    else:
-                        shape_data['periodic'] = 1
-
-                self._shapes.append(ControlShape(
-                    cvs=shape_data['cvs'],
-                    degree=shape_data['degree'],
-                    periodic=shape_data['periodic']
-                ))
+        self._bounds = get_shapes_bounds(self._shapes)
+        self._transformed_bounds = self._bounds
 
     @property
     def name(self):
@@ -274,5 +287,406 @@ class ControlData(object):
     def parent(self):
         return self._parent
 
+    @property
+    def bounds(self):
+        return self._bounds
+
+    @property
+    def transformed_bounds(self):
+        return self._transformed_bounds
+
     def __call__(self):
-        return self.name, [shape() for shape in self._shapes]
+        return self.name, [shape() for shape in self.shapes]
+
+    def transform(self, offset, scale, axis, mirror):
+        """
+        Transforms all the shapes of the control at once. Transformed coordinates of all the shapes are stored in one
+        buffer and the transformed buffer of each shape is a view of its part of that buffer. Bounds of the control
+        are transformed without visiting its CVs
+        :param offset: position offset
+        :param scale:  scale factor
+        :param axis:  axis order
+        :param mirror:
+        :return: array, transformed coordinates of all the shapes
+        """
+
+        transform = get_transform_affine(offset, scale, axis, mirror)
+        shapes = self.shapes
+        self._transformed_bounds = self._bounds.transformed(transform) if self._bounds else None
+
+        return apply_shapes_transform(shapes, transform)
+
+    @staticmethod
+    def _build_shapes(control_data):
+        """
+        Internal function that creates the shapes of a control from its data
+        :param control_data: list(dict) or dict
+        :return: list(ControlShape)
+        """
+
+        shapes = list()
+        if not control_data:
+            return shapes
+
+        if isinstance(control_data, (list, tuple)):
+            shapes_data = control_data
+        else:
+            shapes_data = control_data.values()
+
+        for shape_data in shapes_data:
+            if 'periodic' not in shape_data:
+                if 'form' in shape_data:
+                    shape_data['periodic'] = 1 if shape_data['form'] == 3 else 0
+                else:
+                    shape_data['periodic'] = 1
+
+            shapes.append(ControlShape(
+                cvs=shape_data['cvs'],
+                degree=shape_data['degree'],
+                periodic=shape_data['periodic'],
+                buffer=shape_data.get('buffer', None)
+            ))
+
+        return shapes
+
+
+class LazyControlData(ControlData):
+    """
+    Storage class for controls whose shapes are only decoded the first time they are accessed
+    """
+
+    def __init__(self, name='', data_loader=None, parent=None):
+        super(LazyControlData, self).__init__(name=name, control_data=None, parent=parent)
+
+        self._data_loader = data_loader
+        self._loaded = data_loader is None
+        self._load_lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    @property
+    def data_loader(self):
+        return self._data_loader
+
+    @data_loader.setter
+    def data_loader(self, loader):
+        if not self._loaded:
+            self._data_loader = loader
+
+    @property
+    def data(self):
+        self._load()
+        return self._data
+
+    @property
+    def shapes(self):
+        self._load()
+        return self._shapes
+
+    @property
+    def bounds(self):
+        self._load()
+        return self._bounds
+
+    @property
+    def transformed_bounds(self):
+        self._load()
+        return self._transformed_bounds
+
+    def _load(self):
+        """
+        Internal function that loads control data and creates its shapes. Controls can be loaded from any thread
+        """
+
+        if self._loaded:
+            return
+
+        with self._load_lock:
+            if self._loaded:
+                return
+            self._data = self._data_loader()
+            self._shapes = self._build_shapes(self._data)
+            self._bounds = get_shapes_bounds(self._shapes)
+            self._transformed_bounds = self._bounds
+            self._data_loader = None
+            self._loaded = True
+
+
+class ControlBounds(object):
+    """
+    Bounding volumes of the CVs of a control: axis aligned bounding box, bounding sphere and centroid. Curves are
+    contained in the convex hull of their CVs, so these volumes also bound the drawn curves
+    """
+
+    def __init__(self, minimum, maximum, centroid, center, radius):
+        super(ControlBounds, self).__init__()
+
+        self._minimum = tuple(minimum)
+        self._maximum = tuple(maximum)
+        self._centroid = tuple(centroid)
+        self._center = tuple(center)
+        self._radius = radius
+
+    @property
+    def minimum(self):
+        return self._minimum
+
+    @property
+    def maximum(self):
+        return self._maximum
+
+    @property
+    def size(self):
+        return tuple(maximum - minimum for minimum, maximum in zip(self._minimum, self._maximum))
+
+    @property
+    def centroid(self):
+        return self._centroid
+
+    @property
+    def center(self):
+        return self._center
+
+    @property
+    def radius(self):
+        return self._radius
+
+    def transformed(self, transform):
+        """
+        Returns the bounds of the CVs once the given affine transform is applied to them. As the transform only
+        scales, swaps and flips axes, the corners of the bounding box are mapped to the corners of the new one
+        :param transform: tuple(tuple(int, float, float, int)), affine transform returned by get_transform_affine
+        :return: ControlBounds
+        """
+
+        first_corner = transform_point(self._minimum, transform)
+        second_corner = transform_point(self._maximum, transform)
+
+        return ControlBounds(
+            [min(values) for values in zip(first_corner, second_corner)],
+            [max(values) for values in zip(first_corner, second_corner)],
+            transform_point(self._centroid, transform),
+            transform_point(self._center, transform),
+            self._radius * max(abs(factor) for _, factor, _, _ in transform))
+
+    def get_normalization_factor(self, radius=1.0):
+        """
+        Returns the uniform scale factor that makes the bounding sphere of the control have the given radius
+        :param radius: float
+        :return: float
+        """
+
+        if self._radius <= 0:
+            return 1.0
+
+        return radius / self._radius
+
+
+class BufferView(object):
+    """
+    Read-only view of a contiguous part of a flat buffer of doubles. Slices are read directly from the viewed buffer
+    """
+
+    __slots__ = ('_buffer', '_start', '_size')
+
+    def __init__(self, buffer, start=0, stop=None):
+        super(BufferView, self).__init__()
+
+        self._buffer = buffer
+        self._start, stop, _ = slice(start, stop).indices(len(buffer))
+        self._size = max(stop - self._start, 0)
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for i in range(self._start, self._start + self._size):
+            yield self._buffer[i]
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(self._size)
+            if step > 0:
+                return self._buffer[self._start + start:self._start + max(stop, start):step]
+            return self.tolist()[item]
+        return self._buffer[self._start + range(self._size)[item]]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    @property
+    def buffer(self):
+        return self._buffer
+
+    @property
+    def start(self):
+        return self._start
+
+    def tolist(self):
+        return self._buffer[self._start:self._start + self._size].tolist()
+
+    def tobytes(self):
+        buffer = self._buffer[self._start:self._start + self._size]
+        return buffer.tobytes() if hasattr(buffer, 'tobytes') else buffer.tostring()
+
+
+def get_bounds(buffer):
+    """
+    Returns the bounds of the points stored in the given flat buffer of doubles
+    :param buffer: array
+    :return: ControlBounds or None
+    """
+
+    if not buffer:
+        return None
+
+    axes_values = [buffer[axis::3] for axis in range(3)]
+    points_count = len(axes_values[0])
+    minimum = [min(values) for values in axes_values]
+    maximum = [max(values) for values in axes_values]
+    centroid = [sum(values) / points_count for values in axes_values]
+    cx, cy, cz = center = [(low + high) * 0.5 for low, high in zip(minimum, maximum)]
+    radius = math.sqrt(max((x - cx) ** 2 + (y - cy) ** 2 + (z - cz) ** 2 for x, y, z in zip(*axes_values)))
+
+    return ControlBounds(minimum, maximum, centroid, center, radius)
+
+
+def get_shapes_bounds(shapes):
+    """
+    Returns the bounds of the CVs of all the given shapes
+    :param shapes: list(ControlShape)
+    :return: ControlBounds or None
+    """
+
+    buffer = array('d')
+    for shape in shapes:
+        buffer.extend(shape.buffer)
+
+    return get_bounds(buffer)
+
+
+def get_buffer(cvs):
+    """
+    Returns a flat buffer of doubles with the coordinates of the given points
+    :param cvs: list(list(float, float, float)) or None
+    :return: array
+    """
+
+    return array('d', [value for cv in cvs or list() for value in cv[:3]])
+
+
+def get_buffer_hash(buffer):
+    """
+    Returns the SHA1 hash of the coordinates stored in the given flat buffer of doubles
+    :param buffer: array
+    :return: str
+    """
+
+    return hashlib.sha1(buffer.tobytes() if hasattr(buffer, 'tobytes') else buffer.tostring()).hexdigest()
+
+
+def get_points(buffer):
+    """
+    Returns the points stored in the given flat buffer of doubles
+    :param buffer: array
+    :return: list(tuple(float, float, float))
+    """
+
+    return list(zip(buffer[0::3], buffer[1::3], buffer[2::3]))
+
+
+def get_transform_affine(offset, scale, axis, mirror, offset_sign=-1):
+    """
+    Returns the affine transform that applies the given offset, scale, axis order and mirror plane to a point.
+    Because axis reorder and mirror only swap and flip axes, the transform matrix is a scaled and signed permutation
+    matrix, so it is stored by rows as (source axis, factor, translation, mirror) tuples
+    Each transformed coordinate is computed as ((point[source axis] * factor) - translation) * mirror, so results
+    are exactly the same ones obtained transforming each point with ControlV operations
+    :param offset: list(float), position offset
+    :param scale: list(float), scale factor
+    :param axis: str, axis order
+    :param mirror: str or None, mirror plane
+    :param offset_sign: int, sign applied to the offset before subtracting it from the scaled points
+    :return: tuple(tuple(int, float, float, int))
+    """
+
+    order = [axis_eq[x] for x in axis]
+    mirror_vector = mirror_planes[mirror]
+
+    # Offset and scale are reordered before being applied and the result is reordered again
+    return tuple(
+        (order[i], scale[order[order[i]]], offset_sign * offset[order[order[i]]], mirror_vector[order[i]])
+        for i in range(3))
+
+
+def transform_buffer(buffer, transform):
+    """
+    Returns a new flat buffer with the given affine transform applied to all the points of the given buffer
+    :param buffer: array
+    :param transform: tuple(tuple(int, float, float, int)), affine transform returned by get_transform_affine
+    :return: array
+    """
+
+    transformed_buffer = array('d', buffer)
+    for i, (source_axis, factor, translation, mirror) in enumerate(transform):
+        transformed_buffer[i::3] = array(
+            'd', [((value * factor) - translation) * mirror for value in buffer[source_axis::3]])
+
+    return transformed_buffer
+
+
+def transform_shapes(shapes, offset, scale, axis, mirror):
+    """
+    Transforms the given shapes at once. Coordinates of all the shapes are concatenated into one buffer, the transform
+    is applied to it and each shape gets its own part of the transformed buffer
+    :param shapes: list(ControlShape)
+    :param offset: position offset
+    :param scale:  scale factor
+    :param axis:  axis order
+    :param mirror:
+    :return: array, transformed coordinates of all the shapes
+    """
+
+    return apply_shapes_transform(shapes, get_transform_affine(offset, scale, axis, mirror))
+
+
+def apply_shapes_transform(shapes, transform):
+    """
+    Applies the given affine transform to the given shapes at once. The transformed buffer of each shape is a view
+    of its part of the returned buffer, so no coordinates are copied
+    :param shapes: list(ControlShape)
+    :param transform: tuple(tuple(int, float, float, int)), affine transform returned by get_transform_affine
+    :return: array, transformed coordinates of all the shapes
+    """
+
+    buffer = array('d')
+    for shape in shapes:
+        buffer.extend(shape.buffer)
+
+    transformed_buffer = transform_buffer(buffer, transform)
+    start = 0
+    for shape in shapes:
+        end = start + len(shape.buffer)
+        shape.set_transform(transform, BufferView(transformed_buffer, start, end))
+        start = end
+
+    return transformed_buffer
+
+
+def transform_point(point, transform):
+    """
+    Returns the given point with the given affine transform applied
+    :param point: list(float)
+    :param transform: tuple(tuple(int, float, float, int)), affine transform returned by get_transform_affine
+    :return: tuple(float, float, float)
+    """
+
+    return tuple(((point[source_axis] * factor) - translation) * mirror
+                 for source_axis, factor, translation, mirror in transform)
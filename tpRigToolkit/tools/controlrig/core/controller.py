@@ -13,17 +13,32 @@ from tpDcc import dcc
 from tpDcc.libs.python import python
 from tpDcc.libs.curves.core import curveslib
 
-from tpRigToolkit.tools.controlrig.core import consts, tool, controldata
+from tpRigToolkit.tools.controlrig.core import consts, tool, controldata, library, loader, watcher, simplify
+from tpRigToolkit.tools.controlrig.core import similarity
 
 logger = logging.getLogger(consts.TOOL_ID)
 
 
 class ControlRigController(object):
+
+    LAZY_LOAD_CONTROLS = True
+    WATCH_LIBRARIES = True
+    LIBRARIES_POLL_INTERVAL = 0
+    SIMPLIFY_TOLERANCE = simplify.TOLERANCE
+    SIMILAR_CONTROLS_COUNT = similarity.SIMILAR_CONTROLS_COUNT
+
     def __init__(self, client, model):
         super(ControlRigController, self).__init__()
 
         self._client = client
         self._model = model
+        self._library = None
+        self._loader = None
+        self._watcher = None
+        self._index_builder = None
+        self._similarity_index = None
+        self._similarity_changes = list()
+        self._similarity_requests = list()
 
     @property
     def client(self):
@@ -33,6 +48,10 @@ class ControlRigController(object):
     def model(self):
         return self._model
 
+    @property
+    def library(self):
+        return self._library
+
     def get_joint_radius(self):
         """
         Returns the radius used to display joints
@@ -41,29 +60,87 @@ class ControlRigController(object):
 
         return self.client.get_joint_radius()
 
+    def find_similar_controls(self, control_name=None, count=None, callback=None):
+        """
+        Returns the controls whose shapes are most similar to the shapes of the given control. The similarity index
+        is built the first time it is needed and it is patched with the library changes after that. Building the
+        index decodes the shapes of all the lazy controls and evaluates their curves: if a callback is given, the
+        index is built in a background thread and the callback is called with the similar controls once it is built.
+        Otherwise, it is built in the calling thread
+        :param control_name: str or None, if not given, current control is used
+        :param count: int or None, maximum number of controls to return. If not given, SIMILAR_CONTROLS_COUNT is used
+        :param callback: callable or None, function called with the similar controls
+        :return: list(tuple(str, float)) or None, names of the controls and distances of their signatures, closest
+            first. None if the similarity index is being built in background
+        """
+
+        control_name = control_name or self._model.current_control
+        if not control_name:
+            return list()
+
+        count = count if count is not None else self.SIMILAR_CONTROLS_COUNT
+        if self._similarity_index is None:
+            if callback:
+                self._similarity_requests.append((control_name, count, callback))
+                self._build_similarity_index()
+                return None
+            self._reset_similarity_index(keep_requests=True)
+            self._on_similarity_index_built(similarity.build_index(self._model.controls or list()))
+
+        similar_controls = self._similarity_index.query_control(control_name, count=count)
+        if callback:
+            callback(similar_controls)
+
+        return similar_controls
+
     def update_controls(self):
         """
         Updates available controls
         """
 
-        controls_path = self.model.controls_path
-        control_names = curveslib.get_curve_names(controls_path) or list()
-        controls_data = list()
-        for control_name in control_names:
-            try:
-                control_data = curveslib.load_curve_from_name(control_name, controls_path)
-                new_control_data = controldata.ControlData(control_name, control_data)
+        if self._loader:
+            self._loader.cancel()
 
-                # TODO: We should not add ControlData to the model, instead we should pass the dictionary there
-                controls_data.append(new_control_data)
-            except Exception as exc:
-                logger.warning('Impossible to load control "{}" : {}'.format(control_name, exc))
-                continue
+        # TODO: We should not add ControlData to the model, instead we should pass the dictionary there
+        self._library = library.LayeredLibrary(
+            self.model.controls_paths, write_layer=self.model.write_layer, lazy=self.LAZY_LOAD_CONTROLS)
+        controls_data = self._library.load()
+        self._watch_libraries()
 
+        self._reset_similarity_index()
         self._model.controls = controls_data
 
         return controls_data
 
+    def load_controls(self):
+        """
+        Loads available controls in a background thread. Current controls are cleared and controls are added to the
+        model in batches as they are loaded. Any previous load still running is cancelled
+        :return: LayeredLibrary, library being loaded
+        """
+
+        if not self._loader:
+            self._loader = loader.LibraryLoader()
+            self._loader.controlsLoaded.connect(self._on_controls_loaded)
+            self._loader.loadFinished.connect(self._on_controls_load_finished)
+
+        self._library = library.LayeredLibrary(
+            self.model.controls_paths, write_layer=self.model.write_layer, lazy=self.LAZY_LOAD_CONTROLS)
+        self._reset_similarity_index()
+        self._model.controls = list()
+        self._loader.load(self._library)
+        self._watch_libraries()
+
+        return self._library
+
+    def is_loading_controls(self):
+        """
+        Returns whether or not available controls are being loaded in background
+        :return: bool
+        """
+
+        return bool(self._loader and self._loader.is_loading)
+
     def set_current_control(self, control_name):
         """
         Sets the current control
@@ -80,6 +157,57 @@ class ControlRigController(object):
 
         self._model.controls_path = controls_path
 
+    def set_controls_paths(self, controls_paths):
+        """
+        Sets the ordered stack of libraries (from lowest to highest priority) where controls are located
+        :param controls_paths: list(str)
+        """
+
+        self._model.controls_paths = controls_paths
+
+    def set_write_layer(self, layer_index):
+        """
+        Sets the index of the library layer new controls are written into
+        :param layer_index: int
+        """
+
+        self._model.write_layer = layer_index
+        if self._library:
+            self._library.write_layer = layer_index
+
+    def reload_library_layer(self, layer_index):
+        """
+        Reloads only the given library layer and patches current controls with the changes
+        :param layer_index: int
+        :return: bool
+        """
+
+        self._wait_for_controls()
+        if not self._library or self._library.controls_paths != self._model.controls_paths:
+            self.update_controls()
+            return True
+
+        changes = self._library.reload_layer(layer_index)
+        if any(changes.values()):
+            self._update_controls(changes)
+
+        return True
+
+    def reload_library_path(self, controls_path):
+        """
+        Reloads the library layers stored in the given path and patches current controls with the changes
+        :param controls_path: str
+        :return: bool
+        """
+
+        library_key = library.get_library_key(controls_path)
+        layer_indices = [i for i, path in enumerate(self._model.controls_paths)
+                         if library.get_library_key(path) == library_key]
+        for layer_index in layer_indices:
+            self.reload_library_layer(layer_index)
+
+        return bool(layer_indices)
+
     def set_control_name(self, control_name):
         """
         Sets the name of the control to be created
@@ -112,6 +240,36 @@ class ControlRigController(object):
         default_size = self._model.default_control_size
         self._model.control_size = default_size
 
+    def fit_control_size_to_joint(self, control_name=None):
+        """
+        Sets the size of the control to be created so the control, once the current offset, factor, axis and mirror
+        are applied, fits the radius of the selected joint. Size is computed from the precomputed bounds of the
+        control, so its CVs are not visited
+        :param control_name: str or None, if not given, current control is used
+        :return: float or None, new control size
+        """
+
+        control_name = control_name or self._model.current_control
+        control = self._library.get_control(control_name) if self._library and control_name else None
+        if not control or not control.bounds:
+            return None
+
+        try:
+            joint_radius = self.get_joint_radius()
+        except (NameError, TypeError, IndexError, AttributeError):
+            joint_radius = None
+        if not joint_radius:
+            logger.warning('Select a joint to fit the size of control "{}" to its radius'.format(control_name))
+            return None
+
+        transform = controldata.get_transform_affine(
+            self._model.offset, self._model.factor, controldata.rot_orders[self._model.control_axis],
+            self._model.mirror_plane)
+        control_size = control.bounds.transformed(transform).get_normalization_factor(joint_radius)
+        self._model.control_size = control_size
+
+        return control_size
+
     def set_offset_x(self, value):
         """
         Sets the offset X value
@@ -311,12 +469,12 @@ class ControlRigController(object):
     def rename_control(self, original_name, new_name):
         """
         Renames the given control from the new name
-        :param original_name:
-        :param new_name:
-        :return:
+        :param original_name: str
+        :param new_name: str
+        :return: bool
         """
 
-        return curveslib.rename_curve(original_name, new_name, curves_path=self._model.controls_path)
+        return self._update_library('rename_control', original_name, new_name)
 
     def get_current_control_data(self, control_name=None):
         """
@@ -327,14 +485,20 @@ class ControlRigController(object):
         control_name = control_name or self._model.current_control
         if not control_name:
             return None
-        control_data = curveslib.load_curve_from_name(control_name, self._model.controls_path)
-        if not control_data:
-            return None
+        controls_path = self._get_read_controls_path()
+        if self._library and self._library.controls_paths == self._model.controls_paths:
+            if control_name not in self._library:
+                return None
+            controls_path = self._library.get_control_path(control_name)
+        else:
+            control_data = curveslib.load_curve_from_name(control_name, controls_path)
+            if not control_data:
+                return None
 
         return {
             'control_name': self._model.control_name,
             'control_type': control_name,
-            'controls_path': self._model.controls_path,
+            'controls_path': controls_path,
             'control_size': self._model.control_size,
             'translate_offset': self._model.offset,
             'scale': self._model.factor,
@@ -388,48 +552,53 @@ class ControlRigController(object):
         Adds a new control
         """
 
-        control_names = curveslib.get_curve_names(self._model.controls_path)
-        if name in control_names:
+        self._wait_for_controls()
+        if not self._library or self._library.controls_paths != self._model.controls_paths:
+            self.update_controls()
+        if name in self._library.layers[self._library.write_layer]:
             logger.error(
                 'Control "{}" already exists in the Control Data File. Aborting control add operation ...'.format(name))
             return False
 
-        control_data, control_path = curveslib.save_curve(orig, name)
+        control_data = curveslib.serialize_curve(orig)
         if not control_data:
             logger.error('Control for curve "{}" not created! Aborting control add operation ...'.format(orig))
             return False
+        control_data = self._simplify_control_data(name, control_data)
 
-        # We temporally block signals to avoid model to send updates during controls update
-        self._model.blockSignals(True)
-        try:
-            self.update_controls()
-        finally:
-            self._model.blockSignals(False)
+        if not self._update_library('add_control', name, control_data):
+            return False
 
         self.client.select_node(orig)
 
-        new_control = controldata.ControlData(name, control_data)
         return {
             'name': name,
-            'control': new_control
+            'control': self._library.get_control(name)
         }
 
-    def remove_control(self, control_name):
+    def replace_control(self, control_name, orig):
         """
-        Removes a control
+        Replaces the shapes of the given control with the shapes of the given curve
         :param control_name: str
+        :param orig: str, curve to retrieve shapes from
+        :return: bool
         """
 
-        curveslib.delete_curve(control_name, curves_path=self._model.controls_path)
+        control_data = curveslib.serialize_curve(orig)
+        if not control_data:
+            logger.error('Impossible to retrieve shapes of curve "{}"!'.format(orig))
+            return False
+        control_data = self._simplify_control_data(control_name, control_data)
 
-        # We temporally block signals to avoid model to send updates during controls update
-        self._model.blockSignals(True)
-        try:
-            self.update_controls()
-        finally:
-            self._model.blockSignals(False)
+        return self._update_library('replace_shapes', control_name, control_data)
 
-        return True
+    def remove_control(self, control_name):
+        """
+        Removes a control
+        :param control_name: str
+        """
+
+        return self._update_library('remove_control', control_name)
 
     def create_control(self, control_name=None):
 
@@ -468,7 +637,9 @@ class ControlRigController(object):
 
         target_objects = python.force_list(target_objects)
         keep_color = self._model.keep_assign_color
-        controls_path = self._model.controls_path
+        controls_path = self._get_read_controls_path()
+        if self._library and source_control_name in self._library:
+            controls_path = self._library.get_control_path(source_control_name)
         nodes_to_select = self.client.replace_control_curves(
             target_objects, control_type=source_control_name, controls_path=controls_path, keep_color=keep_color)
 
@@ -476,3 +647,157 @@ class ControlRigController(object):
             self.client.select_node(nodes_to_select, add_to_selection=True)
 
         return True
+
+    def _update_library(self, operation_name, *args):
+        """
+        Internal function that applies the given mutation operation to the current controls library and patches the
+        model with the resulting changes
+        :param operation_name: str, name of the ControlsLibrary mutation function to call
+        :return: bool
+        """
+
+        self._wait_for_controls()
+        if not self._library or self._library.controls_paths != self._model.controls_paths:
+            self.update_controls()
+
+        missing_paths = len(self._model.existing_controls_paths) != len(self._model.controls_paths)
+        changes = getattr(self._library, operation_name)(*args)
+        if not changes:
+            return False
+        # Libraries created by the operation are watched from now on
+        if missing_paths and len(self._model.existing_controls_paths) == len(self._model.controls_paths):
+            self._watch_libraries()
+        if not any(changes.values()):
+            return True
+
+        self._update_controls(changes)
+
+        return True
+
+    def _update_controls(self, changes):
+        """
+        Internal function that patches the model and the similarity index, if built, with the given library changes.
+        If the index is being built, changes are applied once it is built
+        :param changes: dict, added, removed, modified and renamed controls
+        """
+
+        if self._similarity_index is not None:
+            self._similarity_index.update_controls(changes)
+        elif self._index_builder and self._index_builder.is_building:
+            self._similarity_changes.append(changes)
+        self._model.update_controls(changes)
+
+    def _build_similarity_index(self):
+        """
+        Internal function that builds the similarity index of the current controls in a background thread, if it is
+        not being built yet. Controls still being loaded are added to the index once it is built
+        """
+
+        if not self._index_builder:
+            self._index_builder = loader.IndexBuilder(similarity.build_index)
+            self._index_builder.indexBuilt.connect(self._on_similarity_index_built)
+        if self._index_builder.is_building:
+            return
+
+        self._similarity_changes = list()
+        self._index_builder.build(self._model.controls or list())
+
+    def _reset_similarity_index(self, keep_requests=False):
+        """
+        Internal function that discards the similarity index, and the one being built, if any
+        :param keep_requests: bool, whether or not similar controls requested while the index was being built are
+            answered by the next built index
+        """
+
+        if self._index_builder:
+            self._index_builder.cancel()
+        self._similarity_index = None
+        self._similarity_changes = list()
+        if not keep_requests:
+            self._similarity_requests = list()
+
+    def _get_read_controls_path(self):
+        """
+        Internal function that returns the highest priority library that exists. Write layer library could not exist
+        yet, so it cannot be used to read controls from
+        :return: str or None
+        """
+
+        existing_controls_paths = self._model.existing_controls_paths
+
+        return existing_controls_paths[-1] if existing_controls_paths else self._model.controls_path
+
+    def _simplify_control_data(self, control_name, control_data):
+        """
+        Internal function that removes the CVs of captured shapes that are not needed to keep them within the
+        simplification tolerance
+        :param control_name: str
+        :param control_data: list(dict) or dict, captured shapes
+        :return: list(dict) or dict
+        """
+
+        if not self.SIMPLIFY_TOLERANCE or self.SIMPLIFY_TOLERANCE <= 0:
+            return control_data
+
+        simplified_data, changes = simplify.simplify_shapes(control_data, tolerance=self.SIMPLIFY_TOLERANCE)
+        logger.info('Control "{}" simplified: cvs: {} -> {}, max deviation: {:.3g}'.format(
+            control_name, changes['cvs'], changes['simplified_cvs'], changes['max_deviation']))
+
+        return simplified_data
+
+    def _watch_libraries(self):
+        """
+        Internal function that starts watching the files of the current libraries, so controls are reloaded when
+        the files are modified outside the tool
+        """
+
+        if not self.WATCH_LIBRARIES:
+            return
+
+        if not self._watcher:
+            self._watcher = watcher.LibraryWatcher(poll_interval=self.LIBRARIES_POLL_INTERVAL)
+            self._watcher.libraryChanged.connect(self.reload_library_path)
+        self._watcher.set_paths(self._model.controls_paths)
+
+    def _wait_for_controls(self):
+        """
+        Internal function that blocks until the background load of the controls, if any, is finished, so library
+        mutations are never applied to a partially loaded library
+        """
+
+        if self._loader:
+            self._loader.wait()
+
+    def _on_controls_loaded(self, controls):
+        """
+        Internal callback function that is called each time a new batch of controls is loaded in background
+        :param controls: list(ControlData)
+        """
+
+        self._update_controls(library.controls_changes(added=controls))
+
+    def _on_controls_load_finished(self, controls_library):
+        """
+        Internal callback function that is called when the background load of the controls is finished
+        :param controls_library: LayeredLibrary
+        """
+
+        logger.debug('Loaded {} controls > {}'.format(
+            len(controls_library), ', '.join(
+                '{}: {:.3f}s'.format(path, total) for path, total in controls_library.timings.items())))
+
+    def _on_similarity_index_built(self, similarity_index):
+        """
+        Internal callback function that is called when the similarity index is built. Library changes applied while
+        it was built are applied to it and pending similar controls requests are answered
+        :param similarity_index: SimilarityIndex
+        """
+
+        for changes in self._similarity_changes:
+            similarity_index.update_controls(changes)
+        self._similarity_changes = list()
+        self._similarity_index = similarity_index
+
+        similarity_requests, self._similarity_requests = self._similarity_requests, list()
+        for control_name, count, callback in similarity_requests:
+            callback(similarity_index.query_control(control_name, count=count))
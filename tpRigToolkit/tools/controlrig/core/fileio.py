@@ -0,0 +1,73 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains atomic file writing functions for tpRigToolkit.tools.controlrig
+"""
+
+from __future__ import print_function, division, absolute_import
+
+import os
+import tempfile
+
+
+def create_temp_file(file_path, mode_path=None):
+    """
+    Creates a temporary file in the folder of the given file, so it can be atomically moved over it once written.
+    Permissions of the temporary file are copied from the given mode path, if it exists, instead of the private
+    permissions temporary files are created with
+    :param file_path: str, path of the file the temporary file will replace
+    :param mode_path: str or None, path of the file permissions are copied from. If not given, file path is used
+    :return: tuple(file, str), temporary file opened for binary writing and its path
+    """
+
+    file_descriptor, temp_path = tempfile.mkstemp(
+        prefix='{}.'.format(os.path.basename(file_path)), suffix='.tmp',
+        dir=os.path.dirname(os.path.abspath(file_path)))
+    try:
+        mode_path = mode_path or file_path
+        if os.path.isfile(mode_path):
+            os.chmod(temp_path, os.stat(mode_path).st_mode & 0o777)
+        return os.fdopen(file_descriptor, 'wb'), temp_path
+    except (IOError, OSError):
+        os.close(file_descriptor)
+        os.remove(temp_path)
+        raise
+
+
+def replace_file(source_path, target_path):
+    """
+    Moves the given file over the target one. Target file is replaced atomically, so readers never find it missing
+    :param source_path: str
+    :param target_path: str
+    """
+
+    if hasattr(os, 'replace'):
+        os.replace(source_path, target_path)
+    elif os.name != 'nt':
+        # Python 2: os.rename already replaces the target atomically on POSIX
+        os.rename(source_path, target_path)
+    else:
+        # Python 2 on Windows: os.rename fails if the target exists, so the target must be removed first
+        if os.path.isfile(target_path):
+            os.remove(target_path)
+        os.rename(source_path, target_path)
+
+
+def write_file(file_path, contents):
+    """
+    Atomically writes the given contents into the given file: contents are written into a temporary file in the same
+    folder, which then replaces the file. Permissions of the file, if it already exists, are kept
+    :param file_path: str
+    :param contents: bytes
+    """
+
+    temp_file, temp_path = create_temp_file(file_path)
+    try:
+        with temp_file:
+            temp_file.write(contents)
+        replace_file(temp_path, file_path)
+    except (IOError, OSError):
+        if os.path.isfile(temp_path):
+            os.remove(temp_path)
+        raise
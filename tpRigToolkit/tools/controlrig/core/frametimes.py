@@ -0,0 +1,90 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains frame times statistics for tpRigToolkit.tools.controlrig
+"""
+
+from __future__ import print_function, division, absolute_import
+
+from collections import deque, OrderedDict
+
+FRAME_SAMPLES = 240
+
+
+class FrameTimes(object):
+    """
+    Class that keeps the durations of the last frames rendered by a widget and computes statistics from them
+    """
+
+    def __init__(self, max_samples=FRAME_SAMPLES):
+        super(FrameTimes, self).__init__()
+
+        self._samples = deque(maxlen=max(1, int(max_samples)))
+        self._count = 0
+
+    def __len__(self):
+        return len(self._samples)
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def samples(self):
+        return list(self._samples)
+
+    @property
+    def mean(self):
+        return sum(self._samples) / len(self._samples) if self._samples else 0.0
+
+    @property
+    def max(self):
+        return max(self._samples) if self._samples else 0.0
+
+    def add(self, duration):
+        """
+        Adds the duration of a new frame
+        :param duration: float, in seconds
+        """
+
+        self._samples.append(duration)
+        self._count += 1
+
+    def get_percentile(self, percentile):
+        """
+        Returns the duration that the given percentage of the last frames do not exceed
+        :param percentile: float, between 0 and 100
+        :return: float
+        """
+
+        if not self._samples:
+            return 0.0
+
+        samples = sorted(self._samples)
+        index = int(round(min(max(percentile, 0.0), 100.0) / 100.0 * (len(samples) - 1)))
+
+        return samples[index]
+
+    def get_stats(self):
+        """
+        Returns the statistics of the last frames, in milliseconds. Frames is the number of frames added since the
+        last reset and window the number of last frames the durations statistics are computed from
+        :return: OrderedDict
+        """
+
+        return OrderedDict([
+            ('frames', self._count),
+            ('window', len(self._samples)),
+            ('mean', self.mean * 1000.0),
+            ('p95', self.get_percentile(95) * 1000.0),
+            ('max', self.max * 1000.0)
+        ])
+
+    def reset(self):
+        """
+        Removes all the frame durations
+        """
+
+        self._samples.clear()
+        self._count = 0
@@ -0,0 +1,1438 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains control libraries loading implementation for tpRigToolkit.tools.controlrig
+"""
+
+from __future__ import print_function, division, absolute_import
+
+import os
+import json
+import struct
+import hashlib
+import logging
+import timeit
+import threading
+from copy import copy
+from functools import partial
+from multiprocessing.pool import ThreadPool
+from collections import OrderedDict
+
+from tpRigToolkit.tools.controlrig.core import consts, controldata, fileio, sidecar, streamreader
+
+logger = logging.getLogger(consts.TOOL_ID)
+
+LOAD_BATCH_SIZE = 32
+
+
+class ControlsLibrary(object):
+    """
+    Class that loads all the controls stored in a controls library file parsing the file only once
+    """
+
+    def __init__(self, controls_path=None, use_sidecar=True, lazy=False):
+        super(ControlsLibrary, self).__init__()
+
+        self._controls_path = controls_path
+        self._use_sidecar = use_sidecar
+        self._lazy = lazy
+        self._source_path = None
+        self._controls = OrderedDict()
+        self._timings = OrderedDict()
+        self._stream_stages = list()
+        self._content_hash = None
+        self._control_hashes = OrderedDict()
+        self._shape_store = ShapeStore()
+        self._load_error = None
+
+    def __len__(self):
+        return len(self._controls)
+
+    def __contains__(self, control_name):
+        return control_name in self._controls
+
+    def __iter__(self):
+        for control in self._controls.values():
+            yield control
+
+    @property
+    def controls_path(self):
+        return self._controls_path
+
+    @property
+    def lazy(self):
+        return self._lazy
+
+    @property
+    def source_path(self):
+        return self._source_path
+
+    @property
+    def controls(self):
+        return list(self._controls.values())
+
+    @property
+    def control_names(self):
+        return list(self._controls.keys())
+
+    @property
+    def timings(self):
+        return self._timings
+
+    @property
+    def content_hash(self):
+        return self._content_hash
+
+    @property
+    def shape_store(self):
+        return self._shape_store
+
+    @property
+    def load_error(self):
+        return self._load_error
+
+    @property
+    def control_hashes(self):
+        return self._control_hashes
+
+    def get_control(self, control_name):
+        """
+        Returns the control data of the control with given name
+        :param control_name: str
+        :return: ControlData or None
+        """
+
+        return self._controls.get(control_name, None)
+
+    def get_control_path(self, control_name):
+        """
+        Returns the path of the library the given control is loaded from
+        :param control_name: str
+        :return: str or None
+        """
+
+        return self._controls_path if control_name in self._controls else None
+
+    def get_control_hash(self, control_name):
+        """
+        Returns the content hash of the control with given name
+        :param control_name: str
+        :return: str or None
+        """
+
+        return self._control_hashes.get(control_name, None)
+
+    def load(self, library_contents=None):
+        """
+        Loads all the controls of the library. Library file is read and parsed only once and all ControlData
+        instances are built from that in-memory document. If an up to date binary sidecar file exists, it is used
+        instead of the JSON file
+        :param library_contents: bytes or None, already read contents of the library file
+        :return: list(ControlData)
+        """
+
+        for _ in self.iter_load(library_contents=library_contents):
+            pass
+
+        return self.controls
+
+    def iter_load(self, library_contents=None, batch_size=LOAD_BATCH_SIZE):
+        """
+        Generator that loads all the controls of the library yielding them in batches as they are built. The last
+        batch contains the remaining controls, so it can be empty
+        :param library_contents: bytes or None, already read contents of the library file
+        :param batch_size: int, maximum number of controls of each batch
+        :return: generator(list(ControlData))
+        """
+
+        self._controls.clear()
+        self._timings.clear()
+        self._stream_stages = list()
+        self._source_path = None
+        self._content_hash = None
+        self._control_hashes = OrderedDict()
+        self._shape_store = ShapeStore()
+        self._load_error = None
+
+        if library_contents is None and (not self._controls_path or not os.path.isfile(self._controls_path)):
+            logger.warning('Controls library file "{}" does not exist!'.format(self._controls_path))
+            yield list()
+            return
+
+        load_start = timeit.default_timer()
+
+        library_data = None
+        sidecar_table = None
+        if self._use_sidecar and sidecar.is_sidecar_valid(self._controls_path):
+            if self._lazy:
+                sidecar_table = self._read_sidecar_index()
+            else:
+                library_data = self._read_sidecar()
+        if sidecar_table is not None:
+            sidecar_path = sidecar.get_sidecar_path(self._controls_path)
+            generation, sidecar_index = sidecar_table
+            self._control_hashes.update((control_name, entry[2]) for control_name, entry in sidecar_index.items())
+            controls = ((control_name, self._create_control(
+                control_name, data_loader=self._get_sidecar_loader(
+                    control_name, sidecar_path, offset, size, generation)))
+                for control_name, (offset, size, _) in sidecar_index.items())
+        elif library_data is not None:
+            controls = ((control_name, self._create_control(control_name, control_data))
+                        for control_name, control_data in library_data.items())
+        else:
+            controls = self._iter_library_controls(library_contents)
+
+        # Time spent by the caller consuming the batches and reading the library file is not taken into account
+        consume_time = 0.0
+        stage_start = timeit.default_timer()
+        batch = list()
+        for control_name, control in controls:
+            if not control:
+                continue
+            self._controls[control_name] = control
+            batch.append(control)
+            if len(batch) >= batch_size:
+                yield_start = timeit.default_timer()
+                yield batch
+                batch = list()
+                consume_time += timeit.default_timer() - yield_start
+        self._timings['build'] = timeit.default_timer() - stage_start - consume_time - sum(
+            self._timings.get(stage, 0.0) for stage in self._stream_stages)
+
+        self._timings['total'] = timeit.default_timer() - load_start - consume_time
+
+        logger.debug('Loaded {} controls from "{}" > {}'.format(
+            len(self._controls), self._source_path, self.format_timings()))
+
+        yield batch
+
+    def keep_unchanged_controls(self, previous_library):
+        """
+        Replaces the controls whose contents are the same in the given library with the controls of that library,
+        so controls that have not changed keep their identity (and their already decoded shapes) across reloads
+        :param previous_library: ControlsLibrary, previously loaded version of the library
+        :return: list(str), names of the kept controls
+        """
+
+        kept_controls = list()
+        if not previous_library or previous_library is self:
+            return kept_controls
+
+        for control_name, control in self._controls.items():
+            previous_control = previous_library.get_control(control_name)
+            control_hash = self._control_hashes.get(control_name, None)
+            if previous_control is None or previous_control is control or not control_hash:
+                continue
+            if control_hash != previous_library.get_control_hash(control_name):
+                continue
+            # Lazy controls that are not loaded yet must decode their shapes from the new library files
+            if isinstance(previous_control, controldata.LazyControlData) and not previous_control.loaded:
+                if not isinstance(control, controldata.LazyControlData) or control.loaded:
+                    continue
+                previous_control.data_loader = control.data_loader
+            self._controls[control_name] = previous_control
+            kept_controls.append(control_name)
+
+        return kept_controls
+
+    def add_control(self, control_name, control_data):
+        """
+        Adds a new control to the library. Both library file and loaded controls are patched in place
+        :param control_name: str
+        :param control_data: list(dict) or dict, shapes data of the new control
+        :return: dict or None, changes applied to the library
+        """
+
+        if control_name in self._controls:
+            logger.error('Control "{}" already exists in library "{}"'.format(control_name, self._controls_path))
+            return None
+
+        new_control = controldata.ControlData(control_name, self._shape_store.intern(control_data))
+
+        def _add(controls_data):
+            controls_data[control_name] = get_shapes_data(new_control)
+
+        if not self._patch_library_file(_add):
+            return None
+        self._controls[control_name] = new_control
+
+        return controls_changes(added=[new_control])
+
+    def remove_control(self, control_name):
+        """
+        Removes the given control from the library. Both library file and loaded controls are patched in place
+        :param control_name: str
+        :return: dict or None, changes applied to the library
+        """
+
+        if control_name not in self._controls:
+            logger.error('Control "{}" does not exist in library "{}"'.format(control_name, self._controls_path))
+            return None
+
+        def _remove(controls_data):
+            controls_data.pop(control_name, None)
+
+        if not self._patch_library_file(_remove):
+            return None
+        self._controls.pop(control_name)
+
+        return controls_changes(removed=[control_name])
+
+    def rename_control(self, control_name, new_name):
+        """
+        Renames the given control of the library. Both library file and loaded controls are patched in place
+        :param control_name: str
+        :param new_name: str
+        :return: dict or None, changes applied to the library
+        """
+
+        if control_name not in self._controls:
+            logger.error('Control "{}" does not exist in library "{}"'.format(control_name, self._controls_path))
+            return None
+        if not new_name or new_name in self._controls:
+            logger.error('Control "{}" already exists in library "{}"'.format(new_name, self._controls_path))
+            return None
+
+        def _rename(controls_data):
+            renamed_data = [(new_name if name == control_name else name, data) for name, data in controls_data.items()]
+            controls_data.clear()
+            controls_data.update(renamed_data)
+
+        if not self._patch_library_file(_rename):
+            return None
+        control = self._controls[control_name]
+        control.name = new_name
+        _rename(self._controls)
+
+        return controls_changes(renamed=[(control_name, new_name)])
+
+    def replace_shapes(self, control_name, control_data):
+        """
+        Replaces the shapes of the given control of the library. Both library file and loaded controls are patched
+        in place
+        :param control_name: str
+        :param control_data: list(dict) or dict, new shapes data of the control
+        :return: dict or None, changes applied to the library
+        """
+
+        if control_name not in self._controls:
+            logger.error('Control "{}" does not exist in library "{}"'.format(control_name, self._controls_path))
+            return None
+
+        new_control = controldata.ControlData(control_name, self._shape_store.intern(control_data))
+
+        def _replace(controls_data):
+            controls_data[control_name] = get_shapes_data(new_control)
+
+        if not self._patch_library_file(_replace):
+            return None
+        self._controls[control_name] = new_control
+
+        return controls_changes(modified=[new_control])
+
+    def format_timings(self):
+        """
+        Returns a human readable version of the time spent in each one of the stages of the last load
+        :return: str
+        """
+
+        return ', '.join('{}: {:.4f}s'.format(stage, value) for stage, value in self._timings.items())
+
+    def _patch_library_file(self, patch_fn):
+        """
+        Internal function that applies the given function to the controls stored in the library file and writes the
+        result back to disk. Sidecar file, lazy controls and libraries cache are kept in sync with the new file
+        :param patch_fn: callable, function that receives the controls dictionary of the library file
+        :return: bool
+        """
+
+        library_document = OrderedDict([('categories', list()), ('controls', OrderedDict())])
+        if os.path.isfile(self._controls_path):
+            try:
+                with open(self._controls_path, 'rb') as fh:
+                    library_document = json.loads(fh.read().decode('utf-8'), object_pairs_hook=OrderedDict)
+            except (IOError, OSError, ValueError) as exc:
+                logger.error('Impossible to read controls library file "{}" : {}'.format(self._controls_path, exc))
+                return False
+        if 'controls' not in library_document:
+            library_document = OrderedDict([('categories', list()), ('controls', library_document)])
+
+        patch_fn(library_document['controls'])
+
+        library_contents = json.dumps(library_document, indent=2).encode('utf-8')
+        try:
+            fileio.write_file(self._controls_path, library_contents)
+        except (IOError, OSError) as exc:
+            logger.error('Impossible to write controls library file "{}" : {}'.format(self._controls_path, exc))
+            return False
+
+        sidecar_path = None
+        if self._use_sidecar:
+            sidecar_path = sidecar.write_sidecar(
+                self._controls_path, library_document['controls'],
+                source_hash=hashlib.sha1(library_contents).hexdigest())
+            if sidecar_path:
+                sidecar_header, sidecar_index = sidecar.read_header_and_index(sidecar_path)
+                self._update_lazy_controls(sidecar_index, sidecar_path, sidecar_header['generation'])
+                self._control_hashes = OrderedDict(
+                    (control_name, entry[2]) for control_name, entry in sidecar_index.items())
+            else:
+                self._update_lazy_controls(library_document['controls'])
+        if not sidecar_path:
+            self._control_hashes = OrderedDict(
+                (control_name, sidecar.get_control_hash(shapes))
+                for control_name, shapes in library_document['controls'].items())
+
+        get_library_cache().update(self, library_contents)
+
+        return True
+
+    def _update_lazy_controls(self, controls_index, sidecar_path=None, generation=None):
+        """
+        Internal function that updates the data loaders of the lazy controls that are not loaded yet
+        :param controls_index: dict, sidecar index or dictionary containing the shapes of each control
+        :param sidecar_path: str or None
+        :param generation: str or None, generation of the sidecar file the given index belongs to
+        """
+
+        for control_name, control in self._controls.items():
+            if not isinstance(control, controldata.LazyControlData) or control.loaded:
+                continue
+            if control_name not in controls_index:
+                continue
+            if sidecar_path:
+                offset, size = controls_index[control_name][:2]
+                control.data_loader = self._shape_store.loader(
+                    self._get_sidecar_loader(control_name, sidecar_path, offset, size, generation))
+            else:
+                control.data_loader = self._shape_store.loader(partial(controls_index.get, control_name))
+
+    def _create_control(self, control_name, control_data=None, data_loader=None):
+        """
+        Internal function that creates a new control. If a data loader is given, a lazy control is created
+        :param control_name: str
+        :param control_data: list(dict) or dict or None, shapes data of the control
+        :param data_loader: callable or None, function that returns the shapes data of the control
+        :return: ControlData or None
+        """
+
+        try:
+            if data_loader:
+                return controldata.LazyControlData(control_name, self._shape_store.loader(data_loader))
+            return controldata.ControlData(control_name, self._shape_store.intern(control_data))
+        except Exception as exc:
+            logger.warning('Impossible to load control "{}" : {}'.format(control_name, exc))
+            return None
+
+    def _iter_library_controls(self, library_contents=None):
+        """
+        Internal generator that reads the JSON library file creating its controls one at a time. File is streamed,
+        so only one control is decoded in memory at a time. If sidecar files are enabled, the sidecar is written
+        while the library is read. Lazy controls do not keep their parsed shapes: they decode them from the record
+        already written into the temporary sidecar file and from the sidecar file once it is written. Lazy controls
+        whose record cannot be read are read from the JSON library
+        :param library_contents: bytes or None, already read contents of the library file
+        :return: generator(tuple(str, ControlData))
+        """
+
+        self._stream_stages = ['parse', 'sidecar'] if self._use_sidecar else ['parse']
+        for stage in self._stream_stages:
+            self._timings[stage] = 0.0
+
+        sidecar_writer = sidecar.SidecarWriter(self._controls_path) if self._use_sidecar else None
+        if sidecar_writer and not sidecar_writer.open():
+            sidecar_writer = None
+
+        library_file = None
+        try:
+            if library_contents is not None:
+                stage_start = timeit.default_timer()
+                stream_reader = None
+                entries = iter(parse_library_contents(library_contents).items())
+                self._content_hash = hashlib.sha1(library_contents).hexdigest()
+                self._timings['parse'] += timeit.default_timer() - stage_start
+            else:
+                library_file = open(self._controls_path, 'rb')
+                stream_reader = streamreader.LibraryStreamReader(library_file)
+                entries = iter(stream_reader)
+            self._source_path = self._controls_path
+
+            while True:
+                stage_start = timeit.default_timer()
+                try:
+                    control_name, shapes = next(entries)
+                except StopIteration:
+                    break
+                finally:
+                    self._timings['parse'] += timeit.default_timer() - stage_start
+
+                control_record = None
+                if sidecar_writer:
+                    stage_start = timeit.default_timer()
+                    control_record = sidecar_writer.add_control(control_name, shapes)
+                    self._timings['sidecar'] += timeit.default_timer() - stage_start
+                try:
+                    self._control_hashes[control_name] = control_record[2] if control_record else \
+                        sidecar.get_control_hash(shapes)
+                except (KeyError, TypeError, ValueError, struct.error):
+                    self._control_hashes[control_name] = None
+
+                if self._lazy and control_record:
+                    yield control_name, self._create_control(control_name, data_loader=partial(
+                        self._read_written_control, control_name, sidecar_writer, *control_record[:2]))
+                elif self._lazy:
+                    yield control_name, self._create_control(control_name, data_loader=partial(copy, shapes))
+                else:
+                    yield control_name, self._create_control(control_name, shapes)
+
+            if stream_reader:
+                self._content_hash = stream_reader.content_hash
+
+            if sidecar_writer:
+                stage_start = timeit.default_timer()
+                sidecar_path = sidecar_writer.close(source_hash=self._content_hash)
+                if sidecar_path:
+                    self._update_lazy_controls(sidecar_writer.table, sidecar_path, sidecar_writer.generation)
+                self._timings['sidecar'] += timeit.default_timer() - stage_start
+        except (IOError, OSError, ValueError) as exc:
+            self._load_error = exc
+            logger.error('Impossible to parse controls library file "{}" : {}'.format(self._controls_path, exc))
+        finally:
+            if library_file:
+                library_file.close()
+            if sidecar_writer:
+                sidecar_writer.abort()
+
+    def _get_sidecar_loader(self, control_name, sidecar_path, offset, size, generation=None):
+        """
+        Internal function that returns a data loader that decodes the given control record of a sidecar file
+        :param control_name: str
+        :param sidecar_path: str
+        :param offset: int, position of the control record within the sidecar file
+        :param size: int, size in bytes of the control record
+        :param generation: str or None, generation of the sidecar file the offset was indexed from
+        :return: callable
+        """
+
+        return partial(self._read_sidecar_control, control_name, sidecar_path, offset, size, generation)
+
+    def _read_sidecar_control(self, control_name, sidecar_path, offset, size, generation=None):
+        """
+        Internal function that decodes the given control record of a sidecar file. If the sidecar file has been
+        rewritten since the offset was indexed, or it cannot be decoded, the control is read from the JSON library
+        :param control_name: str
+        :param sidecar_path: str
+        :param offset: int, position of the control record within the sidecar file
+        :param size: int, size in bytes of the control record
+        :param generation: str or None, generation of the sidecar file the offset was indexed from
+        :return: list(dict)
+        """
+
+        try:
+            return sidecar.read_control(sidecar_path, offset, size, generation=generation)
+        except (IOError, OSError, ValueError, struct.error) as exc:
+            logger.warning('Impossible to decode control "{}" from sidecar file "{}", reading it from "{}" : {}'.format(
+                control_name, sidecar_path, self._controls_path, exc))
+
+        return self._read_source_control(control_name)
+
+    def _read_written_control(self, control_name, sidecar_writer, offset, size):
+        """
+        Internal function that decodes the given control record written by the given sidecar writer. If the record
+        cannot be read, the control is read from the JSON library
+        :param control_name: str
+        :param sidecar_writer: SidecarWriter
+        :param offset: int, position of the control record within the sidecar file
+        :param size: int, size in bytes of the control record
+        :return: list(dict)
+        """
+
+        try:
+            return sidecar_writer.read_control(offset, size)
+        except (IOError, OSError, ValueError, struct.error) as exc:
+            logger.warning('Impossible to decode control "{}" from sidecar file "{}", reading it from "{}" : {}'.format(
+                control_name, sidecar_writer.sidecar_path, self._controls_path, exc))
+
+        return self._read_source_control(control_name)
+
+    def _read_source_control(self, control_name):
+        """
+        Internal function that streams the JSON library file until the given control is found and returns its shapes
+        :param control_name: str
+        :return: list(dict)
+        """
+
+        try:
+            for source_name, shapes in streamreader.iter_library_file(self._controls_path):
+                if source_name == control_name:
+                    return shapes
+        except (IOError, OSError, ValueError) as exc:
+            logger.error('Impossible to parse controls library file "{}" : {}'.format(self._controls_path, exc))
+            return list()
+
+        logger.warning('Control "{}" does not exist in library "{}"'.format(control_name, self._controls_path))
+
+        return list()
+
+    def _read_sidecar_index(self):
+        """
+        Internal function that reads the names and offsets table of the binary sidecar file of the library
+        :return: tuple(str, OrderedDict) or None, generation of the sidecar file and its names and offsets table
+        """
+
+        sidecar_path = sidecar.get_sidecar_path(self._controls_path)
+
+        stage_start = timeit.default_timer()
+        try:
+            sidecar_header, sidecar_index = sidecar.read_header_and_index(sidecar_path)
+        except (IOError, OSError, ValueError, struct.error) as exc:
+            logger.warning('Impossible to read sidecar file index "{}" : {}'.format(sidecar_path, exc))
+            return None
+        self._timings['read'] = timeit.default_timer() - stage_start
+        self._source_path = sidecar_path
+
+        return sidecar_header['generation'], sidecar_index
+
+    def _read_sidecar(self):
+        """
+        Internal function that reads and decodes the binary sidecar file of the library
+        :return: OrderedDict or None
+        """
+
+        sidecar_path = sidecar.get_sidecar_path(self._controls_path)
+
+        stage_start = timeit.default_timer()
+        try:
+            with open(sidecar_path, 'rb') as fh:
+                sidecar_contents = fh.read()
+        except (IOError, OSError) as exc:
+            logger.debug('Impossible to read sidecar file "{}" : {}'.format(sidecar_path, exc))
+            return None
+        self._timings['read'] = timeit.default_timer() - stage_start
+
+        stage_start = timeit.default_timer()
+        try:
+            library_data = sidecar.read_contents(sidecar_contents)
+            self._control_hashes.update(
+                (control_name, entry[2]) for control_name, entry in sidecar.read_table(sidecar_contents).items())
+        except (ValueError, struct.error) as exc:
+            logger.warning('Impossible to decode sidecar file "{}" : {}'.format(sidecar_path, exc))
+            return None
+        self._timings['parse'] = timeit.default_timer() - stage_start
+        self._source_path = sidecar_path
+
+        return library_data
+
+
+class ShapeStore(object):
+    """
+    Class that stores shapes by their content hash, so identical shapes of different controls share a single
+    immutable CVs tuple and a single flat buffer of doubles. Shared buffers must be treated as read-only
+    """
+
+    def __init__(self):
+        super(ShapeStore, self).__init__()
+
+        self._shapes = dict()
+        self._references = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._shapes)
+
+    def __contains__(self, shape_hash):
+        return shape_hash in self._shapes
+
+    @property
+    def references(self):
+        return self._references
+
+    def get_cvs(self, shape_hash):
+        """
+        Returns the shared CVs of the shape with given content hash
+        :param shape_hash: str
+        :return: tuple(tuple(float, float, float)) or None
+        """
+
+        return self._shapes.get(shape_hash, (None, None))[0]
+
+    def get_buffer(self, shape_hash):
+        """
+        Returns the shared flat buffer of doubles of the shape with given content hash
+        :param shape_hash: str
+        :return: array or None
+        """
+
+        return self._shapes.get(shape_hash, (None, None))[1]
+
+    def intern(self, shapes):
+        """
+        Returns a copy of the given shapes whose CVs are replaced with the shared CVs of the stored identical shapes.
+        Shared flat buffers of the shapes are stored in their 'buffer' key
+        :param shapes: list(dict) or dict or None
+        :return: list(dict)
+        """
+
+        if not shapes:
+            return list()
+        if isinstance(shapes, dict):
+            shapes = list(shapes.values())
+
+        interned_shapes = list()
+        for shape in shapes:
+            shape_hash = sidecar.get_shape_hash(shape)
+            with self._lock:
+                cvs, buffer = self._shapes.get(shape_hash, (None, None))
+                if cvs is None:
+                    cvs = tuple(tuple(float(value) for value in cv[:3]) for cv in shape['cvs'])
+                    buffer = controldata.get_buffer(cvs)
+                    self._shapes[shape_hash] = (cvs, buffer)
+                self._references += 1
+            interned_shape = dict(shape)
+            interned_shape['cvs'] = cvs
+            interned_shape['buffer'] = buffer
+            interned_shapes.append(interned_shape)
+
+        return interned_shapes
+
+    def loader(self, data_loader):
+        """
+        Returns a data loader that interns the shapes returned by the given data loader
+        :param data_loader: callable
+        :return: callable
+        """
+
+        return partial(self._load, data_loader)
+
+    def _load(self, data_loader):
+        """
+        Internal function that calls the given data loader and interns its shapes
+        :param data_loader: callable
+        :return: list(dict)
+        """
+
+        return self.intern(data_loader())
+
+
+class LayeredLibrary(object):
+    """
+    Class that merges an ordered stack of controls libraries (studio, show, user, ...) into a single controls index.
+    Libraries are ordered from lowest to highest priority, so controls of upper layers override the ones with the
+    same name stored in lower layers. Libraries that do not exist yet are empty layers that are created the first
+    time a control is written into them. The merged index is guarded by a lock, so the library can be read while it is
+    loaded from a background thread
+    """
+
+    def __init__(self, controls_paths=None, write_layer=-1, lazy=False, max_workers=4):
+        super(LayeredLibrary, self).__init__()
+
+        self._controls_paths = [path for path in (controls_paths or list()) if path]
+        self._write_layer = write_layer
+        self._lazy = lazy
+        self._max_workers = max(1, int(max_workers))
+        self._layers = list()
+        self._index = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._index)
+
+    def __contains__(self, control_name):
+        with self._lock:
+            return control_name in self._index
+
+    def __iter__(self):
+        for control_name in self.control_names:
+            yield self.get_control(control_name)
+
+    @property
+    def controls_paths(self):
+        return list(self._controls_paths)
+
+    @property
+    def controls_path(self):
+        return self._controls_paths[self._write_layer] if self._controls_paths else None
+
+    @property
+    def layers(self):
+        with self._lock:
+            return list(self._layers)
+
+    @property
+    def write_layer(self):
+        return self._write_layer
+
+    @write_layer.setter
+    def write_layer(self, layer_index):
+        self._write_layer = int(layer_index)
+
+    @property
+    def controls(self):
+        with self._lock:
+            return [self.get_control(control_name) for control_name in self._index]
+
+    @property
+    def control_names(self):
+        with self._lock:
+            return list(self._index.keys())
+
+    @property
+    def timings(self):
+        return OrderedDict((layer.controls_path, layer.timings.get('total', 0.0)) for layer in self.layers if layer)
+
+    def get_control(self, control_name):
+        """
+        Returns the control data of the control with given name taking into account layers priority
+        :param control_name: str
+        :return: ControlData or None
+        """
+
+        with self._lock:
+            layer_index = self._index.get(control_name, None)
+            if layer_index is None:
+                return None
+            layer = self._layers[layer_index]
+
+        return layer.get_control(control_name)
+
+    def get_control_layer(self, control_name):
+        """
+        Returns the index of the layer the given control is loaded from
+        :param control_name: str
+        :return: int or None
+        """
+
+        with self._lock:
+            return self._index.get(control_name, None)
+
+    def get_control_path(self, control_name):
+        """
+        Returns the path of the library the given control is loaded from
+        :param control_name: str
+        :return: str or None
+        """
+
+        layer_index = self.get_control_layer(control_name)
+
+        return None if layer_index is None else self._controls_paths[layer_index]
+
+    def load(self):
+        """
+        Loads all the libraries of the stack concurrently and merges them
+        :return: list(ControlData)
+        """
+
+        layers = list()
+        if self._controls_paths:
+            pool = ThreadPool(min(self._max_workers, len(self._controls_paths)))
+            try:
+                layers = pool.map(self._load_layer, self._controls_paths)
+            finally:
+                pool.close()
+                pool.join()
+
+        index = OrderedDict()
+        for layer_index, layer in enumerate(layers):
+            for control_name in layer.control_names:
+                index.pop(control_name, None)
+                index[control_name] = layer_index
+        with self._lock:
+            self._layers = layers
+            self._index = index
+
+        return self.controls
+
+    def iter_load(self, batch_size=LOAD_BATCH_SIZE):
+        """
+        Generator that loads the libraries of the stack one by one, from highest to lowest priority, yielding the
+        visible controls in batches as they are loaded. Because upper layers are loaded first, a yielded control is
+        never overridden by the controls of a later batch
+        :param batch_size: int, maximum number of controls of each batch
+        :return: generator(list(ControlData))
+        """
+
+        with self._lock:
+            self._layers = [None] * len(self._controls_paths)
+            self._index = OrderedDict()
+
+        for layer_index in reversed(range(len(self._controls_paths))):
+            if not os.path.isfile(self._controls_paths[layer_index]):
+                with self._lock:
+                    self._layers[layer_index] = self._load_layer(self._controls_paths[layer_index])
+                continue
+            for layer, batch in get_library_cache().iter_get(
+                    self._controls_paths[layer_index], lazy=self._lazy, batch_size=batch_size):
+                visible_controls = list()
+                with self._lock:
+                    self._layers[layer_index] = layer
+                    for control in batch:
+                        if control.name in self._index:
+                            continue
+                        self._index[control.name] = layer_index
+                        visible_controls.append(control)
+                if visible_controls:
+                    yield visible_controls
+
+    def reload_layer(self, layer_index):
+        """
+        Reloads only the given layer and updates the merged index. Controls whose contents have not changed are kept,
+        so only added, removed and modified controls are returned as changes
+        :param layer_index: int
+        :return: dict, changes in the merged controls
+        """
+
+        layer_index = self._get_layer_index(layer_index)
+        previous_layer = self._layers[layer_index]
+        layer = self._load_layer(self._controls_paths[layer_index])
+        layer.keep_unchanged_controls(previous_layer)
+        with self._lock:
+            self._layers[layer_index] = layer
+
+        control_names = set(previous_layer.control_names) | set(self._layers[layer_index].control_names)
+        previous_controls = dict()
+        for control_name in control_names:
+            owner_index = self.get_control_layer(control_name)
+            if owner_index is None:
+                continue
+            owner_layer = previous_layer if owner_index == layer_index else self._layers[owner_index]
+            previous_controls[control_name] = owner_layer.get_control(control_name)
+
+        return self._merge(control_names, previous_controls)
+
+    def add_control(self, control_name, control_data, layer_index=None):
+        """
+        Adds a new control to the given layer (write layer by default)
+        :param control_name: str
+        :param control_data: list(dict) or dict
+        :param layer_index: int or None
+        :return: dict or None, changes in the merged controls
+        """
+
+        return self._apply('add_control', layer_index, [control_name], control_name, control_data)
+
+    def remove_control(self, control_name, layer_index=None):
+        """
+        Removes the given control from the given layer. By default, the layer the control is loaded from is used
+        :param control_name: str
+        :param layer_index: int or None
+        :return: dict or None, changes in the merged controls
+        """
+
+        if layer_index is None:
+            layer_index = self.get_control_layer(control_name)
+
+        return self._apply('remove_control', layer_index, [control_name], control_name)
+
+    def rename_control(self, control_name, new_name, layer_index=None):
+        """
+        Renames the given control within the given layer. By default, the layer the control is loaded from is used
+        :param control_name: str
+        :param new_name: str
+        :param layer_index: int or None
+        :return: dict or None, changes in the merged controls
+        """
+
+        if layer_index is None:
+            layer_index = self.get_control_layer(control_name)
+        if new_name in self._layers[self._get_layer_index(layer_index)]:
+            logger.error('Control "{}" already exists in library "{}"'.format(
+                new_name, self._controls_paths[self._get_layer_index(layer_index)]))
+            return None
+
+        return self._apply('rename_control', layer_index, [control_name, new_name], control_name, new_name)
+
+    def replace_shapes(self, control_name, control_data, layer_index=None):
+        """
+        Replaces the shapes of the given control in the given layer (write layer by default)
+        :param control_name: str
+        :param control_data: list(dict) or dict
+        :param layer_index: int or None
+        :return: dict or None, changes in the merged controls
+        """
+
+        layer_index = self._get_layer_index(layer_index)
+        if control_name not in self._layers[layer_index]:
+            return self._apply('add_control', layer_index, [control_name], control_name, control_data)
+
+        return self._apply('replace_shapes', layer_index, [control_name], control_name, control_data)
+
+    def _load_layer(self, controls_path):
+        """
+        Internal function that returns the loaded library of the given layer. Libraries that do not exist yet are
+        returned as empty libraries
+        :param controls_path: str
+        :return: ControlsLibrary
+        """
+
+        if not os.path.isfile(controls_path):
+            return ControlsLibrary(controls_path, lazy=self._lazy)
+
+        return get_library(controls_path, lazy=self._lazy)
+
+    def _get_layer_index(self, layer_index=None):
+        """
+        Internal function that returns a valid positive index for the given layer
+        :param layer_index: int or None
+        :return: int
+        """
+
+        if layer_index is None:
+            layer_index = self._write_layer
+
+        return range(len(self._layers))[layer_index]
+
+    def _apply(self, operation_name, layer_index, control_names, *args):
+        """
+        Internal function that applies the given mutation operation to a layer and updates the merged index
+        :param operation_name: str, name of the ControlsLibrary mutation function to call
+        :param layer_index: int or None
+        :param control_names: list(str), names of the controls affected by the operation
+        :return: dict or None, changes in the merged controls
+        """
+
+        if not self._layers:
+            logger.error('No controls libraries loaded!')
+            return None
+
+        layer_index = self._get_layer_index(layer_index)
+        previous_controls = self._get_visible_controls(control_names)
+        layer_changes = getattr(self._layers[layer_index], operation_name)(*args)
+        if not layer_changes:
+            return None
+
+        changed_names = set(layer_changes['removed'])
+        changed_names.update(control.name for control in layer_changes['added'] + layer_changes['modified'])
+        for original_name, new_name in layer_changes['renamed']:
+            changed_names.update((original_name, new_name))
+
+        return self._merge(changed_names, previous_controls, renamed=layer_changes['renamed'])
+
+    def _get_visible_controls(self, control_names):
+        """
+        Internal function that returns the merged controls currently visible with the given names
+        :param control_names: iterable(str)
+        :return: dict
+        """
+
+        return dict((name, self.get_control(name)) for name in control_names if name in self)
+
+    def _merge(self, control_names, previous_controls, renamed=None):
+        """
+        Internal function that updates the owner layer of the given controls and returns the changes produced in the
+        merged controls
+        :param control_names: set(str)
+        :param previous_controls: dict, merged controls that were visible before the layers were modified
+        :param renamed: list(tuple(str, str)) or None, renames applied to the layers
+        :return: dict
+        """
+
+        with self._lock:
+            for control_name in control_names:
+                self._index.pop(control_name, None)
+                for layer_index in range(len(self._layers) - 1, -1, -1):
+                    if control_name in self._layers[layer_index]:
+                        self._index[control_name] = layer_index
+                        break
+
+        added = list()
+        removed = list()
+        modified = list()
+        merged_renames = list()
+        for original_name, new_name in renamed or list():
+            if original_name not in self and new_name not in previous_controls and new_name in self:
+                merged_renames.append((original_name, new_name))
+                control_names = control_names - set((original_name, new_name))
+        for control_name in control_names:
+            current_control = self.get_control(control_name)
+            previous_control = previous_controls.get(control_name, None)
+            if previous_control is None and current_control is not None:
+                added.append(current_control)
+            elif previous_control is not None and current_control is None:
+                removed.append(control_name)
+            elif current_control is not previous_control:
+                modified.append(current_control)
+
+        return controls_changes(added=added, removed=removed, modified=modified, renamed=merged_renames)
+
+
+class LibraryCache(object):
+    """
+    Process-wide LRU cache of loaded controls libraries. Entries are validated against the modification time, size
+    and content hash of the library file
+    """
+
+    def __init__(self, max_size=8):
+        super(LibraryCache, self).__init__()
+
+        self._max_size = max(1, int(max_size))
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, controls_path):
+        return get_library_key(controls_path) in self._entries
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    @max_size.setter
+    def max_size(self, value):
+        with self._lock:
+            self._max_size = max(1, int(value))
+            self._evict()
+
+    def get(self, controls_path, lazy=False):
+        """
+        Returns the controls library stored in the given path. If the library is already cached and its file has not
+        been modified, cached library is returned without reading the file
+        :param controls_path: str
+        :param lazy: bool, whether or not control shapes should be decoded on first access if library is loaded
+        :return: ControlsLibrary
+        """
+
+        controls_library = None
+        for controls_library, _ in self.iter_get(controls_path, lazy=lazy):
+            pass
+
+        return controls_library
+
+    def iter_get(self, controls_path, lazy=False, batch_size=LOAD_BATCH_SIZE):
+        """
+        Generator that returns the controls library stored in the given path along with its controls in batches as
+        they are loaded. If the library is not cached, it is only stored once all its controls are loaded, so an
+        interrupted iteration or a failed load never caches a partially loaded library
+        :param controls_path: str
+        :param lazy: bool, whether or not control shapes should be decoded on first access if library is loaded
+        :param batch_size: int, maximum number of controls of each batch
+        :return: generator(tuple(ControlsLibrary, list(ControlData)))
+        """
+
+        library_key = get_library_key(controls_path)
+        if not library_key or not os.path.isfile(library_key):
+            self.invalidate(controls_path)
+            controls_library = ControlsLibrary(controls_path, lazy=lazy)
+            for batch in controls_library.iter_load(batch_size=batch_size):
+                yield controls_library, batch
+            return
+
+        file_stat = os.stat(library_key)
+        file_signature = (file_stat.st_mtime, file_stat.st_size)
+        cached_library = None
+        with self._lock:
+            cache_entry = self._entries.pop(library_key, None)
+            if cache_entry:
+                self._entries[library_key] = cache_entry
+                if cache_entry['signature'] == file_signature:
+                    cached_library = cache_entry['library']
+
+        # File reading and library loading are done outside the lock, so different libraries can be loaded
+        # concurrently
+        if not cached_library and cache_entry and cache_entry['hash'] == get_file_hash(library_key):
+            with self._lock:
+                cache_entry['signature'] = file_signature
+            cached_library = cache_entry['library']
+        if cached_library:
+            for batch in iter_batches(cached_library.controls, batch_size):
+                yield cached_library, batch
+            return
+
+        controls_library = ControlsLibrary(controls_path, lazy=lazy)
+        for batch in controls_library.iter_load(batch_size=batch_size):
+            yield controls_library, batch
+        if controls_library.load_error:
+            self.invalidate(controls_path)
+            return
+        content_hash = controls_library.content_hash or get_file_hash(library_key)
+        with self._lock:
+            self._entries.pop(library_key, None)
+            self._entries[library_key] = {
+                'signature': file_signature,
+                'hash': content_hash,
+                'library': controls_library
+            }
+            self._evict()
+
+    def update(self, controls_library, library_contents):
+        """
+        Updates the validation data of a cached library after its file has been written by the library itself, so
+        the library is not reloaded the next time it is requested
+        :param controls_library: ControlsLibrary
+        :param library_contents: bytes, contents written to the library file
+        """
+
+        library_key = get_library_key(controls_library.controls_path)
+        with self._lock:
+            cache_entry = self._entries.get(library_key, None)
+            if not cache_entry or cache_entry['library'] is not controls_library:
+                return
+            file_stat = os.stat(library_key)
+            cache_entry['signature'] = (file_stat.st_mtime, file_stat.st_size)
+            cache_entry['hash'] = hashlib.sha1(library_contents).hexdigest()
+
+    def invalidate(self, controls_path=None):
+        """
+        Removes the given library from the cache. If no path is given, all cached libraries are removed
+        :param controls_path: str or None
+        """
+
+        with self._lock:
+            if controls_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(get_library_key(controls_path), None)
+
+    def _evict(self):
+        """
+        Internal function that removes least recently used libraries until the cache fits its maximum size
+        """
+
+        while len(self._entries) > self._max_size:
+            library_key = next(iter(self._entries))
+            self._entries.pop(library_key)
+            logger.debug('Controls library "{}" removed from libraries cache'.format(library_key))
+
+
+_LIBRARY_CACHE = LibraryCache()
+
+
+def get_library_key(controls_path):
+    """
+    Returns the key used to identify the given controls library path in the libraries cache
+    :param controls_path: str
+    :return: str
+    """
+
+    if not controls_path:
+        return None
+
+    return os.path.normcase(os.path.realpath(os.path.abspath(controls_path)))
+
+
+def get_file_hash(file_path, chunk_size=streamreader.CHUNK_SIZE):
+    """
+    Returns the SHA1 hash of the contents of the given file. File is read in chunks
+    :param file_path: str
+    :param chunk_size: int
+    :return: str
+    """
+
+    file_hash = hashlib.sha1()
+    with open(file_path, 'rb') as fh:
+        for chunk in iter(partial(fh.read, chunk_size), b''):
+            file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+
+def get_library_cache():
+    """
+    Returns the process-wide libraries cache
+    :return: LibraryCache
+    """
+
+    return _LIBRARY_CACHE
+
+
+def get_library(controls_path, lazy=False):
+    """
+    Returns the controls library stored in the given path making use of the process-wide libraries cache
+    :param controls_path: str
+    :param lazy: bool, whether or not control shapes should be decoded on first access if library is loaded
+    :return: ControlsLibrary
+    """
+
+    return _LIBRARY_CACHE.get(controls_path, lazy=lazy)
+
+
+def iter_batches(items, batch_size=LOAD_BATCH_SIZE):
+    """
+    Generator that splits the given items in batches. The last batch contains the remaining items, so it can be empty
+    :param items: list
+    :param batch_size: int, maximum number of items of each batch
+    :return: generator(list)
+    """
+
+    for i in range(0, len(items) - len(items) % batch_size, batch_size):
+        yield items[i:i + batch_size]
+    yield items[len(items) - len(items) % batch_size:]
+
+
+def controls_changes(added=None, removed=None, modified=None, renamed=None):
+    """
+    Returns a dictionary that describes the changes applied to a controls library
+    :param added: list(ControlData), new controls
+    :param removed: list(str), names of the removed controls
+    :param modified: list(ControlData), controls whose shapes have changed
+    :param renamed: list(tuple(str, str)), original and new names of the renamed controls
+    :return: dict
+    """
+
+    return {
+        'added': list(added or list()),
+        'removed': list(removed or list()),
+        'modified': list(modified or list()),
+        'renamed': list(renamed or list())
+    }
+
+
+def get_shapes_data(control):
+    """
+    Returns the shapes of the given control in the format used to store them in controls library files
+    :param control: ControlData
+    :return: list(dict)
+    """
+
+    shapes_data = list()
+    for shape_data in control()[1]:
+        shapes_data.append(OrderedDict([
+            ('periodic', shape_data['periodic']),
+            ('cvs', [[float(value) for value in cv] for cv in shape_data['cvs']]),
+            ('degree', shape_data['degree'])
+        ]))
+
+    return shapes_data
+
+
+def get_dedup_report(controls_path):
+    """
+    Returns a report of the shapes shared between the controls of the given library and the bytes saved by storing
+    each one of them only once. Library file is streamed, so it is never fully loaded in memory
+    :param controls_path: str
+    :return: OrderedDict
+    """
+
+    shapes = OrderedDict()
+    controls_count = 0
+    shapes_bytes = 0
+    for control_name, control_shapes in streamreader.iter_library_file(controls_path):
+        controls_count += 1
+        if isinstance(control_shapes, dict):
+            control_shapes = list(control_shapes.values())
+        for shape in control_shapes:
+            shape_record = sidecar.encode_shape(shape)
+            shape_hash = hashlib.sha1(shape_record).hexdigest()
+            shapes_bytes += len(shape_record)
+            if shape_hash not in shapes:
+                shapes[shape_hash] = {'size': len(shape_record), 'controls': list()}
+            shapes[shape_hash]['controls'].append(control_name)
+
+    unique_shapes_bytes = sum(shape['size'] for shape in shapes.values())
+    duplicated_shapes = OrderedDict(
+        (shape_hash, shape['controls']) for shape_hash, shape in sorted(
+            shapes.items(), key=lambda item: len(item[1]['controls']), reverse=True) if len(shape['controls']) > 1)
+
+    return OrderedDict([
+        ('controls_path', controls_path),
+        ('controls', controls_count),
+        ('shapes', sum(len(shape['controls']) for shape in shapes.values())),
+        ('unique_shapes', len(shapes)),
+        ('shapes_bytes', shapes_bytes),
+        ('unique_shapes_bytes', unique_shapes_bytes),
+        ('saved_bytes', shapes_bytes - unique_shapes_bytes),
+        ('duplicated_shapes', duplicated_shapes)
+    ])
+
+
+def format_dedup_report(report):
+    """
+    Returns a human readable version of the given shapes deduplication report
+    :param report: dict, report returned by get_dedup_report function
+    :return: str
+    """
+
+    saved_ratio = report['saved_bytes'] / report['shapes_bytes'] if report['shapes_bytes'] else 0.0
+    lines = [
+        'Controls library: {}'.format(report['controls_path']),
+        'Controls: {}, shapes: {}, unique shapes: {}'.format(
+            report['controls'], report['shapes'], report['unique_shapes']),
+        'Shapes bytes: {}, unique shapes bytes: {}, saved bytes: {} ({:.1%})'.format(
+            report['shapes_bytes'], report['unique_shapes_bytes'], report['saved_bytes'], saved_ratio)
+    ]
+    for shape_hash, control_names in report['duplicated_shapes'].items():
+        lines.append('    {} shared by {} shapes: {}'.format(
+            shape_hash[:12], len(control_names), ', '.join(control_names)))
+
+    return '\n'.join(lines)
+
+
+def rewrite_library(controls_path, shapes_fn, output_path=None):
+    """
+    Streams the controls of the given library through the given function and writes the returned shapes to the
+    given path. Controls are written in compact form, one per line, and the file is replaced once fully written
+    :param controls_path: str, path of the library to rewrite
+    :param shapes_fn: callable, function that receives the name and the shapes of a control and returns the new
+        shapes of the control and a dictionary describing the applied changes
+    :param output_path: str or None, path where the library is written. If not given, library is overwritten
+    :return: OrderedDict or None, report with the changes applied to each control
+    """
+
+    output_path = output_path or controls_path
+    temp_path = None
+    control_reports = OrderedDict()
+    try:
+        source_bytes = os.path.getsize(controls_path)
+        output_file, temp_path = fileio.create_temp_file(output_path, mode_path=controls_path)
+        with open(controls_path, 'rb') as source_file, output_file:
+            reader = streamreader.LibraryStreamReader(source_file)
+            output_file.write(b'{"controls": {')
+            for i, (control_name, shapes) in enumerate(reader):
+                new_shapes, control_reports[control_name] = shapes_fn(control_name, shapes)
+                output_file.write('{}\n{}: {}'.format(
+                    ',' if i else '', json.dumps(control_name),
+                    json.dumps(new_shapes, separators=(',', ':'))).encode('utf-8'))
+            output_file.write(b'\n}')
+            for key, value in reader.metadata.items():
+                if key != 'controls':
+                    output_file.write(', {}: {}'.format(json.dumps(key), json.dumps(value)).encode('utf-8'))
+            output_file.write(b'}\n')
+        fileio.replace_file(temp_path, output_path)
+    except (IOError, OSError, ValueError) as exc:
+        logger.error('Impossible to rewrite controls library "{}" : {}'.format(controls_path, exc))
+        if temp_path and os.path.isfile(temp_path):
+            os.remove(temp_path)
+        return None
+
+    return OrderedDict([
+        ('controls_path', controls_path),
+        ('output_path', output_path),
+        ('source_bytes', source_bytes),
+        ('output_bytes', os.path.getsize(output_path)),
+        ('controls', control_reports)
+    ])
+
+
+def parse_library_contents(library_contents):
+    """
+    Parses the given controls library file contents and returns a dictionary with the data of each control
+    :param library_contents: bytes or str
+    :return: OrderedDict
+    """
+
+    if isinstance(library_contents, bytes):
+        library_contents = library_contents.decode('utf-8')
+
+    library_data = json.loads(library_contents, object_pairs_hook=OrderedDict) or OrderedDict()
+    if 'controls' in library_data:
+        library_data = library_data['controls'] or OrderedDict()
+
+    return library_data
+
+
+def load_library(controls_path, use_sidecar=True, lazy=False):
+    """
+    Loads the controls library stored in the given path
+    :param controls_path: str
+    :param use_sidecar: bool, whether or not the binary sidecar file of the library should be used
+    :param lazy: bool, whether or not control shapes should be decoded on first access
+    :return: ControlsLibrary
+    """
+
+    controls_library = ControlsLibrary(controls_path, use_sidecar=use_sidecar, lazy=lazy)
+    controls_library.load()
+
+    return controls_library
@@ -0,0 +1,332 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains background controls libraries loading implementation for tpRigToolkit.tools.controlrig
+"""
+
+from __future__ import print_function, division, absolute_import
+
+import logging
+import threading
+
+from Qt.QtCore import Signal, QObject, QThread, QEvent, QCoreApplication
+
+from tpRigToolkit.tools.controlrig.core import consts, library
+
+logger = logging.getLogger(consts.TOOL_ID)
+
+
+class LibraryLoadWorker(QObject, object):
+    """
+    Worker that loads a controls library in a background thread streaming batches of loaded controls. Before
+    loading, the worker waits for the given previous loads to finish, so a library file is never read and its
+    sidecar never written by two loads at the same time
+    """
+
+    controlsLoaded = Signal(int, object)
+    loadFinished = Signal(int, object)
+    finished = Signal(int)
+
+    def __init__(self, load_id, controls_library, batch_size=library.LOAD_BATCH_SIZE, previous_workers=None):
+        super(LibraryLoadWorker, self).__init__()
+
+        self._load_id = load_id
+        self._library = controls_library
+        self._batch_size = batch_size
+        self._previous_done_events = [worker.done_event for worker in previous_workers or list()]
+        self._cancel_event = threading.Event()
+        self._done_event = threading.Event()
+
+    @property
+    def load_id(self):
+        return self._load_id
+
+    @property
+    def library_keys(self):
+        return get_library_keys(self._library)
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def done_event(self):
+        return self._done_event
+
+    def cancel(self):
+        """
+        Requests the cancellation of the load. Cancellation is checked between batches
+        """
+
+        self._cancel_event.set()
+
+    def run(self):
+        """
+        Loads the library emitting a signal for each batch of loaded controls
+        """
+
+        batches = None
+        try:
+            for done_event in self._previous_done_events:
+                done_event.wait()
+            if self.cancelled:
+                logger.debug('Controls library load {} cancelled'.format(self._load_id))
+                return
+            batches = self._library.iter_load(batch_size=self._batch_size)
+            for batch in batches:
+                if self.cancelled:
+                    logger.debug('Controls library load {} cancelled'.format(self._load_id))
+                    break
+                if batch:
+                    self.controlsLoaded.emit(self._load_id, batch)
+            else:
+                self.loadFinished.emit(self._load_id, self._library)
+        except Exception as exc:
+            logger.error('Error while loading controls library: {}'.format(exc))
+        finally:
+            # Closing the generator aborts any sidecar still being written before next loads can start
+            if batches is not None:
+                batches.close()
+            self._done_event.set()
+            self.finished.emit(self._load_id)
+            QThread.currentThread().quit()
+
+
+class LibraryLoader(QObject, object):
+    """
+    Class that loads controls libraries in background threads. Only the last requested load is notified, any
+    previous load still running is cancelled. A load does not start until the previous loads that share any of its
+    library files are finished
+    """
+
+    controlsLoaded = Signal(object)
+    loadFinished = Signal(object)
+
+    def __init__(self, batch_size=library.LOAD_BATCH_SIZE, parent=None):
+        super(LibraryLoader, self).__init__(parent)
+
+        self._batch_size = batch_size
+        self._load_id = 0
+        self._workers = dict()
+
+    @property
+    def is_loading(self):
+        worker = self._workers.get(self._load_id, (None, None))[1]
+        return bool(worker and not worker.cancelled)
+
+    def load(self, controls_library):
+        """
+        Loads the given library in a background thread cancelling the current load, if any
+        :param controls_library: LayeredLibrary or ControlsLibrary
+        :return: int, identifier of the load
+        """
+
+        self.cancel()
+
+        library_keys = get_library_keys(controls_library)
+        previous_workers = [
+            worker for _, worker in self._workers.values() if library_keys.intersection(worker.library_keys)]
+
+        self._load_id += 1
+        thread = QThread()
+        worker = LibraryLoadWorker(
+            self._load_id, controls_library, batch_size=self._batch_size, previous_workers=previous_workers)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.controlsLoaded.connect(self._on_controls_loaded)
+        worker.loadFinished.connect(self._on_load_finished)
+        worker.finished.connect(self._on_worker_finished)
+        self._workers[self._load_id] = (thread, worker)
+        thread.start()
+
+        return self._load_id
+
+    def cancel(self):
+        """
+        Cancels the current load, if any
+        """
+
+        worker = self._workers.get(self._load_id, (None, None))[1]
+        if worker:
+            worker.cancel()
+
+    def wait(self):
+        """
+        Blocks until all the running loads are finished. Batches already loaded but not notified yet are notified
+        before returning
+        """
+
+        for thread, _ in list(self._workers.values()):
+            thread.wait()
+        QCoreApplication.sendPostedEvents(self, QEvent.MetaCall)
+
+    def _on_controls_loaded(self, load_id, controls):
+        """
+        Internal callback function that is called each time a worker loads a new batch of controls
+        :param load_id: int
+        :param controls: list(ControlData)
+        """
+
+        if load_id != self._load_id or not self.is_loading:
+            return
+
+        self.controlsLoaded.emit(controls)
+
+    def _on_load_finished(self, load_id, controls_library):
+        """
+        Internal callback function that is called when a worker finishes loading its library
+        :param load_id: int
+        :param controls_library: LayeredLibrary or ControlsLibrary
+        """
+
+        if load_id != self._load_id:
+            return
+
+        self.loadFinished.emit(controls_library)
+
+    def _on_worker_finished(self, load_id):
+        """
+        Internal callback function that is called when a worker finishes, either loading its library or cancelled
+        :param load_id: int
+        """
+
+        thread, worker = self._workers.pop(load_id, (None, None))
+        if not thread:
+            return
+
+        thread.quit()
+        thread.wait()
+        worker.deleteLater()
+        thread.deleteLater()
+
+
+class IndexBuildWorker(QObject, object):
+    """
+    Worker that builds an index of the given controls in a background thread
+    """
+
+    indexBuilt = Signal(int, object)
+    finished = Signal(int)
+
+    def __init__(self, build_id, controls, index_builder):
+        super(IndexBuildWorker, self).__init__()
+
+        self._build_id = build_id
+        self._controls = controls
+        self._index_builder = index_builder
+
+    def run(self):
+        """
+        Builds the index of the controls and emits it
+        """
+
+        try:
+            self.indexBuilt.emit(self._build_id, self._index_builder(self._controls))
+        except Exception as exc:
+            logger.error('Error while building controls index: {}'.format(exc))
+        finally:
+            self.finished.emit(self._build_id)
+            QThread.currentThread().quit()
+
+
+class IndexBuilder(QObject, object):
+    """
+    Class that builds indices of controls in background threads, so the shapes of the controls are decoded and
+    evaluated out of the main thread. Builds are independent of libraries loads. Only the last requested build is
+    notified, the result of any previous build still running is discarded
+    """
+
+    indexBuilt = Signal(object)
+
+    def __init__(self, index_builder, parent=None):
+        super(IndexBuilder, self).__init__(parent)
+
+        self._index_builder = index_builder
+        self._build_id = 0
+        self._is_building = False
+        self._workers = dict()
+
+    @property
+    def is_building(self):
+        return self._is_building
+
+    def build(self, controls):
+        """
+        Builds the index of the given controls in a background thread discarding the current build, if any
+        :param controls: list(ControlData)
+        :return: int, identifier of the build
+        """
+
+        self._build_id += 1
+        self._is_building = True
+        thread = QThread()
+        worker = IndexBuildWorker(self._build_id, list(controls), self._index_builder)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.indexBuilt.connect(self._on_index_built)
+        worker.finished.connect(self._on_worker_finished)
+        self._workers[self._build_id] = (thread, worker)
+        thread.start()
+
+        return self._build_id
+
+    def cancel(self):
+        """
+        Discards the result of the current build, if any
+        """
+
+        self._build_id += 1
+        self._is_building = False
+
+    def wait(self):
+        """
+        Blocks until all the running builds are finished. Built indices not notified yet are notified before returning
+        """
+
+        for thread, _ in list(self._workers.values()):
+            thread.wait()
+        QCoreApplication.sendPostedEvents(self, QEvent.MetaCall)
+
+    def _on_index_built(self, build_id, index):
+        """
+        Internal callback function that is called when a worker finishes building its index
+        :param build_id: int
+        :param index: object, index returned by the index builder
+        """
+
+        if build_id != self._build_id:
+            return
+
+        self._is_building = False
+        self.indexBuilt.emit(index)
+
+    def _on_worker_finished(self, build_id):
+        """
+        Internal callback function that is called when a worker finishes, whether its index was built or not
+        :param build_id: int
+        """
+
+        if build_id == self._build_id:
+            self._is_building = False
+
+        thread, worker = self._workers.pop(build_id, (None, None))
+        if not thread:
+            return
+
+        thread.quit()
+        thread.wait()
+        worker.deleteLater()
+        thread.deleteLater()
+
+
+def get_library_keys(controls_library):
+    """
+    Returns the keys of all the library files loaded by the given library
+    :param controls_library: LayeredLibrary or ControlsLibrary
+    :return: set(str)
+    """
+
+    controls_paths = getattr(controls_library, 'controls_paths', None) or [controls_library.controls_path]
+
+    return set(library.get_library_key(controls_path) for controls_path in controls_paths if controls_path)
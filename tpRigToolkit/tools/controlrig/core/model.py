@@ -17,7 +17,10 @@ from tpDcc.libs.python import python
 class ControlRigModel(QObject, object):
 
     controlsPathChanged = Signal(str)
+    controlsPathsChanged = Signal(list)
+    writeLayerChanged = Signal(int)
     controlsChanged = Signal(object)
+    controlsUpdated = Signal(dict)
     currentControlChanged = Signal(str)
     controlNameChanged = Signal(str)
     controlSizeChanged = Signal(float)
@@ -47,7 +50,8 @@ class ControlRigModel(QObject, object):
     def __init__(self, controls_path=None):
         super(ControlRigModel, self).__init__()
 
-        self._controls_path = None
+        self._controls_paths = list()
+        self._write_layer = -1
         self._controls = None
         self._current_control = None
         self._control_name = 'new'
@@ -80,7 +84,7 @@ class ControlRigModel(QObject, object):
 
     @property
     def controls_path(self):
-        return self._controls_path
+        return self._controls_paths[self._write_layer] if self._controls_paths else None
 
     @controls_path.setter
     def controls_path(self, controls_file):
@@ -88,8 +92,39 @@ class ControlRigModel(QObject, object):
         if not controls_path:
             controls_path = self._get_default_data_file()
 
-        self._controls_path = str(controls_path)
-        self.controlsPathChanged.emit(self._controls_path)
+        self._controls_paths = [str(controls_path)]
+        self._write_layer = -1
+        self.controlsPathChanged.emit(self.controls_path)
+
+    @property
+    def controls_paths(self):
+        return list(self._controls_paths)
+
+    @controls_paths.setter
+    def controls_paths(self, controls_files):
+        # Libraries that do not exist yet are kept, so they can be used as write layer. They are created the first
+        # time a control is written into them
+        controls_paths = [str(controls_file) for controls_file in python.force_list(controls_files) if controls_file]
+        if not any(os.path.isfile(controls_path) for controls_path in controls_paths):
+            controls_paths.insert(0, self._get_default_data_file())
+
+        self._controls_paths = controls_paths
+        self._write_layer = -1
+        self.controlsPathsChanged.emit(self.controls_paths)
+        self.controlsPathChanged.emit(self.controls_path)
+
+    @property
+    def existing_controls_paths(self):
+        return [controls_path for controls_path in self._controls_paths if os.path.isfile(controls_path)]
+
+    @property
+    def write_layer(self):
+        return self._write_layer
+
+    @write_layer.setter
+    def write_layer(self, layer_index):
+        self._write_layer = int(layer_index)
+        self.writeLayerChanged.emit(self._write_layer)
 
     @property
     def controls(self):
@@ -100,6 +135,24 @@ class ControlRigModel(QObject, object):
         self._controls = controls_data
         self.controlsChanged.emit(self._controls)
 
+    def update_controls(self, changes):
+        """
+        Patches current controls with the given library changes and notifies them
+        :param changes: dict, added, removed, modified and renamed controls
+        """
+
+        removed = set(changes.get('removed', list()))
+        modified = dict((control.name, control) for control in changes.get('modified', list()))
+        controls = [modified.get(control.name, control) for control in self._controls or list()
+                    if control.name not in removed]
+        controls.extend(changes.get('added', list()))
+        self._controls = controls
+        for original_name, new_name in changes.get('renamed', list()):
+            if self._current_control == original_name:
+                self._current_control = str(new_name)
+
+        self.controlsUpdated.emit(changes)
+
     @property
     def current_control(self):
         return self._current_control
@@ -0,0 +1,168 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains the projection used by the controls viewer for tpRigToolkit.tools.controlrig. The camera of the
+viewer is a linear map from scene coordinates to widget coordinates, so it is reduced to a 3x2 matrix and a
+translation that are computed once per camera change and applied to whole buffers of points at once.
+Functions of this module do not depend on Qt, so they are shared by the viewer widget and the offscreen renderer
+"""
+
+from __future__ import print_function, division, absolute_import
+
+import math
+from array import array
+from collections import OrderedDict
+
+from tpRigToolkit.tools.controlrig.core import controldata, spline
+
+ROTATION = 235
+HEIGHT_ROTATE = 60
+
+# Ratio of the viewport the framed controls fill
+FRAME_RATIO = 0.8
+
+# Points of the joint reference, a sphere of radius one drawn with three circles
+REFERENCE_POINTS = (
+    (0.0, 0.0, 1.0), (-0.5, 0.0, 0.87), (-0.87, 0.0, 0.5), (-1.0, 0.0, 0.0), (-0.87, 0.0, -0.5), (-0.5, 0.0, -0.87),
+    (0.0, 0.0, -1.0), (0.5, 0.0, -0.87), (0.87, 0.0, -0.5), (1.0, 0.0, 0.0), (0.87, 0.0, 0.5), (0.5, 0.0, 0.87),
+    (0.0, 0.0, 1.0), (0.0, 0.7, 0.7), (0.0, 1.0, 0.0), (0.0, 0.7, -0.7), (0.0, 0.0, -1.0), (0.0, -0.7, -0.7),
+    (0.0, -1.0, 0.0), (-0.5, -0.87, 0.0), (-0.87, -0.5, 0.0), (-1.0, 0.0, 0.0), (-0.87, 0.5, 0.0), (-0.5, 0.87, 0.0),
+    (0.0, 1.0, 0.0), (0.5, 0.87, 0.0), (0.87, 0.5, 0.0), (1.0, 0.0, 0.0), (0.87, -0.5, 0.0), (0.5, -0.87, 0.0),
+    (0.0, -1.0, 0.0), (0.0, -0.7, 0.7), (0.0, 0.0, 1.0))
+
+
+def get_projection(rotation, height_rotate, scale, width, height):
+    """
+    Returns the projection of the controls viewer camera
+    :param rotation: float, horizontal rotation of the camera in degrees
+    :param height_rotate: float, vertical rotation of the camera in degrees
+    :param scale: float, number of pixels of each scene unit
+    :param width: float, width of the viewport
+    :param height: float, height of the viewport
+    :return: tuple(tuple(float, float, float, float), tuple(float, float, float, float)), for each 2D axis, the
+        factors of the x, y and z scene coordinates and the translation
+    """
+
+    rotation_sin, rotation_cos = math.sin(math.radians(rotation)), math.cos(math.radians(rotation))
+    height_cos = math.cos(math.radians(height_rotate))
+
+    # Vertical rotation is faked: points are flattened and pushed up depending on their height
+    height_factor = height_cos - math.tan(math.radians(90 - height_rotate)) - math.sin(math.radians(height_rotate))
+
+    return (
+        (scale * rotation_cos, 0.0, -scale * rotation_sin, width * 0.5),
+        (-scale * height_cos * rotation_sin, scale * height_factor, -scale * height_cos * rotation_cos, height * 0.5)
+    )
+
+
+def project_buffer(buffer, projection):
+    """
+    Projects all the points of the given buffer at once
+    :param buffer: array, flat buffer with the 3D coordinates of the points
+    :param projection: tuple, projection returned by get_projection function
+    :return: array, flat buffer with the 2D coordinates of the projected points
+    """
+
+    xs, ys, zs = buffer[0::3], buffer[1::3], buffer[2::3]
+    projected_buffer = array('d', [0.0]) * (2 * len(xs))
+    for axis, (x_factor, y_factor, z_factor, translation) in enumerate(projection):
+        projected_buffer[axis::2] = array('d', [
+            x * x_factor + y * y_factor + z * z_factor + translation for x, y, z in zip(xs, ys, zs)])
+
+    return projected_buffer
+
+
+def project_point(point, projection):
+    """
+    Projects a single point
+    :param point: tuple(float, float, float)
+    :param projection: tuple, projection returned by get_projection function
+    :return: tuple(float, float)
+    """
+
+    x, y, z = point
+
+    return tuple(
+        x * x_factor + y * y_factor + z * z_factor + translation
+        for x_factor, y_factor, z_factor, translation in projection)
+
+
+def get_frame_scale(bounds, width, height, ratio=FRAME_RATIO):
+    """
+    Returns the camera scale that makes the given bounds fit in a viewport of the given size
+    :param bounds: ControlBounds, bounds of the displayed shapes, once transformed
+    :param width: float
+    :param height: float
+    :param ratio: float, ratio of the viewport the bounds fill
+    :return: float or None, scale or None if the bounds have no size
+    """
+
+    extent = math.sqrt(sum(value * value for value in bounds.center)) + bounds.radius
+    if extent <= 0:
+        return None
+
+    # Projected points can be up to sqrt(2) times farther from the center of the view than scene points
+    return ratio * 0.5 * min(width, height) / (math.sqrt(2.0) * extent)
+
+
+def get_grid_segments(ref):
+    """
+    Returns the segments of the axis, the grid and the joint reference drawn in the viewport
+    :param ref: float, radius of the joint reference, it also defines the size of the grid cells
+    :return: OrderedDict(str, list(tuple(tuple(float, float, float), tuple(float, float, float))))
+    """
+
+    step = ref if ref > 0.3 else (5 * ref if ref > 0.05 else 50 * ref)
+    rows = int(10 * (1 / step) * 0.75)
+    reference_scale = ref * 0.5
+    segments = OrderedDict()
+    segments['x_axis'] = [((0, 0, 0), (100, 0, 0))]
+    segments['grid'] = list()
+    for i in range(-rows, rows):
+        segments['grid'].extend([
+            ((-100, 0, i * step), (100, 0, i * step)), ((i * step, 0, -100), (i * step, 0, 100))])
+    segments['y_axis'] = [((0, 0, 0), (0, 100, 0))]
+    segments['z_axis'] = [((0, 0, 0), (0, 0, 100))]
+    segments['reference'] = [
+        tuple(tuple(value * reference_scale for value in point) for point in line) for line in zip(
+            REFERENCE_POINTS[:-1], REFERENCE_POINTS[1:])]
+
+    return segments
+
+
+def get_segments_buffer(segments):
+    """
+    Returns a flat buffer with the coordinates of the start and end points of the given segments
+    :param segments: list(tuple(tuple(float, float, float), tuple(float, float, float)))
+    :return: array
+    """
+
+    return array('d', [value for segment in segments for point in segment for value in point])
+
+
+def get_display_buffer(shape, scale, transform=None, tolerance=spline.TOLERANCE):
+    """
+    Returns the transformed points drawn for the given shape. Smooth shapes are evaluated with the subdivisions
+    their on-screen size needs and closed polylines end with their first point
+    :param shape: ControlShape
+    :param scale: float, number of pixels of each scene unit
+    :param transform: tuple or None, affine returned by controldata.get_transform_affine. If not given, the
+        transform of the shape is used
+    :param tolerance: float, maximum tessellation error in pixels
+    :return: array
+    """
+
+    transform = transform or shape.transform_affine
+    if shape.degree == 1:
+        buffer = shape.buffer
+        if shape.periodic and buffer:
+            buffer = buffer + buffer[:3]
+    else:
+        transform_scale = max(abs(row[1]) for row in transform)
+        subdivisions = spline.get_adaptive_subdivisions(
+            spline.get_curvature_bound(shape.buffer, shape.degree, shape.periodic) * transform_scale, scale,
+            tolerance=tolerance)
+        buffer = spline.get_tessellation_cache().get(shape, subdivisions=subdivisions)
+
+    return controldata.transform_buffer(buffer, transform)
@@ -0,0 +1,249 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains the offscreen renderer of controls for tpRigToolkit.tools.controlrig. Controls are drawn into
+QImages with the same camera used by the controls viewer, so previews can be rendered without widgets, from worker
+threads and in batch jobs (for example, under the offscreen Qt platform: QT_QPA_PLATFORM=offscreen)
+Usage: python -m tpRigToolkit.tools.controlrig.core.renderer [-h] [-s SIZE] [-f FORMAT] [-w WORKERS] [--grid]
+    controls_path output_path
+"""
+
+from __future__ import print_function, division, absolute_import
+
+import os
+import sys
+import logging
+import argparse
+from functools import partial
+from multiprocessing.pool import ThreadPool
+from collections import OrderedDict
+
+from Qt.QtCore import Qt, QPointF, QLineF, QRectF
+from Qt.QtGui import QGuiApplication, QImage, QPainter, QPen, QColor, QBrush, QLinearGradient, QPolygonF
+
+from tpRigToolkit.tools.controlrig.core import consts, controldata, library, projection, spline
+
+logger = logging.getLogger(consts.TOOL_ID)
+
+IMAGE_SIZE = 128
+IMAGE_FORMAT = 'png'
+MAX_WORKERS = 4
+SCALE = 30
+CONTROL_COLOR = (240, 245, 255)
+CONTROL_LINE_WIDTH = 1.5
+BACKGROUND_COLORS = ((44, 46, 48), (124, 143, 163))
+GRID_COLOR = (74, 74, 75)
+AXIS_COLORS = ((255, 0, 0), (0, 255, 0), (125, 125, 255))
+
+# Application created by this module, if any. It is kept, so it is not destroyed while images are drawn
+_application = None
+
+
+class ControlRenderer(object):
+    """
+    Class that draws controls into images. Renderers do not change once created and every image is drawn with its
+    own painter, so a renderer can be shared by several threads. If no scale is given, each control is framed, and
+    if no background colors are given, background is transparent
+    """
+
+    def __init__(self, width=IMAGE_SIZE, height=IMAGE_SIZE, rotation=projection.ROTATION,
+                 height_rotate=projection.HEIGHT_ROTATE, scale=None, tolerance=spline.TOLERANCE,
+                 control_color=CONTROL_COLOR, line_width=CONTROL_LINE_WIDTH, background_colors=BACKGROUND_COLORS,
+                 draw_grid=False, ref=0.5):
+        super(ControlRenderer, self).__init__()
+
+        self._width = max(int(width), 1)
+        self._height = max(int(height), 1)
+        self._rotation = rotation
+        self._height_rotate = height_rotate
+        self._scale = scale
+        self._tolerance = tolerance
+        self._control_color = tuple(control_color)
+        self._line_width = line_width
+        self._background_colors = tuple(tuple(color) for color in background_colors) if background_colors else None
+        self._draw_grid = draw_grid
+        self._ref = ref
+
+    @property
+    def size(self):
+        return self._width, self._height
+
+    def render(self, control, transform=None):
+        """
+        Draws the given control into a new image
+        :param control: ControlData or list(ControlShape)
+        :param transform: tuple or None, affine returned by controldata.get_transform_affine. If not given, shapes
+            are drawn as they are stored
+        :return: QImage
+        """
+
+        shapes = list(getattr(control, 'shapes', control) or list())
+        transform = transform or controldata.get_transform_affine([0, 0, 0], [1, 1, 1], 'XYZ', None)
+        bounds = getattr(control, 'bounds', None) or controldata.get_shapes_bounds(shapes)
+
+        scale = self._scale
+        if not scale:
+            scale = projection.get_frame_scale(
+                bounds.transformed(transform), self._width, self._height) if bounds else None
+            scale = scale or SCALE
+        camera_projection = projection.get_projection(
+            self._rotation, self._height_rotate, scale, self._width, self._height)
+
+        image = QImage(self._width, self._height, QImage.Format_ARGB32_Premultiplied)
+        image.fill(Qt.transparent)
+        painter = QPainter()
+        painter.begin(image)
+        try:
+            painter.setRenderHint(QPainter.Antialiasing)
+            self._draw_background(painter)
+            if self._draw_grid:
+                self._draw_grid_lines(painter, camera_projection)
+            painter.setPen(QPen(QColor(*self._control_color), self._line_width))
+            for shape in shapes:
+                buffer = projection.get_display_buffer(shape, scale, transform=transform, tolerance=self._tolerance)
+                projected_buffer = projection.project_buffer(buffer, camera_projection)
+                painter.drawPolyline(QPolygonF(list(map(QPointF, projected_buffer[0::2], projected_buffer[1::2]))))
+        finally:
+            painter.end()
+
+        return image
+
+    def render_controls(self, controls, transform=None, max_workers=MAX_WORKERS):
+        """
+        Draws the given controls concurrently
+        :param controls: list(ControlData)
+        :param transform: tuple or None, affine applied to all the controls
+        :param max_workers: int, maximum number of threads used to draw the controls
+        :return: OrderedDict(str, QImage), images of the controls by control name, in the given order
+        """
+
+        controls = list(controls)
+        if not controls:
+            return OrderedDict()
+
+        pool = ThreadPool(max(1, min(max_workers, len(controls))))
+        try:
+            images = pool.map(partial(self.render, transform=transform), controls)
+        finally:
+            pool.close()
+            pool.join()
+
+        return OrderedDict((control.name, image) for control, image in zip(controls, images))
+
+    def _draw_background(self, painter):
+        """
+        Internal function that fills the image with the background gradient
+        :param painter: QPainter
+        """
+
+        if not self._background_colors:
+            return
+
+        rect = QRectF(0, 0, self._width, self._height)
+        gradient = QLinearGradient(rect.bottomLeft(), rect.topLeft())
+        gradient.setColorAt(0, QColor(*self._background_colors[0]))
+        gradient.setColorAt(1, QColor(*self._background_colors[1]))
+        painter.fillRect(rect, QBrush(gradient))
+
+    def _draw_grid_lines(self, painter, camera_projection):
+        """
+        Internal function that draws the grid and the axis
+        :param painter: QPainter
+        :param camera_projection: tuple, projection returned by projection.get_projection function
+        """
+
+        segments = projection.get_grid_segments(self._ref)
+        pens = OrderedDict([
+            ('grid', QPen(QColor(*GRID_COLOR), 0.25)),
+            ('x_axis', QPen(QColor(*AXIS_COLORS[0]), 1.5)),
+            ('y_axis', QPen(QColor(*AXIS_COLORS[1]), 0.5)),
+            ('z_axis', QPen(QColor(*AXIS_COLORS[2]), 0.5))
+        ])
+        for name, pen in pens.items():
+            projected_buffer = projection.project_buffer(
+                projection.get_segments_buffer(segments[name]), camera_projection)
+            points_2d = list(map(QPointF, projected_buffer[0::2], projected_buffer[1::2]))
+            painter.setPen(pen)
+            painter.drawLines(list(map(QLineF, points_2d[0::2], points_2d[1::2])))
+
+
+def get_application():
+    """
+    Returns the running Qt application. If there is none, an application using the offscreen Qt platform (unless
+    other platform is set) is created, so images are drawn without windows and no display is needed
+    :return: QGuiApplication
+    """
+
+    global _application
+
+    application = QGuiApplication.instance()
+    if not application:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        application = _application = QGuiApplication(list())
+
+    return application
+
+
+def render_library(controls_paths, output_path, image_format=IMAGE_FORMAT, max_workers=MAX_WORKERS, **kwargs):
+    """
+    Renders all the controls of the given libraries and saves their images in the given folder
+    :param controls_paths: list(str), libraries, from lowest to highest priority
+    :param output_path: str, folder where images are saved, one file for each control named after the control
+    :param image_format: str, format of the images files
+    :param max_workers: int, maximum number of threads used to draw and save the images
+    :param kwargs: dict, renderer options (see ControlRenderer)
+    :return: OrderedDict(str, str or None), path of the image of each control or None if the image was not saved
+    """
+
+    controls = library.LayeredLibrary(controls_paths, lazy=True).load()
+    renderer = ControlRenderer(**kwargs)
+    if not os.path.isdir(output_path):
+        os.makedirs(output_path)
+
+    def _render(control):
+        image_path = os.path.join(output_path, '{}.{}'.format(control.name, image_format))
+        if not renderer.render(control).save(image_path, image_format.upper()):
+            logger.warning('Impossible to save "{}" control image: "{}"'.format(control.name, image_path))
+            return None
+        return image_path
+
+    pool = ThreadPool(max(1, min(max_workers, len(controls) or 1)))
+    try:
+        image_paths = pool.map(_render, controls)
+    finally:
+        pool.close()
+        pool.join()
+
+    return OrderedDict((control.name, image_path) for control, image_path in zip(controls, image_paths))
+
+
+def main(args=None):
+    """
+    Renders the controls of the library given in the command line arguments
+    :param args: list(str) or None, command line arguments. If not given, system arguments are used
+    :return: int, exit code
+    """
+
+    parser = argparse.ArgumentParser(description='Renders the controls of a controls library into image files')
+    parser.add_argument('controls_path', help='Path of the controls library file')
+    parser.add_argument('output_path', help='Folder where images are saved')
+    parser.add_argument('-s', '--size', type=int, default=IMAGE_SIZE, help='Width and height of the images')
+    parser.add_argument('-f', '--format', default=IMAGE_FORMAT, help='Format of the images files')
+    parser.add_argument('-w', '--workers', type=int, default=MAX_WORKERS, help='Number of rendering threads')
+    parser.add_argument('--grid', action='store_true', help='Draws the grid and the axis')
+    parsed_args = parser.parse_args(args)
+
+    get_application()
+
+    image_paths = render_library(
+        [parsed_args.controls_path], parsed_args.output_path, image_format=parsed_args.format,
+        max_workers=parsed_args.workers, width=parsed_args.size, height=parsed_args.size, draw_grid=parsed_args.grid)
+    saved_count = len([image_path for image_path in image_paths.values() if image_path])
+    print('Controls: {}, images saved: {} > {}'.format(len(image_paths), saved_count, parsed_args.output_path))
+
+    return 0 if saved_count == len(image_paths) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
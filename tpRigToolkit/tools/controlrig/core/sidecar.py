@@ -0,0 +1,572 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains the binary sidecar format used to speed up controls libraries loading
+
+Sidecar files are stored next to their JSON controls library and have the following layout (little endian):
+    - header: magic (4s), version (H), flags (H), source size (Q), controls count (I), shapes count (I),
+      table offset (Q), generation (20s)
+    - records, of two kinds:
+        - shape records: degree (B), periodic (B), CVs count (I) followed by the packed float64 CVs buffer
+        - control records: shapes count (H) followed by the offset (Q) of the shape record of each shape
+    - table: for each control, name size (H), name (utf-8), control record offset (Q), record size (I) and
+      control content hash (20s)
+
+Shapes are content addressed: identical shapes are stored only once and shared by all the controls using them.
+Table is stored after the records, so sidecar files can be written while the controls library is streamed.
+Generation is the content hash of the JSON library the sidecar was written from. Records are addressed by offset, so
+readers holding offsets of a sidecar check its generation before decoding them
+"""
+
+from __future__ import print_function, division, absolute_import
+
+import os
+import struct
+import hashlib
+import binascii
+import logging
+import threading
+from functools import partial
+from collections import OrderedDict
+
+from tpRigToolkit.tools.controlrig.core import consts, fileio
+
+logger = logging.getLogger(consts.TOOL_ID)
+
+SIDECAR_EXTENSION = '.bin'
+SIDECAR_MAGIC = b'TPCR'
+SIDECAR_VERSION = 5
+
+HEADER_STRUCT = struct.Struct('<4sHHQIIQ20s')
+NAME_SIZE_STRUCT = struct.Struct('<H')
+TABLE_ENTRY_STRUCT = struct.Struct('<QI20s')
+SHAPES_COUNT_STRUCT = struct.Struct('<H')
+SHAPE_OFFSET_STRUCT = struct.Struct('<Q')
+SHAPE_HEADER_STRUCT = struct.Struct('<BBI')
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class SidecarGenerationError(ValueError):
+    """
+    Exception raised when a sidecar file is read with offsets indexed from a different generation of the file
+    """
+
+    pass
+
+
+def get_sidecar_path(controls_path):
+    """
+    Returns the path of the binary sidecar file of the given controls library
+    :param controls_path: str
+    :return: str
+    """
+
+    return os.path.splitext(controls_path)[0] + SIDECAR_EXTENSION
+
+
+def is_sidecar_valid(controls_path):
+    """
+    Returns whether or not the binary sidecar of the given controls library exists and is up to date
+    :param controls_path: str
+    :return: bool
+    """
+
+    sidecar_path = get_sidecar_path(controls_path)
+    if not os.path.isfile(controls_path) or not os.path.isfile(sidecar_path):
+        return False
+
+    controls_stat = os.stat(controls_path)
+    if os.path.getmtime(sidecar_path) < controls_stat.st_mtime:
+        return False
+
+    try:
+        with open(sidecar_path, 'rb') as fh:
+            header = read_header(fh.read(HEADER_STRUCT.size))
+    except (IOError, OSError, ValueError):
+        return False
+
+    return header['source_size'] == controls_stat.st_size
+
+
+def read_header(header_contents):
+    """
+    Decodes the header of a sidecar file
+    :param header_contents: bytes
+    :return: dict
+    """
+
+    if len(header_contents) < HEADER_STRUCT.size:
+        raise ValueError('Sidecar header is truncated')
+
+    magic, version, flags, source_size, controls_count, shapes_count, table_offset, generation = \
+        HEADER_STRUCT.unpack_from(header_contents, 0)
+    if magic != SIDECAR_MAGIC:
+        raise ValueError('Invalid sidecar magic: {}'.format(magic))
+    if version != SIDECAR_VERSION:
+        raise ValueError('Unsupported sidecar version: {}'.format(version))
+
+    return {
+        'version': version,
+        'flags': flags,
+        'source_size': source_size,
+        'controls_count': controls_count,
+        'shapes_count': shapes_count,
+        'table_offset': table_offset,
+        'generation': binascii.hexlify(generation).decode('ascii')
+    }
+
+
+def get_source_hash(controls_path):
+    """
+    Returns the SHA1 hash of the contents of the given controls library. File is read in chunks
+    :param controls_path: str
+    :return: str
+    """
+
+    source_hash = hashlib.sha1()
+    with open(controls_path, 'rb') as fh:
+        for chunk in iter(partial(fh.read, HASH_CHUNK_SIZE), b''):
+            source_hash.update(chunk)
+
+    return source_hash.hexdigest()
+
+
+def encode_shape(shape):
+    """
+    Encodes a shape into a sidecar shape record
+    :param shape: dict
+    :return: bytes
+    """
+
+    cvs = shape['cvs']
+    periodic = shape.get('periodic', None)
+    if periodic is None:
+        periodic = (1 if shape['form'] == 3 else 0) if 'form' in shape else 1
+
+    return SHAPE_HEADER_STRUCT.pack(int(shape['degree']), int(periodic), len(cvs)) + struct.pack(
+        '<{}d'.format(len(cvs) * 3), *[float(value) for cv in cvs for value in cv[:3]])
+
+
+def get_shape_hash(shape):
+    """
+    Returns the content hash of the given shape. Shapes with the same degree, periodic flag and CVs share the same
+    hash, no matter the container types used to store them
+    :param shape: dict
+    :return: str
+    """
+
+    return hashlib.sha1(encode_shape(shape)).hexdigest()
+
+
+def get_control_hash(shapes):
+    """
+    Returns the content hash of a control with the given shapes. Control names are not taken into account
+    :param shapes: list(dict) or dict
+    :return: str
+    """
+
+    if isinstance(shapes, dict):
+        shapes = list(shapes.values())
+
+    return hashlib.sha1(b''.join(encode_shape(shape) for shape in shapes or list())).hexdigest()
+
+
+def decode_shape(contents, offset=0):
+    """
+    Decodes the shape stored in a sidecar shape record. CVs are returned as an immutable tuple of points
+    :param contents: bytes
+    :param offset: int, position of the record within given contents
+    :return: dict
+    """
+
+    degree, periodic, cvs_count = SHAPE_HEADER_STRUCT.unpack_from(contents, offset)
+    values = struct.unpack_from('<{}d'.format(cvs_count * 3), contents, offset + SHAPE_HEADER_STRUCT.size)
+
+    return {
+        'cvs': tuple(values[i:i + 3] for i in range(0, len(values), 3)),
+        'degree': degree,
+        'periodic': periodic
+    }
+
+
+def get_shape_record_size(contents, offset=0):
+    """
+    Returns the size in bytes of the sidecar shape record stored in the given position
+    :param contents: bytes
+    :param offset: int, position of the record within given contents
+    :return: int
+    """
+
+    return SHAPE_HEADER_STRUCT.size + SHAPE_HEADER_STRUCT.unpack_from(contents, offset)[2] * 24
+
+
+def encode_control(shape_offsets):
+    """
+    Encodes a control into a sidecar control record
+    :param shape_offsets: list(int), offsets of the shape records of the control
+    :return: bytes
+    """
+
+    return SHAPES_COUNT_STRUCT.pack(len(shape_offsets)) + b''.join(
+        SHAPE_OFFSET_STRUCT.pack(shape_offset) for shape_offset in shape_offsets)
+
+
+def decode_control(contents, offset=0):
+    """
+    Decodes the shape offsets stored in a sidecar control record
+    :param contents: bytes
+    :param offset: int, position of the record within given contents
+    :return: list(int)
+    """
+
+    shapes_count = SHAPES_COUNT_STRUCT.unpack_from(contents, offset)[0]
+    offset += SHAPES_COUNT_STRUCT.size
+
+    return list(struct.unpack_from('<{}Q'.format(shapes_count), contents, offset))
+
+
+class SidecarWriter(object):
+    """
+    Class that writes the binary sidecar of a controls library one control at a time. Contents are written into a
+    temporary file, unique to each writer, that replaces the sidecar file once all the controls are written.
+    Written controls can be read back from any thread while the writer is open and once it is closed
+    """
+
+    def __init__(self, controls_path):
+        super(SidecarWriter, self).__init__()
+
+        self._controls_path = controls_path
+        self._sidecar_path = get_sidecar_path(controls_path)
+        self._temp_path = None
+        self._file = None
+        self._table = OrderedDict()
+        self._shapes = dict()
+        self._offset = HEADER_STRUCT.size
+        self._shape_references = 0
+        self._saved_bytes = 0
+        self._generation = None
+        self._lock = threading.RLock()
+
+    @property
+    def sidecar_path(self):
+        return self._sidecar_path
+
+    @property
+    def temp_path(self):
+        return self._temp_path
+
+    @property
+    def table(self):
+        return self._table
+
+    @property
+    def shapes_count(self):
+        return len(self._shapes)
+
+    @property
+    def shape_references(self):
+        return self._shape_references
+
+    @property
+    def saved_bytes(self):
+        return self._saved_bytes
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def open(self):
+        """
+        Opens the temporary sidecar file
+        :return: bool
+        """
+
+        try:
+            self._file, self._temp_path = fileio.create_temp_file(self._sidecar_path, mode_path=self._controls_path)
+            self._file.write(b'\0' * HEADER_STRUCT.size)
+        except (IOError, OSError) as exc:
+            logger.debug('Impossible to write sidecar file "{}" : {}'.format(self._sidecar_path, exc))
+            self.abort()
+            return False
+
+        return True
+
+    def add_control(self, control_name, shapes):
+        """
+        Encodes and writes the shapes of the given control
+        :param control_name: str
+        :param shapes: list(dict) or dict
+        :return: tuple(int, int, str) or None, offset and size of the written record and content hash of the control
+        """
+
+        if not self._file:
+            return None
+
+        if isinstance(shapes, dict):
+            shapes = list(shapes.values())
+        try:
+            shape_records = [encode_shape(shape) for shape in shapes]
+        except (KeyError, TypeError, ValueError, struct.error) as exc:
+            logger.warning('Impossible to store control "{}" in sidecar file : {}'.format(control_name, exc))
+            return None
+
+        with self._lock:
+            return self._add_records(control_name, shape_records)
+
+    def read_control(self, offset, size):
+        """
+        Reads and decodes a control record written by this writer. While the writer is open, the record is read from
+        the temporary sidecar file. Once closed, it is read from the sidecar file, as long as it has not been rewritten
+        :param offset: int
+        :param size: int
+        :return: list(dict)
+        """
+
+        with self._lock:
+            if self._file:
+                self._file.flush()
+                return read_control(self._temp_path, offset, size)
+            if self._generation is None:
+                raise IOError('Sidecar file "{}" was not written'.format(self._sidecar_path))
+
+        return read_control(self._sidecar_path, offset, size, generation=self._generation)
+
+    def close(self, source_hash=None):
+        """
+        Writes the names and offsets table and replaces the sidecar file with the written one
+        :param source_hash: str or None, content hash of the controls library the sidecar is written from. If not
+            given, it is computed from the controls library file
+        :return: str or None, path of the written sidecar file
+        """
+
+        with self._lock:
+            return self._close(source_hash)
+
+    def abort(self):
+        """
+        Closes and removes the temporary sidecar file created by this writer
+        """
+
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+            if self._temp_path and os.path.isfile(self._temp_path):
+                try:
+                    os.remove(self._temp_path)
+                except OSError:
+                    pass
+            self._temp_path = None
+
+    def _add_records(self, control_name, shape_records):
+        """
+        Internal function that writes the given shape records of a control and its control record
+        :param control_name: str
+        :param shape_records: list(bytes)
+        :return: tuple(int, int, str) or None, offset and size of the written record and content hash of the control
+        """
+
+        if not self._file:
+            return None
+
+        try:
+            shape_offsets = list()
+            for shape_record in shape_records:
+                shape_hash = hashlib.sha1(shape_record).hexdigest()
+                shape_offset = self._shapes.get(shape_hash, None)
+                if shape_offset is None:
+                    shape_offset = self._shapes[shape_hash] = self._write(shape_record)
+                else:
+                    self._saved_bytes += len(shape_record)
+                shape_offsets.append(shape_offset)
+            control_record = encode_control(shape_offsets)
+            control_offset = self._write(control_record)
+        except (IOError, OSError) as exc:
+            logger.debug('Impossible to write sidecar file "{}" : {}'.format(self._sidecar_path, exc))
+            self.abort()
+            return None
+
+        self._shape_references += len(shape_records)
+        self._table[control_name] = (
+            control_offset, len(control_record), hashlib.sha1(b''.join(shape_records)).hexdigest())
+
+        return self._table[control_name]
+
+    def _close(self, source_hash=None):
+        """
+        Internal function that writes the names and offsets table and replaces the sidecar file
+        :param source_hash: str or None
+        :return: str or None
+        """
+
+        if not self._file:
+            return None
+
+        table = list()
+        for control_name, (offset, size, control_hash) in self._table.items():
+            name = control_name.encode('utf-8')
+            table.append(NAME_SIZE_STRUCT.pack(len(name)) + name + TABLE_ENTRY_STRUCT.pack(
+                offset, size, binascii.unhexlify(control_hash)))
+
+        try:
+            source_hash = source_hash or get_source_hash(self._controls_path)
+            header = HEADER_STRUCT.pack(
+                SIDECAR_MAGIC, SIDECAR_VERSION, 0, os.path.getsize(self._controls_path), len(table),
+                len(self._shapes), self._offset, binascii.unhexlify(source_hash))
+            self._file.write(b''.join(table))
+            self._file.seek(0)
+            self._file.write(header)
+            self._file.close()
+            self._file = None
+            fileio.replace_file(self._temp_path, self._sidecar_path)
+        except (IOError, OSError) as exc:
+            logger.debug('Impossible to write sidecar file "{}" : {}'.format(self._sidecar_path, exc))
+            self.abort()
+            return None
+        self._generation = source_hash
+
+        return self._sidecar_path
+
+    def _write(self, record):
+        """
+        Internal function that writes the given record at the end of the temporary sidecar file
+        :param record: bytes
+        :return: int, offset of the written record
+        """
+
+        record_offset = self._offset
+        self._file.write(record)
+        self._offset += len(record)
+
+        return record_offset
+
+
+def write_sidecar(controls_path, controls_data, source_hash=None):
+    """
+    Writes the binary sidecar of the given controls library
+    :param controls_path: str, path of the JSON controls library
+    :param controls_data: dict, dictionary containing the shapes of each control of the library
+    :param source_hash: str or None, content hash of the JSON controls library
+    :return: str or None, path of the written sidecar file
+    """
+
+    sidecar_writer = SidecarWriter(controls_path)
+    if not sidecar_writer.open():
+        return None
+    for control_name, shapes in controls_data.items():
+        sidecar_writer.add_control(control_name, shapes)
+
+    return sidecar_writer.close(source_hash=source_hash)
+
+
+def read_table(contents, table_offset=None):
+    """
+    Decodes the names and offsets table of a sidecar file
+    :param contents: bytes, sidecar contents, at least header and table must be included
+    :param table_offset: int or None, position of the table within given contents. If not given, the table offset
+        stored in the header is used
+    :return: OrderedDict, dictionary containing the offset, size and content hash of each control record
+    """
+
+    header = read_header(contents)
+    offset = header['table_offset'] if table_offset is None else table_offset
+    table = OrderedDict()
+    for _ in range(header['controls_count']):
+        name_size = NAME_SIZE_STRUCT.unpack_from(contents, offset)[0]
+        offset += NAME_SIZE_STRUCT.size
+        name = contents[offset:offset + name_size].decode('utf-8')
+        offset += name_size
+        record_offset, record_size, control_hash = TABLE_ENTRY_STRUCT.unpack_from(contents, offset)
+        table[name] = (record_offset, record_size, binascii.hexlify(control_hash).decode('ascii'))
+        offset += TABLE_ENTRY_STRUCT.size
+
+    return table
+
+
+def read_index(sidecar_path):
+    """
+    Reads the names and offsets table of the given sidecar file without reading any of its control records
+    :param sidecar_path: str
+    :return: OrderedDict, dictionary containing the offset, size and content hash of each control record
+    """
+
+    return read_header_and_index(sidecar_path)[1]
+
+
+def read_header_and_index(sidecar_path):
+    """
+    Reads the header and the names and offsets table of the given sidecar file. Both are read from the same file
+    handle, so the generation of the header is the one the offsets of the table belong to
+    :param sidecar_path: str
+    :return: tuple(dict, OrderedDict), header and table of the sidecar file
+    """
+
+    with open(sidecar_path, 'rb') as fh:
+        contents = fh.read(HEADER_STRUCT.size)
+        header = read_header(contents)
+        fh.seek(header['table_offset'])
+        contents += fh.read()
+
+    return header, read_table(contents, table_offset=HEADER_STRUCT.size)
+
+
+def read_control(sidecar_path, offset, size, generation=None):
+    """
+    Reads and decodes a single control from the given sidecar file
+    :param sidecar_path: str
+    :param offset: int, position of the control record within the sidecar file
+    :param size: int, size in bytes of the control record
+    :param generation: str or None, generation of the sidecar file the offset was indexed from. If given and the
+        sidecar file has been rewritten since then, SidecarGenerationError is raised
+    :return: list(dict)
+    """
+
+    shapes = list()
+    with open(sidecar_path, 'rb') as fh:
+        if generation is not None:
+            header = read_header(fh.read(HEADER_STRUCT.size))
+            if header['generation'] != generation:
+                raise SidecarGenerationError('Sidecar file "{}" has been rewritten'.format(sidecar_path))
+        fh.seek(offset)
+        for shape_offset in decode_control(fh.read(size)):
+            fh.seek(shape_offset)
+            shape_contents = fh.read(SHAPE_HEADER_STRUCT.size)
+            shape_contents += fh.read(get_shape_record_size(shape_contents) - SHAPE_HEADER_STRUCT.size)
+            shapes.append(decode_shape(shape_contents))
+
+    return shapes
+
+
+def read_sidecar(sidecar_path):
+    """
+    Reads all the controls stored in the given sidecar file
+    :param sidecar_path: str
+    :return: OrderedDict, dictionary containing the shapes of each control
+    """
+
+    with open(sidecar_path, 'rb') as fh:
+        contents = fh.read()
+
+    return read_contents(contents)
+
+
+def read_contents(contents):
+    """
+    Decodes all the controls stored in the given sidecar contents. Each shape record is decoded only once, so
+    controls sharing a shape share the same CVs
+    :param contents: bytes
+    :return: OrderedDict, dictionary containing the shapes of each control
+    """
+
+    shapes = dict()
+    controls_data = OrderedDict()
+    for control_name, (offset, _, _) in read_table(contents).items():
+        control_shapes = list()
+        for shape_offset in decode_control(contents, offset):
+            if shape_offset not in shapes:
+                shapes[shape_offset] = decode_shape(contents, shape_offset)
+            control_shapes.append(dict(shapes[shape_offset]))
+        controls_data[control_name] = control_shapes
+
+    return controls_data
@@ -0,0 +1,469 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains controls similarity index for tpRigToolkit.tools.controlrig. Each control is described by a
+signature computed from points resampled along its curves: the distribution of the distances of those points to their
+centroid and the distribution of the distances between them, normalized by the size of the control. Signatures do not
+depend on the position, size, rotation or CVs count of the controls, so similar controls have close signatures
+Usage: python -m tpRigToolkit.tools.controlrig.core.similarity [-h] [-d DISTANCE] controls_path [controls_path ...]
+"""
+
+from __future__ import print_function, division, absolute_import
+
+import sys
+import math
+import argparse
+from array import array
+from bisect import bisect_right
+from itertools import compress, repeat
+from operator import add, ge, mul, sub
+from collections import OrderedDict
+
+from tpRigToolkit.tools.controlrig.core import controldata, library, spline
+
+SAMPLES = 512
+DISTRIBUTION_SIZE = 32
+OFFSETS_COUNT = 32
+SIMILAR_CONTROLS_COUNT = 10
+# Calibrated with the bundled library: the same curve rebuilt with other CVs count, as a polyline or with other start
+# point is closer than 0.006 to the original one, while the closest different controls (circle and wave_circle2) are
+# 0.023 apart
+DUPLICATE_DISTANCE = 0.012
+
+
+class SimilarityIndex(object):
+    """
+    Class that stores the signatures of a set of controls as the rows of a matrix and answers similarity queries
+    computing the distances between a signature and all the rows at once. Matrix is also stored by columns, so
+    distances are computed with one operation over each column instead of one operation for each row
+    """
+
+    def __init__(self):
+        super(SimilarityIndex, self).__init__()
+
+        self._names = list()
+        self._rows = list()
+        self._columns = None
+        self._norms = array('d')
+        self._positions = dict()
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, control_name):
+        return control_name in self._positions
+
+    @property
+    def names(self):
+        return list(self._names)
+
+    def get_signature(self, control_name):
+        """
+        Returns the signature of the given control
+        :param control_name: str
+        :return: array or None
+        """
+
+        position = self._positions.get(control_name)
+
+        return self._rows[position] if position is not None else None
+
+    def add_control(self, control):
+        """
+        Adds the signature of the given control to the index. Controls without curves are not indexed
+        :param control: ControlData
+        :return: bool
+        """
+
+        signature = get_signature(control.shapes)
+        if not signature:
+            return False
+
+        self.add_signature(control.name, signature)
+
+        return True
+
+    def add_signature(self, control_name, signature):
+        """
+        Adds the given signature to the index, replacing the current signature of the control, if any
+        :param control_name: str
+        :param signature: array
+        """
+
+        self.remove(control_name)
+        self._positions[control_name] = len(self._names)
+        self._names.append(control_name)
+        self._rows.append(signature)
+        self._columns = None
+        self._norms.append(sum(map(mul, signature, signature)))
+
+    def remove(self, control_name):
+        """
+        Removes the signature of the given control from the index
+        :param control_name: str
+        """
+
+        position = self._positions.pop(control_name, None)
+        if position is None:
+            return
+
+        self._names.pop(position)
+        self._rows.pop(position)
+        self._columns = None
+        self._norms.pop(position)
+        for name in self._names[position:]:
+            self._positions[name] -= 1
+
+    def update_controls(self, changes):
+        """
+        Patches the index with the given library changes, so only the signatures of new or modified controls are
+        computed
+        :param changes: dict, added, removed, modified and renamed controls
+        """
+
+        for control_name in changes.get('removed', list()):
+            self.remove(control_name)
+        for original_name, new_name in changes.get('renamed', list()):
+            signature = self.get_signature(original_name)
+            self.remove(original_name)
+            if signature:
+                self.add_signature(new_name, signature)
+        for control in list(changes.get('modified', list())) + list(changes.get('added', list())):
+            if not self.add_control(control):
+                self.remove(control.name)
+
+    def get_distances(self, signature, start=0):
+        """
+        Returns the distances between the given signature and the indexed signatures. Squared distances are
+        computed as |a|^2 + |b|^2 - 2 * a.b, using the precomputed norms of the indexed signatures
+        :param signature: array
+        :param start: int, position of the first indexed signature the distance is computed to
+        :return: list(float), distances in the order of the indexed control names, starting from the given position
+        """
+
+        if self._columns is None:
+            self._columns = get_columns(self._rows)
+        norm = sum(map(mul, signature, signature))
+        dot_products = get_dot_products(self._columns, signature, start, len(self._rows))
+        squared_distances = map(sub, map(add, self._norms[start:], repeat(norm)), map(mul, dot_products, repeat(2.0)))
+
+        return [math.sqrt(max(squared_distance, 0.0)) for squared_distance in squared_distances]
+
+    def query(self, signature, count=SIMILAR_CONTROLS_COUNT, max_distance=None, exclude=None):
+        """
+        Returns the indexed controls closest to the given signature
+        :param signature: array
+        :param count: int, maximum number of controls to return
+        :param max_distance: float or None, controls farther than this distance are not returned
+        :param exclude: str or None, name of a control that is not returned
+        :return: list(tuple(str, float)), names and distances of the controls, from closest to farthest
+        """
+
+        results = sorted(
+            (distance, name) for name, distance in zip(self._names, self.get_distances(signature))
+            if name != exclude and (max_distance is None or distance <= max_distance))
+
+        return [(name, distance) for distance, name in results[:count]]
+
+    def query_control(self, control_name, count=SIMILAR_CONTROLS_COUNT, max_distance=None):
+        """
+        Returns the indexed controls most similar to the given indexed control
+        :param control_name: str
+        :param count: int, maximum number of controls to return
+        :param max_distance: float or None, controls farther than this distance are not returned
+        :return: list(tuple(str, float)), names and distances of the controls, from closest to farthest
+        """
+
+        signature = self.get_signature(control_name)
+        if not signature:
+            return list()
+
+        return self.query(signature, count=count, max_distance=max_distance, exclude=control_name)
+
+    def find_duplicates(self, max_distance=DUPLICATE_DISTANCE):
+        """
+        Returns the groups of indexed controls whose signatures are closer than the given distance. Signatures are
+        sorted by their length: two signatures can only be closer than the distance if their lengths are, so each
+        signature is only compared, all at once, with the next ones whose length is within the distance
+        :param max_distance: float
+        :return: list(list(str)), groups of near duplicated controls, biggest groups first
+        """
+
+        order = sorted(range(len(self._names)), key=self._norms.__getitem__)
+        rows = [self._rows[i] for i in order]
+        columns = get_columns(rows)
+        norms = array('d', (self._norms[i] for i in order))
+        lengths = [math.sqrt(norm) for norm in norms]
+        parents = list(range(len(rows)))
+
+        def _find(i):
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+
+        # Distances are symmetric, so only the upper triangle of the distances matrix is computed. Squared distance
+        # |a|^2 + |b|^2 - 2 * a.b is within the squared maximum distance if 2 * a.b - |b|^2 >= |a|^2 - max_distance^2
+        for i, signature in enumerate(rows):
+            end = bisect_right(lengths, lengths[i] + max_distance, i + 1)
+            if end == i + 1:
+                continue
+            dot_products = get_dot_products(columns, signature, i + 1, end)
+            are_duplicates = map(ge, map(sub, map(mul, dot_products, repeat(2.0)), norms[i + 1:end]), repeat(
+                norms[i] - max_distance * max_distance))
+            for j in compress(range(i + 1, end), are_duplicates):
+                parents[_find(j)] = _find(i)
+
+        groups = OrderedDict()
+        for i in sorted(range(len(rows)), key=order.__getitem__):
+            groups.setdefault(_find(i), list()).append(self._names[order[i]])
+
+        return sorted([names for names in groups.values() if len(names) > 1], key=len, reverse=True)
+
+
+def get_columns(rows):
+    """
+    Returns the columns of the matrix with the given rows
+    :param rows: list(array)
+    :return: list(array)
+    """
+
+    return [array('d', column) for column in zip(*rows)]
+
+
+def get_dot_products(columns, signature, start=0, end=None):
+    """
+    Returns the dot products between the given signature and the rows of the matrix with the given columns. Each
+    column is multiplied by the matching value of the signature at once, without visiting the rows one by one
+    :param columns: list(array), columns of the matrix
+    :param signature: array
+    :param start: int, first row the dot product is computed with
+    :param end: int or None, row after the last one the dot product is computed with
+    :return: list(float)
+    """
+
+    end = len(columns[0]) if end is None and columns else end or 0
+    dot_products = [0.0] * max(end - start, 0)
+    for column, value in zip(columns, signature):
+        if value:
+            dot_products = list(map(add, dot_products, map(mul, column[start:end], repeat(value))))
+
+    return dot_products
+
+
+def get_polylines(shapes):
+    """
+    Returns the points of the curves of the given shapes. Smooth curves are taken from the tessellations cache
+    :param shapes: list(ControlShape)
+    :return: list(list(tuple(float, float, float)))
+    """
+
+    polylines = list()
+    for shape in shapes:
+        if shape.degree == 1:
+            points = controldata.get_points(shape.buffer)
+            if shape.periodic and points:
+                points.append(points[0])
+        else:
+            points = controldata.get_points(spline.get_tessellation_cache().get(shape))
+        if points:
+            polylines.append(points)
+
+    return polylines
+
+
+def resample(polylines, count=SAMPLES):
+    """
+    Returns the given number of points evenly distributed along the given polylines
+    :param polylines: list(list(tuple(float, float, float)))
+    :param count: int
+    :return: list(tuple(float, float, float))
+    """
+
+    segments = [(start, end, math.sqrt(sum((b - a) ** 2 for a, b in zip(start, end))))
+                for points in polylines for start, end in zip(points[:-1], points[1:])]
+    total_length = sum(length for _, _, length in segments)
+    if total_length <= 0:
+        return [point for points in polylines for point in points[:1]]
+
+    step = total_length / count
+    samples = list()
+    target = step * 0.5
+    travelled = 0.0
+    for start, end, length in segments:
+        while length and target <= travelled + length and len(samples) < count:
+            t = (target - travelled) / length
+            samples.append(tuple(a + (b - a) * t for a, b in zip(start, end)))
+            target += step
+        travelled += length
+
+    return samples
+
+
+def get_distribution(values, size=DISTRIBUTION_SIZE):
+    """
+    Returns the given number of evenly distributed quantiles of the given values. Quantiles are taken at the middle
+    of each one of the given number of intervals, so minimum and maximum values, the ones that change the most with
+    the position of the samples, are left out. Quantiles are interpolated between the closest values, so they change
+    smoothly when the values change
+    :param values: list(float)
+    :param size: int
+    :return: list(float)
+    """
+
+    values = sorted(values)
+    last_index = len(values) - 1
+    distribution = list()
+    for i in range(size):
+        position = min(max((i + 0.5) * len(values) / size - 0.5, 0.0), last_index)
+        index = min(int(position), last_index - 1) if last_index else 0
+        t = position - index
+        distribution.append(values[index] * (1.0 - t) + values[min(index + 1, last_index)] * t)
+
+    return distribution
+
+
+def get_point_distances(coordinates, other_coordinates):
+    """
+    Returns the distances between the points with the given coordinates and the points with the other coordinates
+    :param coordinates: list(list(float)), X, Y and Z coordinates of the points
+    :param other_coordinates: list(list(float)), X, Y and Z coordinates of the other points
+    :return: list(float)
+    """
+
+    squared_distances = None
+    for values, other_values in zip(coordinates, other_coordinates):
+        differences = list(map(sub, values, other_values))
+        squared_differences = map(mul, differences, differences)
+        squared_distances = list(squared_differences if squared_distances is None else map(
+            add, squared_distances, squared_differences))
+
+    return list(map(math.sqrt, squared_distances))
+
+
+def get_signature(shapes, samples=SAMPLES, size=DISTRIBUTION_SIZE, offsets_count=OFFSETS_COUNT):
+    """
+    Returns the signature of the control defined by the given shapes
+    :param shapes: list(ControlShape)
+    :param samples: int, number of points resampled along the curves of the control
+    :param size: int, number of values of each one of the distributions of the signature
+    :param offsets_count: int, number of offsets along the curves between the points whose distances are computed
+    :return: array or None, signature of the control or None if the control has no size
+    """
+
+    points = resample(get_polylines(shapes), samples)
+    if len(points) < 2:
+        return None
+
+    points_count = len(points)
+    coordinates = [list(values) for values in zip(*points)]
+    centroid = [[sum(values) / points_count] * points_count for values in coordinates]
+    radial_distances = get_point_distances(coordinates, centroid)
+    scale = math.sqrt(sum(map(mul, radial_distances, radial_distances)) / points_count)
+    if scale <= 0:
+        return None
+
+    # Distances between points are computed between each point and the points found at some offsets after it. Every
+    # point is visited for each offset, so distances do not depend on which one of the points is the first one
+    point_distances = list()
+    for offset in range(1, points_count // 2 + 1, max(points_count // (2 * offsets_count), 1)):
+        point_distances.extend(get_point_distances(
+            coordinates, [values[offset:] + values[:offset] for values in coordinates]))
+
+    return array('d', [distance / scale for distance in get_distribution(radial_distances, size) + get_distribution(
+        point_distances or [0.0], size)])
+
+
+def get_distance(signature, other):
+    """
+    Returns the distance between the given signatures
+    :param signature: array
+    :param other: array
+    :return: float
+    """
+
+    return math.sqrt(sum((a - b) ** 2 for a, b in zip(signature, other)))
+
+
+def build_index(controls):
+    """
+    Returns a similarity index with the given controls
+    :param controls: list(ControlData)
+    :return: SimilarityIndex
+    """
+
+    similarity_index = SimilarityIndex()
+    for control in controls:
+        similarity_index.add_control(control)
+
+    return similarity_index
+
+
+def get_duplicates_report(controls_paths, max_distance=DUPLICATE_DISTANCE):
+    """
+    Returns a report of the groups of near duplicated controls of the given libraries
+    :param controls_paths: list(str), libraries, from lowest to highest priority
+    :param max_distance: float, maximum distance between the signatures of near duplicated controls
+    :return: OrderedDict
+    """
+
+    layered_library = library.LayeredLibrary(controls_paths)
+    controls = layered_library.load()
+    similarity_index = build_index(controls)
+    groups = similarity_index.find_duplicates(max_distance)
+    duplicates = list()
+    for names in groups:
+        signatures = [similarity_index.get_signature(name) for name in names]
+        duplicates.append(OrderedDict([
+            ('controls', names),
+            ('max_distance', max(get_distance(signature, other) for i, signature in enumerate(
+                signatures) for other in signatures[i + 1:]))
+        ]))
+
+    return OrderedDict([
+        ('controls_paths', list(controls_paths)),
+        ('controls', len(controls)),
+        ('indexed_controls', len(similarity_index)),
+        ('max_distance', max_distance),
+        ('duplicates', duplicates)
+    ])
+
+
+def format_duplicates_report(report):
+    """
+    Returns a human readable version of the given near duplicated controls report
+    :param report: dict, report returned by get_duplicates_report function
+    :return: str
+    """
+
+    lines = ['Controls libraries: {}'.format(', '.join(report['controls_paths'])),
+             'Controls: {}, indexed: {}, groups of near duplicates: {} (distance <= {})'.format(
+                 report['controls'], report['indexed_controls'], len(report['duplicates']), report['max_distance'])]
+    for duplicate in report['duplicates']:
+        lines.append('    {} controls (max distance {:.3g}): {}'.format(
+            len(duplicate['controls']), duplicate['max_distance'], ', '.join(duplicate['controls'])))
+
+    return '\n'.join(lines)
+
+
+def main(args=None):
+    """
+    Prints the near duplicated controls of the libraries given in the command line arguments
+    :param args: list(str) or None, command line arguments. If not given, system arguments are used
+    :return: int, exit code
+    """
+
+    parser = argparse.ArgumentParser(description='Reports the near duplicated controls of controls libraries')
+    parser.add_argument('controls_paths', nargs='+', help='Paths of the controls libraries, from lowest priority')
+    parser.add_argument(
+        '-d', '--distance', type=float, default=DUPLICATE_DISTANCE, help='Maximum distance between near duplicates')
+    parsed_args = parser.parse_args(args)
+
+    print(format_duplicates_report(get_duplicates_report(parsed_args.controls_paths, parsed_args.distance)))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,279 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains control shapes simplification for tpRigToolkit.tools.controlrig. CVs that can be removed
+without moving the curve more than a given tolerance are removed (Ramer-Douglas-Peucker algorithm)
+Usage: python -m tpRigToolkit.tools.controlrig.core.simplify [-h] [-o OUTPUT] [-t TOLERANCE] [-q] controls_path
+"""
+
+from __future__ import print_function, division, absolute_import
+
+import sys
+import math
+import argparse
+from collections import OrderedDict
+
+from tpRigToolkit.tools.controlrig.core import controldata, library, spline
+
+TOLERANCE = 0.001
+
+# Number of times smooth curves are simplified again with half tolerance if their deviation is too big
+REFINEMENTS = 3
+
+# Number of polyline segments checked ahead of the last matched one when measuring deviations
+LOOKAHEAD = 16
+
+
+def is_periodic(shape_data):
+    """
+    Returns whether or not the given shape is periodic, following the same rules used to create control shapes
+    :param shape_data: dict
+    :return: bool
+    """
+
+    if 'periodic' in shape_data:
+        return bool(shape_data['periodic'])
+    if 'form' in shape_data:
+        return shape_data['form'] == 3
+
+    return True
+
+
+def get_segment_distance(point, start, end):
+    """
+    Returns the distance between the given point and the segment defined by the given points
+    :param point: tuple(float, float, float)
+    :param start: tuple(float, float, float)
+    :param end: tuple(float, float, float)
+    :return: float
+    """
+
+    sx, sy, sz = start
+    dx, dy, dz = end[0] - sx, end[1] - sy, end[2] - sz
+    px, py, pz = point[0] - sx, point[1] - sy, point[2] - sz
+    length = dx * dx + dy * dy + dz * dz
+    t = min(max((px * dx + py * dy + pz * dz) / length, 0.0), 1.0) if length else 0.0
+    x, y, z = px - t * dx, py - t * dy, pz - t * dz
+
+    return math.sqrt(x * x + y * y + z * z)
+
+
+def get_simplified_indices(points, tolerance, closed=False):
+    """
+    Returns the indices of the points of the given polyline that must be kept so no removed point is farther than the
+    given tolerance from the simplified polyline
+    :param points: list(tuple(float, float, float))
+    :param tolerance: float
+    :param closed: bool, whether or not the last point of the polyline is connected with the first one
+    :return: list(int)
+    """
+
+    points_count = len(points)
+    if points_count < 3 or tolerance <= 0:
+        return list(range(points_count))
+
+    keep = [False] * points_count
+    keep[0] = True
+    if closed:
+        # Closed polylines are split in two at the point farthest from the first one, which is always kept
+        first = points[0]
+        distances = [sum((a - b) ** 2 for a, b in zip(point, first)) for point in points]
+        farthest = distances.index(max(distances))
+        keep[farthest] = True
+        points = list(points) + [first]
+        ranges = [(0, farthest), (farthest, points_count)]
+    else:
+        keep[-1] = True
+        ranges = [(0, points_count - 1)]
+
+    while ranges:
+        start, end = ranges.pop()
+        if end - start < 2:
+            continue
+        distances = [get_segment_distance(point, points[start], points[end]) for point in points[start + 1:end]]
+        max_distance = max(distances)
+        if max_distance > tolerance:
+            index = start + 1 + distances.index(max_distance)
+            keep[index] = True
+            ranges.extend([(start, index), (index, end)])
+
+    return [i for i in range(points_count) if keep[i]]
+
+
+def get_polyline_deviation(points, polyline, closed=False):
+    """
+    Returns the maximum distance between the given points and the given polyline. Points are matched with the
+    segments of the polyline in order, so both must follow the same direction
+    :param points: list(tuple(float, float, float))
+    :param polyline: list(tuple(float, float, float))
+    :param closed: bool, whether or not polyline is closed, so points can be matched with its first segments once its
+        last segments are reached
+    :return: float
+    """
+
+    if len(polyline) < 2:
+        return max([get_segment_distance(point, polyline[0], polyline[0]) for point in points] or [0.0])
+
+    segments = list(zip(polyline[:-1], polyline[1:]))
+    if not points:
+        return 0.0
+
+    # First point is matched with all the segments, so polylines do not need to start at the same point
+    distances = [get_segment_distance(points[0], start, end) for start, end in segments]
+    deviation = min(distances)
+    segment_index = distances.index(deviation)
+    if closed:
+        segments = segments[segment_index:] + segments[:segment_index] + segments[segment_index:]
+        segment_index = 0
+
+    for point in points[1:]:
+        distances = [get_segment_distance(point, start, end) for start, end in segments[
+            segment_index:segment_index + LOOKAHEAD]]
+        distance = min(distances)
+        segment_index += distances.index(distance)
+        deviation = max(deviation, distance)
+
+    return deviation
+
+
+def simplify_shape(shape_data, tolerance=TOLERANCE):
+    """
+    Returns the simplified version of the given shape. Polylines are simplified directly. Smooth curves are
+    simplified through their CVs, and the simplified curve is only used if the distance between both evaluated
+    curves is not bigger than the tolerance
+    :param shape_data: dict, shape as stored in controls library files
+    :param tolerance: float, maximum distance the curve can be moved
+    :return: tuple(dict, float), simplified shape and maximum distance between the original and the simplified curve
+    """
+
+    points = controldata.get_points(controldata.get_buffer(shape_data['cvs']))
+    degree = shape_data.get('degree', 1)
+    periodic = is_periodic(shape_data)
+
+    simplified_shape = OrderedDict(shape_data)
+    if degree == 1:
+        # Closed polylines can store their first CV repeated at the end. The repeated CV is kept, so the stored format
+        # of the shape does not change
+        closing_cv = periodic and len(points) > 1 and points[0] == points[-1]
+        indices = get_simplified_indices(points[:-1] if closing_cv else points, tolerance, closed=periodic)
+        if closing_cv:
+            indices.append(len(points) - 1)
+        simplified_points = [points[i] for i in indices]
+        if periodic:
+            deviation = get_polyline_deviation(
+                points + points[:1], simplified_points + simplified_points[:1], closed=True)
+        else:
+            deviation = get_polyline_deviation(points, simplified_points)
+        simplified_shape['cvs'] = [list(shape_data['cvs'][i]) for i in indices]
+        return simplified_shape, deviation
+
+    curve_points = controldata.get_points(spline.evaluate(controldata.get_buffer(points), degree, periodic))
+    for refinement in range(REFINEMENTS):
+        indices = get_simplified_indices(points, tolerance / 2 ** refinement, closed=periodic)
+        if len(indices) == len(points) or len(indices) <= degree:
+            break
+        simplified_cvs = [points[i] for i in indices]
+        simplified_curve_points = controldata.get_points(
+            spline.evaluate(controldata.get_buffer(simplified_cvs), degree, periodic))
+        deviation = get_polyline_deviation(curve_points, simplified_curve_points, closed=periodic)
+        if deviation <= tolerance:
+            simplified_shape['cvs'] = [list(shape_data['cvs'][i]) for i in indices]
+            return simplified_shape, deviation
+
+    return simplified_shape, 0.0
+
+
+def simplify_shapes(shapes, tolerance=TOLERANCE):
+    """
+    Returns the simplified version of the given control shapes
+    :param shapes: list(dict) or dict, shapes of a control as stored in controls library files
+    :param tolerance: float, maximum distance the curves can be moved
+    :return: tuple(list(dict) or dict, OrderedDict), simplified shapes and changes applied to the control
+    """
+
+    if isinstance(shapes, dict):
+        simplified_items = [(shape_name, simplify_shape(shape_data, tolerance=tolerance)) for
+                            shape_name, shape_data in shapes.items()]
+        simplified_shapes = OrderedDict((shape_name, result[0]) for shape_name, result in simplified_items)
+        results = [result for _, result in simplified_items]
+        original_shapes = list(shapes.values())
+    else:
+        results = [simplify_shape(shape_data, tolerance=tolerance) for shape_data in shapes]
+        simplified_shapes = [result[0] for result in results]
+        original_shapes = shapes
+
+    changes = OrderedDict([
+        ('cvs', sum(len(shape_data['cvs']) for shape_data in original_shapes)),
+        ('simplified_cvs', sum(len(result[0]['cvs']) for result in results)),
+        ('max_deviation', max([result[1] for result in results] or [0.0]))
+    ])
+
+    return simplified_shapes, changes
+
+
+def simplify_library(controls_path, output_path=None, tolerance=TOLERANCE):
+    """
+    Simplifies all the controls of the given library and writes them to the given path
+    :param controls_path: str, path of the library to simplify
+    :param output_path: str or None, path where simplified library is written. If not given, library is overwritten
+    :param tolerance: float, maximum distance the curves can be moved
+    :return: OrderedDict or None, report with the changes applied to each control
+    """
+
+    return library.rewrite_library(
+        controls_path, lambda control_name, shapes: simplify_shapes(shapes, tolerance=tolerance),
+        output_path=output_path)
+
+
+def format_simplify_report(report):
+    """
+    Returns a human readable version of the given simplification report
+    :param report: dict, report returned by simplify_library function
+    :return: str
+    """
+
+    lines = list()
+    for control_name, changes in report['controls'].items():
+        lines.append('{}: cvs: {} -> {}, max deviation: {:.3g}'.format(
+            control_name, changes['cvs'], changes['simplified_cvs'], changes['max_deviation']))
+
+    cvs_count = sum(changes['cvs'] for changes in report['controls'].values())
+    simplified_count = sum(changes['simplified_cvs'] for changes in report['controls'].values())
+    max_deviation = max([changes['max_deviation'] for changes in report['controls'].values()] or [0.0])
+    lines.append('Controls library: {} -> {}'.format(report['controls_path'], report['output_path']))
+    lines.append('Controls: {}, cvs: {} -> {} ({:.1%} removed), max deviation: {:.3g}, bytes: {} -> {}'.format(
+        len(report['controls']), cvs_count, simplified_count,
+        (cvs_count - simplified_count) / cvs_count if cvs_count else 0.0, max_deviation,
+        report['source_bytes'], report['output_bytes']))
+
+    return '\n'.join(lines)
+
+
+def main(args=None):
+    """
+    Simplifies the controls library given in the command line arguments
+    :param args: list(str) or None, command line arguments. If not given, system arguments are used
+    :return: int, exit code
+    """
+
+    parser = argparse.ArgumentParser(description='Removes the CVs that are not needed by the controls of a library')
+    parser.add_argument('controls_path', help='Path of the controls library file')
+    parser.add_argument('-o', '--output', help='Path where simplified library is written (overwrites by default)')
+    parser.add_argument('-t', '--tolerance', type=float, default=TOLERANCE, help='Maximum curves deviation')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Does not print the changes of each control')
+    parsed_args = parser.parse_args(args)
+
+    report = simplify_library(
+        parsed_args.controls_path, output_path=parsed_args.output, tolerance=parsed_args.tolerance)
+    if not report:
+        return 1
+
+    report_lines = format_simplify_report(report).split('\n')
+    print('\n'.join(report_lines[-2:] if parsed_args.quiet else report_lines))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
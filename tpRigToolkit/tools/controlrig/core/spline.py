@@ -0,0 +1,294 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains B-spline evaluation functions for control shapes. Curves are evaluated as Maya does: open
+curves use uniform knots clamped at both ends (so they start and end at their first and last CVs) and periodic curves
+use uniform knots wrapping around their CVs
+"""
+
+from __future__ import print_function, division, absolute_import
+
+import math
+import threading
+from array import array
+from operator import mul, itemgetter
+from collections import OrderedDict
+
+SUBDIVISIONS = 8
+MAX_SUBDIVISIONS = 64
+TOLERANCE = 0.25
+TESSELLATIONS_CACHE_SIZE = 512
+MATRICES_CACHE_SIZE = 64
+
+_matrices_cache = OrderedDict()
+_matrices_lock = threading.Lock()
+
+
+class TessellationCache(object):
+    """
+    Process-wide LRU cache of evaluated shapes. Entries are identified by the content of the shapes, so identical
+    shapes share their tessellation and shapes are never modified. Returned buffers must not be modified
+    """
+
+    def __init__(self, max_size=TESSELLATIONS_CACHE_SIZE):
+        super(TessellationCache, self).__init__()
+
+        self._max_size = max(1, int(max_size))
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    @max_size.setter
+    def max_size(self, value):
+        with self._lock:
+            self._max_size = max(1, int(value))
+            self._evict()
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    def get(self, shape, subdivisions=SUBDIVISIONS):
+        """
+        Returns the evaluated points of the given shape, evaluating it if it is not cached
+        :param shape: ControlShape
+        :param subdivisions: int, number of points each span is evaluated at
+        :return: array, flat buffer with the coordinates of the evaluated points
+        """
+
+        key = (shape.content_hash, shape.degree, bool(shape.periodic), subdivisions)
+        with self._lock:
+            buffer = self._entries.pop(key, None)
+            if buffer is not None:
+                self._entries[key] = buffer
+                self._hits += 1
+                return buffer
+
+        buffer = evaluate(shape.buffer, shape.degree, shape.periodic, subdivisions=subdivisions)
+        with self._lock:
+            self._misses += 1
+            self._entries.pop(key, None)
+            self._entries[key] = buffer
+            self._evict()
+
+        return buffer
+
+    def clear(self):
+        """
+        Removes all the cached tessellations
+        """
+
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def _evict(self):
+        """
+        Internal function that removes least recently used tessellations until the cache fits its maximum size
+        """
+
+        while len(self._entries) > self._max_size:
+            self._entries.pop(next(iter(self._entries)))
+
+
+_TESSELLATION_CACHE = TessellationCache()
+
+
+def get_tessellation_cache():
+    """
+    Returns the process-wide tessellations cache
+    :return: TessellationCache
+    """
+
+    return _TESSELLATION_CACHE
+
+
+def get_basis_functions(knots, span, u, degree):
+    """
+    Returns the value of the non zero B-spline basis functions at the given parameter
+    :param knots: list(float), full knot vector
+    :param span: int, index of the knot span the parameter is in
+    :param u: float, curve parameter
+    :param degree: int
+    :return: list(float), values of the basis functions of the CVs span - degree to span
+    """
+
+    weights = [1.0] + [0.0] * degree
+    left = [0.0] * (degree + 1)
+    right = [0.0] * (degree + 1)
+    for j in range(1, degree + 1):
+        left[j] = u - knots[span + 1 - j]
+        right[j] = knots[span + j] - u
+        saved = 0.0
+        for r in range(j):
+            temp = weights[r] / (right[r + 1] + left[j - r])
+            weights[r] = saved + right[r + 1] * temp
+            saved = left[j - r] * temp
+        weights[j] = saved
+
+    return weights
+
+
+def get_basis_matrix(degree, subdivisions=SUBDIVISIONS):
+    """
+    Returns the basis matrix of a uniform B-spline segment: the weights of the degree + 1 CVs of the segment for
+    each one of its subdivisions
+    :param degree: int
+    :param subdivisions: int, number of points each segment is evaluated at
+    :return: tuple(tuple(float))
+    """
+
+    knots = list(range(2 * degree + 2))
+    return tuple(
+        tuple(get_basis_functions(knots, degree, degree + j / subdivisions, degree)) for j in range(subdivisions))
+
+
+def get_evaluation_matrix(degree, subdivisions, periodic, cvs_count):
+    """
+    Returns the sparse matrix that evaluates a curve with the given number of CVs. Each row of the matrix contains
+    a getter returning the CVs involved in an evaluated point and the weights of those CVs.
+    Last used matrices are kept in a LRU cache, so they are not computed again while their curves are drawn
+    :param degree: int
+    :param subdivisions: int, number of points each span is evaluated at
+    :param periodic: bool
+    :param cvs_count: int, number of unique CVs of the curve
+    :return: tuple(tuple(itemgetter, tuple(float)))
+    """
+
+    key = (degree, subdivisions, bool(periodic), cvs_count)
+    with _matrices_lock:
+        matrix = _matrices_cache.pop(key, None)
+        if matrix is not None:
+            _matrices_cache[key] = matrix
+            return matrix
+
+    rows = list()
+    if periodic:
+        basis_matrix = get_basis_matrix(degree, subdivisions)
+        for span in range(cvs_count):
+            indices = [(span + i) % cvs_count for i in range(degree + 1)]
+            rows.extend((indices, weights) for weights in basis_matrix)
+        rows.append(([i % cvs_count for i in range(degree + 1)], basis_matrix[0]))
+    else:
+        spans = cvs_count - degree
+        knots = [0.0] * degree + [float(i) for i in range(spans + 1)] + [float(spans)] * degree
+        for span in range(spans):
+            indices = list(range(span, span + degree + 1))
+            for j in range(subdivisions):
+                rows.append((indices, get_basis_functions(knots, span + degree, span + j / subdivisions, degree)))
+        rows.append((list(range(cvs_count - degree - 1, cvs_count)), [0.0] * degree + [1.0]))
+
+    matrix = tuple((itemgetter(*indices), tuple(weights)) for indices, weights in rows)
+    with _matrices_lock:
+        _matrices_cache.pop(key, None)
+        _matrices_cache[key] = matrix
+        while len(_matrices_cache) > MATRICES_CACHE_SIZE:
+            _matrices_cache.pop(next(iter(_matrices_cache)))
+
+    return matrix
+
+
+def evaluate(buffer, degree, periodic, subdivisions=SUBDIVISIONS):
+    """
+    Evaluates the curve defined by the given CVs
+    :param buffer: array, flat buffer with the coordinates of the CVs
+    :param degree: int
+    :param periodic: bool
+    :param subdivisions: int, number of points each span is evaluated at
+    :return: array, flat buffer with the coordinates of the evaluated points. Periodic curves end with their first
+        point, so they are closed
+    """
+
+    cvs_count = len(buffer) // 3
+
+    # Periodic curves can store the CVs that overlap at the end of the curve
+    if periodic and cvs_count > 2 * degree and buffer[:3 * degree] == buffer[-3 * degree:]:
+        buffer = buffer[:-3 * degree]
+        cvs_count -= degree
+
+    if degree < 1 or cvs_count <= degree:
+        return array('d', buffer)
+
+    matrix = get_evaluation_matrix(degree, subdivisions, periodic, cvs_count)
+    evaluated_buffer = array('d', [0.0]) * (3 * len(matrix))
+    for axis in range(3):
+        values = buffer[axis::3]
+        evaluated_buffer[axis::3] = array(
+            'd', [sum(map(mul, weights, getter(values))) for getter, weights in matrix])
+
+    return evaluated_buffer
+
+
+def get_curvature_bound(buffer, degree, periodic):
+    """
+    Returns an estimation of the maximum length of the second derivative of the curve defined by the given CVs,
+    taking each span as a parameter unit. It is computed from the second differences of the CVs. Knots of open
+    curves are clamped, so the differences of their end spans are divided by the length of their knot intervals,
+    which are shorter than the ones of the inner spans
+    :param buffer: array, flat buffer with the coordinates of the CVs
+    :param degree: int
+    :param periodic: bool
+    :return: float
+    """
+
+    cvs_count = len(buffer) // 3
+    if degree < 2 or cvs_count < 3 or (not periodic and cvs_count <= degree):
+        return 0.0
+
+    if not periodic:
+        spans = cvs_count - degree
+        knots = [0.0] * degree + [float(i) for i in range(spans + 1)] + [float(spans)] * degree
+        first_intervals = [(knots[i + degree + 1] - knots[i + 1]) / degree for i in range(cvs_count - 1)]
+        second_intervals = [(knots[i + degree + 1] - knots[i + 2]) / (degree - 1) for i in range(cvs_count - 2)]
+
+    squared_lengths = [0.0] * cvs_count
+    for axis in range(3):
+        values = buffer[axis::3]
+        if periodic:
+            differences = [values[i - 1] - 2 * values[i] + values[(i + 1) % cvs_count] for i in range(cvs_count)]
+        else:
+            first_differences = [
+                (values[i + 1] - values[i]) / interval for i, interval in enumerate(first_intervals)]
+            differences = [
+                (first_differences[i + 1] - first_differences[i]) / interval
+                for i, interval in enumerate(second_intervals)]
+        squared_lengths = [length + difference * difference for length, difference in zip(
+            squared_lengths, differences)]
+
+    return degree * (degree - 1) * math.sqrt(max(squared_lengths))
+
+
+def get_adaptive_subdivisions(curvature_bound, scale, tolerance=TOLERANCE, max_subdivisions=MAX_SUBDIVISIONS):
+    """
+    Returns the number of subdivisions each span of a curve needs so the distance between the curve and its
+    tessellation is not bigger than the given tolerance once drawn on screen. The chord error of a span divided in n
+    segments is bounded by curvature_bound / (8 * n * n). Subdivisions are rounded up to a power of two, so
+    tessellations are reused while zooming
+    :param curvature_bound: float, value returned by get_curvature_bound
+    :param scale: float, number of pixels of each scene unit
+    :param tolerance: float, maximum error in pixels
+    :param max_subdivisions: int
+    :return: int
+    """
+
+    error = abs(curvature_bound * scale) / (8.0 * max(tolerance, 1e-6))
+    if error <= 1.0:
+        return 1
+
+    subdivisions = 2 ** int(math.ceil(math.log(math.sqrt(error), 2)))
+
+    return int(min(subdivisions, max_subdivisions))
@@ -0,0 +1,206 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains a streaming reader for controls library files. Controls are decoded one at a time, so memory
+usage does not depend on the size of the library file but on the size of its biggest control
+"""
+
+from __future__ import print_function, division, absolute_import
+
+import json
+import codecs
+import hashlib
+from collections import OrderedDict
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\n\r'
+
+
+class LibraryStreamReader(object):
+    """
+    Class that walks the controls mapping of a controls library file yielding (name, shapes) pairs. Both the
+    standard format, where controls are stored in the "controls" key of the document, and the flat format, where
+    the document is the controls mapping itself, are supported
+    """
+
+    def __init__(self, file_object, chunk_size=CHUNK_SIZE):
+        super(LibraryStreamReader, self).__init__()
+
+        self._file = file_object
+        self._chunk_size = max(1, int(chunk_size))
+        self._decoder = json.JSONDecoder(object_pairs_hook=OrderedDict)
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._hash = hashlib.sha1()
+        self._metadata = OrderedDict()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def __iter__(self):
+        return self.iter_controls()
+
+    @property
+    def content_hash(self):
+        """
+        Returns the SHA1 hash of the contents read so far. Once all the controls are read, it is the hash of the
+        whole file
+        :return: str
+        """
+
+        return self._hash.hexdigest()
+
+    @property
+    def metadata(self):
+        """
+        Returns the top level values of the library that are not controls (such as categories) read so far
+        :return: OrderedDict
+        """
+
+        return self._metadata
+
+    def iter_controls(self):
+        """
+        Generator that yields the name and the shapes of each control of the library
+        :return: generator(tuple(str, list(dict)))
+        """
+
+        self._expect('{')
+        for key in self._iter_keys():
+            if key == 'controls' and self._peek() == '{':
+                self._expect('{')
+                for control_name in self._iter_keys():
+                    yield control_name, self._read_value()
+            else:
+                value = self._read_value()
+                if is_shapes_data(value):
+                    yield key, value
+                else:
+                    self._metadata[key] = value
+
+        # We consume remaining contents, so content hash is computed from the whole file
+        while self._read_chunk():
+            pass
+
+    def _iter_keys(self):
+        """
+        Internal generator that yields the keys of the object the reader is positioned in. Values must be consumed
+        by the caller before requesting next key
+        :return: generator(str)
+        """
+
+        if self._peek() == '}':
+            self._pos += 1
+            return
+
+        while True:
+            key = self._read_value()
+            if not isinstance(key, type(u'')):
+                raise ValueError('Expected object key at position {}'.format(self._pos))
+            self._expect(':')
+            yield key
+            separator = self._peek()
+            self._pos += 1
+            if separator == '}':
+                return
+            if separator != ',':
+                raise ValueError('Expected "," or "}}" but found "{}"'.format(separator))
+
+    def _read_value(self):
+        """
+        Internal function that decodes the JSON value the reader is positioned in, reading more contents from the
+        file until the value is complete
+        :return: object
+        """
+
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                if not self._read_chunk():
+                    raise
+                continue
+            # Numbers are the only values whose end can not be detected, so we make sure they are not truncated
+            if end == len(self._buffer) and not self._eof and isinstance(value, (int, float)):
+                self._read_chunk()
+                continue
+            self._pos = end
+            return value
+
+    def _peek(self):
+        """
+        Internal function that skips whitespaces and returns the next character without consuming it
+        :return: str
+        """
+
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read_chunk():
+                raise ValueError('Unexpected end of controls library file')
+
+    def _expect(self, character):
+        """
+        Internal function that consumes the given character raising an error if it is not the next one
+        :param character: str
+        """
+
+        next_character = self._peek()
+        if next_character != character:
+            raise ValueError('Expected "{}" but found "{}" at position {}'.format(character, next_character, self._pos))
+        self._pos += 1
+
+    def _read_chunk(self):
+        """
+        Internal function that reads a new chunk of the file, discarding already consumed contents
+        :return: bool, False if the end of the file has been reached
+        """
+
+        if self._eof:
+            return False
+
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            self._buffer = self._buffer[self._pos:] + self._text_decoder.decode(b'', final=True)
+            self._pos = 0
+            return False
+
+        self._hash.update(chunk)
+        if not self._buffer and chunk.startswith(codecs.BOM_UTF8):
+            chunk = chunk[len(codecs.BOM_UTF8):]
+        self._buffer = self._buffer[self._pos:] + self._text_decoder.decode(chunk)
+        self._pos = 0
+
+        return True
+
+
+def is_shapes_data(value):
+    """
+    Returns whether or not the given value contains the shapes of a control
+    :param value: object
+    :return: bool
+    """
+
+    if isinstance(value, dict):
+        value = list(value.values())
+    if not value or not isinstance(value, list):
+        return False
+
+    return all(isinstance(shape_data, dict) and 'cvs' in shape_data for shape_data in value)
+
+
+def iter_library_file(controls_path, chunk_size=CHUNK_SIZE):
+    """
+    Generator that yields the name and the shapes of each control stored in the given controls library file
+    :param controls_path: str
+    :param chunk_size: int, size in bytes of the chunks the file is read with
+    :return: generator(tuple(str, list(dict)))
+    """
+
+    with open(controls_path, 'rb') as fh:
+        for control_name, shapes in LibraryStreamReader(fh, chunk_size=chunk_size):
+            yield control_name, shapes
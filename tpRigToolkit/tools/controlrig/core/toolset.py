@@ -41,7 +41,10 @@ class ControlRigToolset(toolset.ToolsetWidget, object):
                 model=control_rig_model, controller=control_rig_controller, parent=self)
 
         if self._controls_path:
-            control_rig_controller.set_controls_path(self._controls_path)
+            if isinstance(self._controls_path, (list, tuple)):
+                control_rig_controller.set_controls_paths(self._controls_path)
+            else:
+                control_rig_controller.set_controls_path(self._controls_path)
         if self._control_data:
             control_rig_controller.set_control_data(self._control_data)
 
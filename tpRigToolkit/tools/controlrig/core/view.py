@@ -12,7 +12,8 @@ from copy import copy
 from functools import partial
 
 from Qt.QtCore import Qt
-from Qt.QtWidgets import QSizePolicy, QWidget, QSplitter, QButtonGroup, QPushButton, QTreeWidgetItem
+from Qt.QtWidgets import QSizePolicy, QWidget, QSplitter, QButtonGroup, QPushButton, QTreeWidgetItem, QMenu
+from Qt.QtGui import QCursor
 
 from tpDcc import dcc
 from tpDcc.dcc import dialog
@@ -35,6 +36,7 @@ class ControlRigView(base.BaseWidget, object):
         self._model = model
         self._controller = controller
         self._show_utils = show_utils
+        self._pending_control = None
 
         super(ControlRigView, self).__init__(parent=parent)
 
@@ -109,6 +111,7 @@ class ControlRigView(base.BaseWidget, object):
 
         self._size_spn = spinbox.DragDoubleSpinBoxLine(max=100, positive=True, parent=self)
         self._size_reset_btn = buttons.BaseToolButton(parent=self).image('reset').icon_only()
+        self._size_fit_btn = buttons.BaseButton('Fit', parent=self)
         self._offset_x_spn = spinbox.DragDoubleSpinBoxLineAxis(axis='x', min=-25, max=25, parent=self)
         self._offset_y_spn = spinbox.DragDoubleSpinBoxLineAxis(axis='y', min=-25, max=25, parent=self)
         self._offset_z_spn = spinbox.DragDoubleSpinBoxLineAxis(axis='z', min=-25, max=25, parent=self)
@@ -127,7 +130,7 @@ class ControlRigView(base.BaseWidget, object):
 
         col_layout = qtutils.get_column_layout(
             self._name_widget,
-            qtutils.get_line_layout('Radius : ', self, self._size_spn, self._size_reset_btn),
+            qtutils.get_line_layout('Radius : ', self, self._size_spn, self._size_reset_btn, self._size_fit_btn),
             qtutils.get_line_layout('Offset : ', self, self._offset_x_spn, self._offset_y_spn, self._offset_z_spn),
             qtutils.get_line_layout('Factor : ', self, self._factor_x_spn, self._factor_y_spn, self._factor_z_spn),
             qtutils.get_line_layout('Axis : ', self, self._axis_combo),
@@ -242,9 +245,11 @@ class ControlRigView(base.BaseWidget, object):
         self._controls_filter.textChanged.connect(self._on_filter_controls_list)
         self._controls_list.currentItemChanged.connect(self._on_control_selected)
         self._controls_list.itemUpdated.connect(self._on_rename_control)
+        self._controls_list.findSimilarRequested.connect(self._on_find_similar_controls)
         self._name_line.textChanged.connect(self._controller.set_control_name)
         self._size_spn.valueChanged.connect(self._on_control_size_changed)
         self._size_reset_btn.clicked.connect(self._controller.reset_to_default_control_size)
+        self._size_fit_btn.clicked.connect(self._on_fit_control_size)
         self._offset_x_spn.valueChanged.connect(self._on_offset_x_changed)
         self._offset_y_spn.valueChanged.connect(self._on_offset_y_changed)
         self._offset_z_spn.valueChanged.connect(self._on_offset_z_changed)
@@ -269,6 +274,7 @@ class ControlRigView(base.BaseWidget, object):
 
         self._model.controlsPathChanged.connect(self._on_controls_path_changed)
         self._model.controlsChanged.connect(self._update_controls_list)
+        self._model.controlsUpdated.connect(self._on_controls_updated)
         self._model.currentControlChanged.connect(self._update_controls_viewer)
         self._model.controlNameChanged.connect(self._name_line.setText)
         self._model.controlSizeChanged.connect(self._on_set_control_size)
@@ -293,30 +299,20 @@ class ControlRigView(base.BaseWidget, object):
         self._model.keepAssignColorChanged.connect(self._keep_assign_color_btn.setChecked)
 
     def showEvent(self, event):
-        if not self._model.current_control:
-            self._controls_list.setCurrentItem(self._controls_list.topLevelItem(0))
-        else:
-            control_item = self._controls_list.findItems(
-                self._model.current_control, Qt.MatchExactly | Qt.MatchRecursive, 0)
-            if control_item:
-                self._controls_list.setCurrentItem(control_item[0])
-            else:
-                self._controls_list.setCurrentItem(self._controls_list.topLevelItem(0))
+        self._select_current_control()
 
         super(ControlRigView, self).showEvent(event)
 
     def resizeEvent(self, event):
         super(ControlRigView, self).resizeEvent(event)
-        self._controls_viewer.update_coords()
+        self._controls_viewer.request_update()
 
     # =================================================================================================================
     # BASE
     # =================================================================================================================
 
     def refresh(self):
-        controls = self._controller.update_controls()
-        if controls:
-            self._controller.set_current_control(controls[0].name)
+        self._controller.load_controls()
 
         self._update_rotate_orders()
 
@@ -350,6 +346,7 @@ class ControlRigView(base.BaseWidget, object):
         :return:
         """
 
+        self._size_fit_btn.setToolTip('Set the radius so the control fits the radius of the selected joint')
         for offset in (self._offset_x_spn, self._offset_y_spn, self._offset_z_spn):
             offset.setToolTip('Set the position offset of the shape(s)')
         for factor in (self._factor_x_spn, self._factor_y_spn, self._factor_z_spn):
@@ -361,16 +358,68 @@ class ControlRigView(base.BaseWidget, object):
         """
 
         self._controls_list.clear()
-
-        for control in controls:
-            item = QTreeWidgetItem(self._controls_list, [control.name])
-            item.control = control
-            item.shapes = control.shapes
-            self._controls_list.addTopLevelItem(item)
+        self._controls_list.add_items([self._create_control_item(control) for control in controls or list()])
 
         self._controls_list.controls_path = self._model.controls_path
         self._controls_list.setFocus(Qt.TabFocusReason)
 
+    def _create_control_item(self, control):
+        """
+        Internal function that creates a new item for the given control. Item is not added to the controls list
+        :param control: ControlData
+        :return: QTreeWidgetItem
+        """
+
+        control_item = QTreeWidgetItem([control.name])
+        control_item.control = control
+        control_item.controls_path = self._get_control_path(control.name)
+
+        return control_item
+
+    def _select_current_control(self):
+        """
+        Internal function that selects the item of the current control in the controls list. If current control is
+        not available, first item of the list is selected
+        """
+
+        control_item = None
+        if self._model.current_control:
+            control_item = self._controls_list.findItems(
+                self._model.current_control, Qt.MatchExactly | Qt.MatchRecursive, 0)
+        if control_item:
+            self._controls_list.setCurrentItem(control_item[0])
+        else:
+            self._controls_list.setCurrentItem(self._controls_list.topLevelItem(0))
+
+    def _select_loaded_control(self, controls):
+        """
+        Internal function that updates the selected item of the controls list when a new batch of controls is
+        loaded. First loaded control is selected right away, but if the control set as current while loading is
+        loaded later, it is selected instead
+        :param controls: list(ControlData)
+        """
+
+        pending_control = self._pending_control
+        if pending_control and any(control.name == pending_control for control in controls):
+            control_item = self._controls_list.findItems(pending_control, Qt.MatchExactly | Qt.MatchRecursive, 0)
+            self._pending_control = None
+            self._controls_list.setCurrentItem(control_item[0])
+        elif not self._controls_list.currentItem():
+            self._controls_list.setCurrentItem(self._controls_list.topLevelItem(0))
+            self._pending_control = pending_control
+
+    def _get_control_path(self, control_name):
+        """
+        Internal function that returns the path of the library the given control is loaded from
+        :param control_name: str
+        :return: str
+        """
+
+        controls_library = self._controller.library
+        control_path = controls_library.get_control_path(control_name) if controls_library else None
+
+        return control_path or self._model.controls_path
+
     def _update_rotate_orders(self):
         """
         Internal callback function that updates available rotate orders
@@ -395,8 +444,10 @@ class ControlRigView(base.BaseWidget, object):
         control_item = self._controls_list.findItems(control_name, Qt.MatchExactly | Qt.MatchRecursive, 0)
         control_item = control_item[0] if control_item else None
         if not control_item:
+            if self._controller.is_loading_controls():
+                self._pending_control = control_name
             self._controls_viewer.control = None
-            self._controls_viewer.update_coords()
+            self._controls_viewer.request_update()
             return
 
         offset = self._model.offset
@@ -406,7 +457,7 @@ class ControlRigView(base.BaseWidget, object):
 
         if self._controls_viewer.control != control_name:
             self._controls_viewer.control = control_name
-            self._controls_viewer.load(copy(control_item.shapes))
+            self._controls_viewer.load(copy(control_item.control.shapes), bounds=control_item.control.bounds)
             joint_radius = None
             try:
                 joint_radius = self._controller.get_joint_radius()
@@ -416,10 +467,7 @@ class ControlRigView(base.BaseWidget, object):
                 if joint_radius:
                     self._controls_viewer.ref = joint_radius
 
-        for i, shape in enumerate(self._controls_viewer.shapes):
-            shape.transform(offset=offset, scale=factor, axis=axis, mirror=mirror_plane)
-
-        self._controls_viewer.update_coords()
+        self._controls_viewer.set_transform(offset=offset, scale=factor, axis=axis, mirror=mirror_plane)
 
     def _rescale_viewer(self):
         """
@@ -438,7 +486,7 @@ class ControlRigView(base.BaseWidget, object):
             finally:
                 self._controls_viewer.ref = joint_radius / v
 
-        self._controls_viewer.update_coords()
+        self._controls_viewer.request_update()
 
     # =================================================================================================================
     # CALLBACKS
@@ -450,7 +498,7 @@ class ControlRigView(base.BaseWidget, object):
         Updates the ControlViewer widget
         """
 
-        self._controls_viewer.update_coords()
+        self._controls_viewer.request_update()
 
     def _on_filter_controls_list(self, filter_text):
         """
@@ -472,6 +520,7 @@ class ControlRigView(base.BaseWidget, object):
         if not control_item:
             return
 
+        self._pending_control = None
         control_name = control_item.text(0)
         self._controller.set_current_control(control_name)
 
@@ -482,14 +531,82 @@ class ControlRigView(base.BaseWidget, object):
         :param new_name: str
         """
 
-        # TODO: Check if we should emit some king of signal so other apps using ControlRig functionality
-        # TODO: can update properly its contents
-
         valid_rename = self._controller.rename_control(original_name, new_name)
         if not valid_rename:
             selected_item = self._controls_list.currentItem()
             selected_item.setText(0, original_name)
 
+    def _on_find_similar_controls(self, control_name):
+        """
+        Internal callback function that is called when the user requests the controls similar to the given one
+        Similar controls are listed in a menu, once found, and the chosen one is selected
+        :param control_name: str
+        """
+
+        self._controller.find_similar_controls(
+            control_name, callback=partial(self._show_similar_controls, control_name))
+
+    def _show_similar_controls(self, control_name, similar_controls):
+        """
+        Internal function that lists the given similar controls of the given control in a menu
+        :param control_name: str
+        :param similar_controls: list(tuple(str, float))
+        """
+
+        if not similar_controls:
+            logger.info('No controls similar to "{}" found'.format(control_name))
+            return
+
+        menu = QMenu(self)
+        title_action = menu.addAction('Controls similar to "{}"'.format(control_name))
+        title_action.setEnabled(False)
+        menu.addSeparator()
+        for similar_control_name, distance in similar_controls:
+            action = menu.addAction('{} ({:.3f})'.format(similar_control_name, distance))
+            action.triggered.connect(partial(self._select_control, similar_control_name))
+        menu.exec_(QCursor.pos())
+
+    def _select_control(self, control_name):
+        """
+        Internal function that selects the given control in the controls list
+        :param control_name: str
+        """
+
+        control_item = self._controls_list.findItems(control_name, Qt.MatchExactly | Qt.MatchRecursive, 0)
+        if control_item:
+            self._controls_list.setCurrentItem(control_item[0])
+            self._controls_list.scrollToItem(control_item[0])
+
+    def _on_controls_updated(self, changes):
+        """
+        Internal callback function that is called when controls of the library are patched (added, removed,
+        modified or renamed) without a full library reload
+        :param changes: dict
+        """
+
+        for control_name in changes.get('removed', list()):
+            for control_item in self._controls_list.findItems(control_name, Qt.MatchExactly | Qt.MatchRecursive, 0):
+                self._controls_list.takeTopLevelItem(self._controls_list.indexOfTopLevelItem(control_item))
+
+        for original_name, new_name in changes.get('renamed', list()):
+            for control_item in self._controls_list.findItems(original_name, Qt.MatchExactly | Qt.MatchRecursive, 0):
+                control_item.setText(0, new_name)
+            if self._controls_viewer.control == original_name:
+                self._controls_viewer.control = new_name
+
+        for control in changes.get('modified', list()):
+            for control_item in self._controls_list.findItems(control.name, Qt.MatchExactly | Qt.MatchRecursive, 0):
+                control_item.control = control
+                control_item.controls_path = self._get_control_path(control.name)
+            if self._controls_viewer.control == control.name:
+                self._controls_viewer.control = None
+                self._update_controls_viewer(control.name)
+
+        added_controls = changes.get('added', list())
+        if added_controls:
+            self._controls_list.add_items([self._create_control_item(control) for control in added_controls])
+            self._select_loaded_control(added_controls)
+
     def _on_control_size_changed(self, control_size):
         """
         Internal callback function that is called each time the user updates the control size
@@ -500,6 +617,13 @@ class ControlRigView(base.BaseWidget, object):
         self._rescale_viewer()
         self._update_controls_viewer()
 
+    def _on_fit_control_size(self):
+        """
+        Internal callback function that is called when the user clicks the fit control size button
+        """
+
+        self._controller.fit_control_size_to_joint()
+
     def _on_offset_x_changed(self, offset_x):
         """
         Internal callback function that is called when offset X values is changed by the user
@@ -571,7 +695,7 @@ class ControlRigView(base.BaseWidget, object):
         """
 
         self._controls_viewer.control_color = color
-        self._controls_viewer.update_coords()
+        self._controls_viewer.request_update()
 
     def _on_controls_path_changed(self, controls_path):
         """
@@ -579,9 +703,7 @@ class ControlRigView(base.BaseWidget, object):
         :param controls_path: str
         """
 
-        with qt_contexts.block_signals(self._model):
-            self._controller.update_controls()
-            self.refresh()
+        self.refresh()
 
     def _on_set_control_size(self, control_size):
         """
@@ -737,16 +859,11 @@ class ControlRigView(base.BaseWidget, object):
             return False
 
         control_name = new_control_data.get('name', None)
-        control = new_control_data.get('control', None)
-        if not control_name or not control:
+        control_item = self._controls_list.findItems(control_name, Qt.MatchExactly | Qt.MatchRecursive, 0)
+        if not control_item:
             return False
 
-        control_item = QTreeWidgetItem(self._controls_list, [control_name])
-        control_item.control = control
-        control_item.shapes = control.shapes
-
-        self._controls_list.addTopLevelItem(control_item)
-        self._controls_list.setCurrentItem(control_item)
+        self._controls_list.setCurrentItem(control_item[0])
 
         return True
 
@@ -771,11 +888,7 @@ class ControlRigView(base.BaseWidget, object):
         if not control_item:
             return False
 
-        self._controls_list.takeTopLevelItem(self._controls_list.indexOfTopLevelItem(control_item))
-
-        self._controller.remove_control(control_item.text(0))
-
-        return True
+        return self._controller.remove_control(control_item.text(0))
 
     def _on_assign_control(self, control_name=None):
         """
@@ -0,0 +1,146 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module that contains controls libraries files watcher implementation for tpRigToolkit.tools.controlrig
+"""
+
+from __future__ import print_function, division, absolute_import
+
+import os
+import logging
+
+from Qt.QtCore import Signal, QObject, QTimer, QFileSystemWatcher
+
+from tpRigToolkit.tools.controlrig.core import consts
+
+logger = logging.getLogger(consts.TOOL_ID)
+
+
+class LibraryWatcher(QObject, object):
+    """
+    Class that watches controls libraries files and notifies when their contents change. By default file system
+    notifications are used, but files can also be polled (useful for libraries stored in network shares, where file
+    system notifications are not reliable)
+    """
+
+    libraryChanged = Signal(str)
+
+    def __init__(self, poll_interval=0, debounce_interval=500, parent=None):
+        super(LibraryWatcher, self).__init__(parent)
+
+        self._signatures = dict()
+        self._pending_paths = set()
+
+        self._file_watcher = QFileSystemWatcher(self)
+        self._debounce_timer = QTimer(self)
+        self._debounce_timer.setSingleShot(True)
+        self._debounce_timer.setInterval(debounce_interval)
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(poll_interval)
+
+        self._file_watcher.fileChanged.connect(self._on_file_changed)
+        self._debounce_timer.timeout.connect(self._on_debounce_timeout)
+        self._poll_timer.timeout.connect(self._on_poll)
+
+    @property
+    def paths(self):
+        return list(self._signatures.keys())
+
+    @property
+    def poll_interval(self):
+        return self._poll_timer.interval()
+
+    def set_paths(self, paths):
+        """
+        Sets the libraries files to watch. Current signature of each file is stored, so only later changes are
+        notified
+        :param paths: list(str)
+        """
+
+        paths = [path for path in paths or list() if path]
+        if self._file_watcher.files():
+            self._file_watcher.removePaths(self._file_watcher.files())
+        self._signatures = dict((path, get_file_signature(path)) for path in paths)
+        self._pending_paths.clear()
+
+        if self._poll_timer.interval() > 0:
+            if paths:
+                self._poll_timer.start()
+            else:
+                self._poll_timer.stop()
+        else:
+            existing_paths = [path for path in paths if os.path.isfile(path)]
+            if existing_paths:
+                self._file_watcher.addPaths(existing_paths)
+
+    def clear(self):
+        """
+        Stops watching all the libraries files
+        """
+
+        self.set_paths(list())
+
+    def _check_paths(self, paths):
+        """
+        Internal function that notifies the given paths whose signature has changed
+        :param paths: iterable(str)
+        """
+
+        for path in paths:
+            if path not in self._signatures:
+                continue
+            file_signature = get_file_signature(path)
+            if file_signature == self._signatures[path]:
+                continue
+            self._signatures[path] = file_signature
+            logger.debug('Controls library file changed: "{}"'.format(path))
+            self.libraryChanged.emit(path)
+
+    def _on_file_changed(self, path):
+        """
+        Internal callback function that is called when a watched file is modified. Notification is delayed, so
+        consecutive writes to the file are notified only once
+        :param path: str
+        """
+
+        # Files replaced by a rename are removed from the watcher, so they must be watched again
+        if path not in self._file_watcher.files() and os.path.isfile(path):
+            self._file_watcher.addPath(path)
+
+        self._pending_paths.add(path)
+        self._debounce_timer.start()
+
+    def _on_debounce_timeout(self):
+        """
+        Internal callback function that is called once a watched file has not been modified during debounce interval
+        """
+
+        pending_paths = list(self._pending_paths)
+        self._pending_paths.clear()
+        for path in pending_paths:
+            if path not in self._file_watcher.files() and os.path.isfile(path):
+                self._file_watcher.addPath(path)
+        self._check_paths(pending_paths)
+
+    def _on_poll(self):
+        """
+        Internal callback function that is called periodically when files are polled
+        """
+
+        self._check_paths(list(self._signatures.keys()))
+
+
+def get_file_signature(file_path):
+    """
+    Returns the modification time and size of the given file
+    :param file_path: str
+    :return: tuple(float, int) or None
+    """
+
+    try:
+        file_stat = os.stat(file_path)
+    except (IOError, OSError):
+        return None
+
+    return file_stat.st_mtime, file_stat.st_size
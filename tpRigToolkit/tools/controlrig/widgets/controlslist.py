@@ -8,15 +8,19 @@ Module that contains control viewer widget for tpRigToolkit.tools.controlrig
 from __future__ import print_function, division, absolute_import
 
 import json
+from functools import partial
 
-from Qt.QtCore import Qt, QMimeData
-from Qt.QtWidgets import QAbstractItemView
+from Qt.QtCore import Qt, Signal, QMimeData
+from Qt.QtWidgets import QAbstractItemView, QMenu
 from Qt.QtGui import QDrag
 
 from tpDcc.libs.qt.widgets import lists
 
 
 class ControlsList(lists.EditableList, object):
+
+    findSimilarRequested = Signal(str)
+
     def __init__(self, controls_path=None, parent=None):
         super(ControlsList, self).__init__(parent=parent)
 
@@ -66,13 +70,40 @@ class ControlsList(lists.EditableList, object):
     def controls_path(self, path):
         self._controls_path = path
 
+    def add_items(self, items):
+        """
+        Adds the given items to the list at once. List is only sorted and repainted once all items are added
+        :param items: list(QTreeWidgetItem)
+        """
+
+        sorting_enabled = self.isSortingEnabled()
+        self.setUpdatesEnabled(False)
+        self.setSortingEnabled(False)
+        try:
+            self.addTopLevelItems(items)
+        finally:
+            self.setSortingEnabled(sorting_enabled)
+            self.setUpdatesEnabled(True)
+
+    def contextMenuEvent(self, event):
+        item = self.itemAt(event.pos())
+        control = getattr(item, 'control', None) if item else None
+        if not control:
+            return super(ControlsList, self).contextMenuEvent(event)
+
+        menu = QMenu(self)
+        find_similar_action = menu.addAction('Find Similar Controls')
+        find_similar_action.triggered.connect(partial(self.findSimilarRequested.emit, control.name))
+        menu.exec_(event.globalPos())
+
     def startDrag(self, event):
         item = self.currentItem()
         if not item:
             return
 
         mime_data = QMimeData()
-        mime_data.setText(json.dumps({'controls_path': self._controls_path, 'control': item.control.name}))
+        controls_path = getattr(item, 'controls_path', None) or self._controls_path
+        mime_data.setText(json.dumps({'controls_path': controls_path, 'control': item.control.name}))
         drag = QDrag(self)
         drag.setMimeData(mime_data)
         drag.exec_()
@@ -7,12 +7,29 @@ Module that contains control viewer widget for tpRigToolkit.tools.controlrig
 
 from __future__ import print_function, division, absolute_import
 
-import math
-from copy import copy
+from array import array
+from timeit import default_timer
+from collections import OrderedDict
 
-from Qt.QtCore import QPoint, QPointF, QRect, QRectF, QLineF
+from Qt import __binding__ as QT_BINDING
+from Qt.QtCore import Qt, QTimer, QPoint, QPointF, QRect, QRectF, QLineF
 from Qt.QtWidgets import QWidget, QCheckBox, QLabel
-from Qt.QtGui import QColor, QLinearGradient, QPainter, QPen, QBrush
+from Qt.QtGui import QColor, QLinearGradient, QPainter, QPen, QBrush, QPolygonF, QPixmap
+
+from tpRigToolkit.tools.controlrig.core import controldata, spline, projection, frametimes
+
+if QT_BINDING == 'PySide6':
+    import shiboken6 as shiboken
+elif QT_BINDING == 'PySide2':
+    import shiboken2 as shiboken
+else:
+    shiboken = None
+
+# Minimum time between two updates of the viewport coordinates, in milliseconds
+FRAME_INTERVAL = 16
+
+# QPointF stores its coordinates as two qreal values, which are doubles in all the platforms DCCs run on
+POINT_SIZE = 2 * array('d').itemsize
 
 
 class ControlViewer(QWidget, object):
@@ -22,7 +39,8 @@ class ControlViewer(QWidget, object):
 
     class ShapePool(object):
         """
-        Stack for the displayed shapes, with a direction conversion to QLines
+        Stack for the displayed shapes, storing one polyline for each shape so it is drawn with a single call.
+        Polylines are reused between updates: their points are overwritten in place with the projected coordinates
         """
 
         def __init__(self):
@@ -34,32 +52,52 @@ class ControlViewer(QWidget, object):
 
         shapes = property(get_shapes)
 
-        def __setitem__(self, key, points):
-            pts = list()
-            if len(points):
-                start = points[0]
-                for pt in points[1:]:
-                    pts.append(QLineF(start, pt))
-                    start = pt
-            self._shapes[key] = pts
+        def __setitem__(self, key, buffer):
+            polygon = self._shapes[key]
+            polygon.resize(len(buffer) // 2)
+            points_buffer = get_points_buffer(polygon)
+            if points_buffer is not None:
+                points_buffer[:] = buffer
+            elif buffer:
+                self._shapes[key] = QPolygonF(list(map(QPointF, buffer[0::2], buffer[1::2])))
 
         def __iter__(self):
             for shape in self._shapes:
                 yield shape
 
+        def __len__(self):
+            return len(self._shapes)
+
         def flush(self, length):
-            for idx in range(len(self._shapes) - 1, -1, -1):
-                self._shapes.pop(idx)
-            for i in range(length):
-                self._shapes.append([])
+            del self._shapes[length:]
+            self._shapes.extend(QPolygonF() for _ in range(length - len(self._shapes)))
 
     def __init__(self, parent=None):
         super(ControlViewer, self).__init__(parent=parent)
 
         self.setObjectName('controlViewer')
         self._shapes = list()
+        self._bounds = None
+        self._transform = controldata.get_transform_affine([0, 0, 0], [-1, -1, -1], 'XYZ', None, offset_sign=1)
+        self._transform_dirty = False
+        self._source_shapes = list()
+        self._curvature_bounds = list()
+        self._shapes_subdivisions = list()
         self._baked_lines = self.ShapePool()
         self._control = None
+        self._projection = None
+        self._projection_key = None
+        self._grid_lines = None
+        self._background_layer = None
+        self._background_layer_key = None
+        self._dirty = False
+        self._last_update_time = None
+        self._update_requests = 0
+        self._update_times = frametimes.FrameTimes()
+        self._paint_times = frametimes.FrameTimes()
+        self._update_timer = QTimer(self)
+        self._update_timer.setSingleShot(True)
+        self._update_timer.timeout.connect(self._on_update_timeout)
 
         self._mouse_pos = QPoint(0, 0)
         self._mouse_press = False
@@ -68,11 +106,12 @@ class ControlViewer(QWidget, object):
 
         self._scale = 30
         self._ref = 0.5
-        self._rotation = 235
-        self._height_rotate = 60
+        self._rotation = projection.ROTATION
+        self._height_rotate = projection.HEIGHT_ROTATE
 
         self._draw_ref = False
         self._draw_axis = True
+        self._tolerance = spline.TOLERANCE
 
         self._gradient_color_1 = QColor(44, 46, 48)
         self._gradient_color_2 = QColor(124, 143, 163)
@@ -119,6 +158,10 @@ class ControlViewer(QWidget, object):
     def control(self, ctrl):
         self._control = ctrl
 
+    @property
+    def transform_affine(self):
+        return self._transform
+
     @property
     def ref(self):
         return self._ref
@@ -126,6 +169,7 @@ class ControlViewer(QWidget, object):
     @ref.setter
     def ref(self, value):
         self._ref = value
+        self._grid_lines = None
 
     @property
     def shapes(self):
@@ -135,6 +179,36 @@ class ControlViewer(QWidget, object):
     def shapes(self, shapes_list):
         self._shapes = shapes_list
 
+    @property
+    def tolerance(self):
+        return self._tolerance
+
+    @tolerance.setter
+    def tolerance(self, value):
+        self._tolerance = value
+        self.request_update()
+
+    @property
+    def shapes_subdivisions(self):
+        return list(self._shapes_subdivisions)
+
+    @property
+    def segments_count(self):
+        return sum(max(polyline.size() - 1, 0) for polyline in self._baked_lines)
+
+    @property
+    def frame_stats(self):
+        """
+        Returns the statistics of the last coordinates updates and repaints of the viewport, in milliseconds
+        :return: OrderedDict
+        """
+
+        return OrderedDict([
+            ('requests', self._update_requests),
+            ('updates', self._update_times.get_stats()),
+            ('paints', self._paint_times.get_stats())
+        ])
+
     @property
     def control_color(self):
         return self._control_color
@@ -155,64 +229,154 @@ class ControlViewer(QWidget, object):
             self._rotation -= delta.x()
             self._height_rotate = min(max(self._height_rotate + delta.y(), 60), 120)
             self._mouse_pos = event.pos()
-            self.update_coords()
+            self.request_update()
 
     def mouseReleaseEvent(self, event):
         self._mouse_press = False
 
+    def mouseDoubleClickEvent(self, event):
+        self.frame()
+
     def wheelEvent(self, event):
         self._scale = max(self._scale + event.delta() / 40, 10)
-        self.update_coords()
+        self.request_update()
 
     def resizeEvent(self, event):
         gradient = QLinearGradient(QRectF(self.rect()).bottomLeft(), QRectF(self.rect()).topLeft())
         gradient.setColorAt(0, QColor(44, 46, 48))
         gradient.setColorAt(1, QColor(124, 143, 163))
         self._background = QBrush(gradient)
+        self.request_update()
 
     def paintEvent(self, event):
+        start_time = default_timer()
         painter = QPainter()
         painter.begin(self)
 
+        painter.drawPixmap(0, 0, self._get_background_layer())
         painter.setRenderHint(painter.Antialiasing)
-        painter.setBrush(self._background)
-        painter.drawRoundedRect(QRect(0, 0, self.size().width(), self.size().height()), 4, 4)
-        self._draw_grid(painter=painter)
         painter.setPen(self._control_pen)
 
-        for shape in self._baked_lines:
-            painter.drawLines(shape)
+        for polyline in self._baked_lines:
+            painter.drawPolyline(polyline)
 
         painter.end()
+        self._paint_times.add(default_timer() - start_time)
 
-    def load(self, shapes):
+    def load(self, shapes, bounds=None):
         """
-        Updates the viewport with new shapes, cleaning old stuff and smoothing the shape using
-        Catmull Rom method
-        :param shapes:
+        Updates the viewport with new shapes, cleaning old stuff. Given shapes are never modified: the viewer draws
+        its own copies, whose smoothed points are taken from the tessellations cache. Copies are drawn with the
+        transform of the viewer, set through set_transform
+        :param shapes: list(ControlShape)
+        :param bounds: ControlBounds or None, bounds of the given shapes. If not given, they are computed
         """
 
-        self._shapes = shapes
-        for i, shape in enumerate(self._shapes):
-            if shape.degree != 1 and not shape.smooth:
-                shape.cvs = self._smooth(copy(shape.cvs), shape.degree, shape.periodic)
-                shape.smooth = True
-                shape.apply_transform()
+        self._bounds = bounds or controldata.get_shapes_bounds(shapes or list())
+        self._source_shapes = list(shapes or list())
+        self._shapes = list()
+        self._curvature_bounds = list()
+        self._shapes_subdivisions = list()
+        for shape in self._source_shapes:
+            display_shape = controldata.ControlShape(degree=shape.degree, periodic=shape.periodic)
+            if shape.degree == 1:
+                display_shape.buffer = shape.buffer
+            else:
+                display_shape.smooth = True
+            self._shapes.append(display_shape)
+            self._curvature_bounds.append(spline.get_curvature_bound(shape.buffer, shape.degree, shape.periodic))
+            self._shapes_subdivisions.append(None)
+        self._transform_dirty = True
+
+        self.request_update()
+
+    def set_transform(self, offset, scale, axis, mirror):
+        """
+        Sets the transform the shapes are drawn with. Transform only affects the shapes drawn by this viewer, given
+        shapes are not transformed
+        :param offset: list(float), position offset
+        :param scale: list(float), scale factor
+        :param axis: str, axis order
+        :param mirror: str or None, mirror plane
+        """
+
+        transform = controldata.get_transform_affine(offset, scale, axis, mirror)
+        if transform == self._transform:
+            return
+
+        self._transform = transform
+        self._transform_dirty = True
+        self.request_update()
+
+    def frame(self):
+        """
+        Updates the viewport scale so the current shapes fit in it
+        """
+
+        if not self._bounds or not self._shapes:
+            return
 
-        self.update_coords()
+        scale = projection.get_frame_scale(
+            self._bounds.transformed(self._transform), self.width(), self.height())
+        if not scale:
+            return
+
+        self._scale = scale
+        self.request_update()
+
+    def request_update(self):
+        """
+        Marks the viewport coordinates as outdated. Coordinates are updated once the current frame interval ends, so
+        all the changes requested within the same frame are applied with a single update
+        """
+
+        self._dirty = True
+        self._update_requests += 1
+        if self._update_timer.isActive():
+            return
+
+        elapsed = (default_timer() - self._last_update_time) * 1000.0 if self._last_update_time is not None else None
+        self._update_timer.start(int(max(FRAME_INTERVAL - elapsed, 0)) if elapsed is not None else 0)
+
+    def reset_frame_stats(self):
+        """
+        Removes the statistics of the previous coordinates updates and repaints of the viewport
+        """
+
+        self._update_requests = 0
+        self._update_times.reset()
+        self._paint_times.reset()
 
     def update_coords(self):
         """
         Refresh 2D lines viewport array
         """
 
+        start_time = default_timer()
+        self._dirty = False
+        self._update_transforms()
+        self._update_tessellation()
         self._baked_lines.flush(len(self._shapes))
 
-        for i, shape in enumerate(self._shapes):
-            self.set_shape_coords(shape, i)
+        # Points of all the shapes are projected at once
+        buffers = [self._get_display_buffer(shape) for shape in self._shapes]
+        buffer = array('d')
+        for shape_buffer in buffers:
+            buffer.extend(shape_buffer)
+        projected_buffer = projection.project_buffer(buffer, self._get_projection())
+
+        start = 0
+        for i, shape_buffer in enumerate(buffers):
+            end = start + 2 * (len(shape_buffer) // 3)
+            self._baked_lines[i] = projected_buffer[start:end]
+            start = end
 
+        self._update_infos()
         self.update()
 
+        self._last_update_time = default_timer()
+        self._update_times.add(self._last_update_time - start_time)
+
     def set_shape_coords(self, shape, shape_index):
         """
         This converts shape's transfomred CVs into 2D points for the viewer's drawing
@@ -220,15 +384,8 @@ class ControlViewer(QWidget, object):
         :param shape_index:
         """
 
-        points_2d = list()
-        for pt in shape.transformed_cvs:
-            points_2d.append(self._convert_3D_to_2D(*pt))
-
-        # If the shape is closed, we add the first points to close the loop
-        if shape.periodic and shape.degree == 1:
-            points_2d.append(self._convert_3D_to_2D(*shape.transformed_cvs[0]))
-
-        self._baked_lines[shape_index] = points_2d
+        self._baked_lines[shape_index] = projection.project_buffer(
+            self._get_display_buffer(shape), self._get_projection())
     # endregion
 
     # region Private Functions
@@ -241,82 +398,152 @@ class ControlViewer(QWidget, object):
         :return: QPointF, 2D coordinates
         """
 
-        _x = x * math.cos(math.radians(self._rotation))
-        _x -= z * math.cos(math.radians(-self._rotation + 90))
-        _x *= self._scale
+        return QPointF(*projection.project_point((x, y, z), self._get_projection()))
 
-        # We do a 2D projection (key to fake the vertical camera rotation)
-        _y = (x * math.sin(math.radians(self._rotation)) - y + z * math.sin(
-            math.radians(-self._rotation + 90))) * self._scale
-        # Round the vertical rotate to achieve a uniform scaling on the shape when the camera turns up and down
-        _y *= math.cos(math.radians(self._height_rotate))
-        # Push compensation from the Y attribute of the point
-        _y += y * self._scale * (math.tan(math.radians(90 - self._height_rotate)) + math.sin(
-            math.radians(self._height_rotate)))
-        _y *= -1
+    def _get_projection(self):
+        """
+        Internal function that returns the projection of the current camera. It is only computed again when the
+        camera or the size of the viewport change
+        :return: tuple
+        """
 
-        # Center the point on the view
-        _x += self.width() * 0.5
-        _y += self.height() * 0.5
+        projection_key = (self._rotation, self._height_rotate, self._scale, self.width(), self.height())
+        if projection_key != self._projection_key:
+            self._projection_key = projection_key
+            self._projection = projection.get_projection(*projection_key)
+            self._grid_lines = None
 
-        return QPointF(_x, _y)
+        return self._projection
 
-    def _smooth(self, cv, deg, periodic):
+    def _project_points(self, buffer):
+        """
+        Internal function that projects all the points of the given buffer with the current camera
+        :param buffer: array, flat buffer with the 3D coordinates of the points
+        :return: list(QPointF)
         """
-        Smoothing the given coordinates (cv) using the Catmull Rom method
 
-        # TODO: At this moment, we set the degree as the number of divison of the Catmull Rom method, this is not
-        # TODO: correct and whe should change this to fit with each DCC method
+        projected_buffer = projection.project_buffer(buffer, self._get_projection())
 
-        :param cv:
-        :param degree:
-        :param periodic:
-        :return:
+        return list(map(QPointF, projected_buffer[0::2], projected_buffer[1::2]))
+
+    def _get_display_buffer(self, shape):
+        """
+        Internal function that returns the transformed points drawn for the given shape
+        :param shape: ControlShape
+        :return: array
+        """
+
+        buffer = shape.transformed_buffer
+
+        # If the shape is closed, we add the first points to close the loop
+        if shape.periodic and shape.degree == 1 and buffer:
+            buffer = array('d', buffer)
+            buffer.extend(buffer[:3])
+
+        return buffer
+
+    def _get_grid_lines(self):
+        """
+        Internal function that returns the projected lines of the axis, the grid and the joint reference. Lines are
+        only projected again when the camera, the size of the viewport or the joint reference change
+        :return: dict(str, list(QLineF))
+        """
+
+        self._get_projection()
+        if self._grid_lines is not None:
+            return self._grid_lines
+
+        segments = projection.get_grid_segments(self._ref)
+        points_2d = self._project_points(
+            projection.get_segments_buffer([segment for lines in segments.values() for segment in lines]))
+        self._grid_lines = dict()
+        start = 0
+        for name, lines in segments.items():
+            end = start + 2 * len(lines)
+            self._grid_lines[name] = list(map(QLineF, points_2d[start:end:2], points_2d[start + 1:end:2]))
+            start = end
+
+        return self._grid_lines
+
+    def _update_transforms(self):
+        """
+        Internal function that applies the transform of the viewer to the drawn shapes. Linear shapes are transformed
+        at once into a single buffer
         """
 
-        from tpRigToolkit.tools.controlrig.core import controldata
+        if not self._transform_dirty:
+            return
 
-        pts = []
-        cv = cv[:-3]
-        points_length = len(cv)
+        self._transform_dirty = False
+        controldata.apply_shapes_transform(
+            [display_shape for display_shape in self._shapes if not display_shape.smooth], self._transform)
+        for display_shape in self._shapes:
+            if display_shape.smooth:
+                display_shape.set_transform(self._transform)
 
-        # mapping the division's steps
-        div_map = [j / float(deg) for j in range(deg)]
+    def _update_tessellation(self):
+        """
+        Internal function that evaluates smooth shapes with the subdivisions their current on-screen size needs
+        """
 
-        for i in range(0, points_length + 1):
-            if (i < 0 or (i - deg) > points_length) and periodic:
+        for i, display_shape in enumerate(self._shapes):
+            if not display_shape.smooth:
                 continue
-            if (i <= 0 or (i + deg) > points_length) and not periodic:
+            subdivisions = spline.get_adaptive_subdivisions(
+                self._curvature_bounds[i] * display_shape.transform_scale, self._scale, tolerance=self._tolerance)
+            if subdivisions == self._shapes_subdivisions[i]:
                 continue
+            self._shapes_subdivisions[i] = subdivisions
+            display_shape.buffer = spline.get_tessellation_cache().get(
+                self._source_shapes[i], subdivisions=subdivisions)
+            display_shape.apply_transform()
 
-            p0 = controldata.ControlV(cv[i - 1])
-            p1 = controldata.ControlV(cv[i if i < points_length else (i - points_length)])
-            p2 = controldata.ControlV(cv[(i + 1) if (i + 1) < points_length else (i + 1 - points_length)])
-            p3 = controldata.ControlV(cv[(i + 2) if (i + 2) < points_length else (i + 2 - points_length)])
+    def _get_background_layer(self):
+        """
+        Internal function that returns a pixmap with the background, the grid, the axis and the joint reference of
+        the viewport. It is only drawn again when the camera, the size of the viewport or the displayed elements change
+        :return: QPixmap
+        """
 
-            # CUBIC       spline smoothing #
-            # a = p3 - p2 - p0 + p1
-            # b = p0 - p1 - a
-            # c = p2 - p0
-            # d = p1
-            # for j in range(deg):
-            #     t = j / float(deg)
-            #     t2 = t**2
-            #     pos = a*t*t2 + b*t2 + c*t + d
-            #     pts.append(pos)
+        pixel_ratio = self.devicePixelRatio()
+        layer_key = (
+            self._get_projection(), self._ref, self._draw_axis, self._draw_ref, self._rotate_order, pixel_ratio)
+        if self._background_layer is not None and layer_key == self._background_layer_key:
+            return self._background_layer
 
-            # CATMULL ROM   spline smoothing #
+        layer = QPixmap(int(max(self.width(), 1) * pixel_ratio), int(max(self.height(), 1) * pixel_ratio))
+        layer.setDevicePixelRatio(pixel_ratio)
+        layer.fill(Qt.transparent)
+        painter = QPainter()
+        painter.begin(layer)
+        painter.setRenderHint(painter.Antialiasing)
+        painter.setBrush(self._background)
+        painter.drawRoundedRect(QRect(0, 0, self.size().width(), self.size().height()), 4, 4)
+        self._draw_grid(painter=painter)
+        painter.end()
 
-            a = .5 * (p1 * 2)
-            b = .5 * (p2 - p0)
-            c = .5 * (2 * p0 - 5 * p1 + 4 * p2 - p3)
-            d = .5 * (-1 * p0 + 3 * p1 - 3 * p2 + p3)
+        self._background_layer = layer
+        self._background_layer_key = layer_key
 
-            for j, t in enumerate(div_map):
-                pos = a + (b * t) + (c * t * t) + (d * t * t * t)
-                pts.append(pos)
+        return layer
 
-        return pts
+    def _update_infos(self):
+        """
+        Internal function that updates the label displaying the information of the current shapes
+        """
+
+        if not self._shapes:
+            return
+
+        height = 40
+        info = 'degree%s : %i' % ('s' if self._shapes[0].degree > 1 else '', self._shapes[0].degree)
+        info += '\nclosed : %s' % ('no', 'yes')[bool(self._shapes[0].periodic)]
+        if len(self._shapes) > 1:
+            info += '\nshapes : %i' % len(self._shapes)
+            height += 20
+        self._infos.setText(info)
+        self._infos.setFixedHeight(height)
+        self._infos.setGeometry(10, self.height() - height, self.width(), self._infos.height())
 
     def _draw_grid(self, painter):
         """
@@ -325,54 +552,32 @@ class ControlViewer(QWidget, object):
         :return:
         """
 
-        from tpRigToolkit.tools.controlrig.core import controldata
-
+        grid_lines = self._get_grid_lines()
         if self._draw_axis:
             parent_main_axis = self._rotate_order
             for x in range(3):
                 self._axis_pen[x].setWidthF(0.5)
             self._axis_pen[controldata.axis_eq[parent_main_axis[0]]].setWidthF(1.5)
             painter.setPen(self._axis_pen[0])
-            painter.drawLine(self._convert_3D_to_2D(0, 0, 0), self._convert_3D_to_2D(100, 0, 0))
+            painter.drawLines(grid_lines['x_axis'])
             painter.setPen(self._sub_grid_pen)
-            step = self._ref if self._ref > 0.3 else (5 * self._ref if self._ref > 0.05 else 50 * self._ref)
-            rows = int(10 * (1 / step) * 0.75)
-
-            for i in range(-rows, rows):
-                painter.drawLine(self._convert_3D_to_2D(-100, 0, i * step), self._convert_3D_to_2D(100, 0, i * step))
-                painter.drawLine(self._convert_3D_to_2D(i * step, 0, -100), self._convert_3D_to_2D(i * step, 0, 100))
-
+            painter.drawLines(grid_lines['grid'])
             painter.setPen(self._axis_pen[1])
-            painter.drawLine(self._convert_3D_to_2D(0, 0, 0), self._convert_3D_to_2D(0, 100, 0))
+            painter.drawLines(grid_lines['y_axis'])
             painter.setPen(self._axis_pen[2])
-            painter.drawLine(self._convert_3D_to_2D(0, 0, 0), self._convert_3D_to_2D(0, 0, 100))
+            painter.drawLines(grid_lines['z_axis'])
 
         if self._draw_ref:
             painter.setPen(QPen(QColor(125, 165, 185), 0.8))
-            sp = [[0.0, 0.0, 1.0], [-0.5, 0.0, 0.87], [-0.87, 0.0, 0.5], [-1.0, 0.0, 0.0], [-0.87, 0.0, -0.5],
-                  [-0.5, 0.0, -0.87], [0.0, 0.0, -1.0], [0.5, 0.0, -0.87], [0.87, 0.0, -0.5], [1.0, 0.0, 0.0],
-                  [0.87, 0.0, 0.5], [0.5, 0.0, 0.87], [0.0, 0.0, 1.0], [0.0, 0.7, 0.7], [0.0, 1.0, 0.0],
-                  [0.0, 0.7, -0.7], [0.0, 0.0, -1.0], [0.0, -0.7, -0.7], [0.0, -1.0, 0.0], [-0.5, -0.87, 0.0],
-                  [-0.87, -0.5, 0.0], [-1.0, 0.0, 0.0], [-0.87, 0.5, 0.0], [-0.5, 0.87, 0.0], [0.0, 1.0, 0.0],
-                  [0.5, 0.87, 0.0], [0.87, 0.5, 0.0], [1.0, 0.0, 0.0], [0.87, -0.5, 0.0], [0.5, -0.87, 0.0],
-                  [0.0, -1.0, 0.0], [0.0, -0.7, 0.7], [0.0, 0.0, 1.0]]
-            for i, p in enumerate(sp[:-1]):
-                s, e = controldata.ControlV(p), controldata.ControlV(sp[i + 1])
-                s *= self._ref * 0.5
-                e *= self._ref * 0.5
-
-                painter.drawLine(self._convert_3D_to_2D(*s), self._convert_3D_to_2D(*e))
-
-        if self._shapes:
-            height = 40
-            info = 'degree%s : %i' % ('s' if self._shapes[0].degree > 1 else '', self._shapes[0].degree)
-            info += '\nclosed : %s' % ('no', 'yes')[bool(self._shapes[0].periodic)]
-            if len(self._shapes) > 1:
-                info += '\nshapes : %i' % len(self._shapes)
-                height += 20
-            self._infos.setText(info)
-            self._infos.setFixedHeight(height)
-            self._infos.setGeometry(10, self.height() - height, self.width(), self._infos.height())
+            painter.drawLines(grid_lines['reference'])
+
+    def _on_update_timeout(self):
+        """
+        Internal callback function that is called when the frame interval of a requested update ends
+        """
+
+        if self._dirty:
+            self.update_coords()
 
     def _on_toggle_ref(self, state):
         self._draw_ref = state
@@ -381,3 +586,31 @@ class ControlViewer(QWidget, object):
     def _on_toggle_axis(self, state):
         self._draw_axis = state
         self.repaint()
+
+
+def get_points_buffer(polygon):
+    """
+    Returns a writable buffer with the coordinates of the points stored by the given polygon, X and Y coordinates of
+    each point one after another, so they can be set at once without creating a QPointF for each point
+    :param polygon: QPolygonF
+    :return: memoryview or None, None if the points of the polygon cannot be accessed
+    """
+
+    if not len(polygon):
+        return None
+
+    size = len(polygon) * POINT_SIZE
+    if shiboken:
+        pointer = shiboken.VoidPtr(polygon.data(), size, True)
+    elif QT_BINDING in ('PyQt5', 'PyQt6'):
+        pointer = polygon.data()
+        pointer.setsize(size)
+    else:
+        # PySide and PyQt4 bindings (Qt 4) do not give access to the memory of the points stored by polygons
+        return None
+
+    try:
+        return memoryview(pointer).cast('B').cast('d')
+    except (AttributeError, TypeError):
+        # Python 2 memoryview objects cannot be cast to doubles
+        return None